@@ -0,0 +1,289 @@
+# backend/app/catalog_import.py
+"""
+Importación masiva de catálogos y saldos iniciales (alta de un sitio nuevo).
+
+Lee CSV o Excel (.xlsx) en streaming, valida cada fila con los esquemas de la
+API, resuelve códigos -> ids en memoria (una consulta por catálogo al inicio) e
+inserta por lotes con INSERT multi-fila, un commit por lote.
+
+Es idempotente y por eso reanudable: volver a correr la misma carga (completa o
+cortada a la mitad) omite lo que ya existe.
+- productos, bodegas, kits: por code.
+- composiciones: por (kit, producto).
+- saldos iniciales: por (producto, bodega, vencimiento) entre los movimientos
+  de entrada con la descripción OPENING_DESCRIPTION. Las líneas repetidas de un
+  mismo saldo (el mismo lote contado en dos filas) se suman en memoria a lo
+  largo de todo el archivo y se escribe una sola entrada por clave, así que
+  omitir una clave existente al reanudar nunca descarta cantidades de la
+  carga actual. Pasan por stock.insert_movements: actualizan saldos y lotes.
+
+Columnas (encabezado en la primera fila):
+- products:     code, cname y opcionales de ProductoCreate
+- warehouses:   code, cname, description
+- kits:         code, cname y opcionales de KitCreate
+- compositions: kit_code, product_code, quantaty
+- balances:     warehouse_code, product_code, quantaty_products, expiration_date
+"""
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.orm import Session
+
+from . import schemas, stock, versions
+from .ingest import MAX_REPORTED_ERRORS, iter_records
+from .models import TabKit, TabKitComposition, TabProductos, TabProductTransaction, TabWarehouse
+
+# Orden de carga: cada tipo solo referencia a los anteriores
+KINDS = ("warehouses", "products", "kits", "compositions", "balances")
+
+OPENING_DESCRIPTION = "Saldo inicial (importación)"
+READ_CHUNK = 64 * 1024
+
+# tipo -> (modelo, columna id, esquema)
+_CATALOGS = {
+    "products": (TabProductos, "id_product", schemas.ProductoCreate),
+    "warehouses": (TabWarehouse, "id_warehouse", schemas.WarehouseCreate),
+    "kits": (TabKit, "id_kit", schemas.KitCreate),
+}
+
+_ledger = TabProductTransaction.__table__
+
+
+# ---------- Lectura ----------
+
+def _file_chunks(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _xlsx_records(path: str, sheet: Optional[str]) -> Iterator[Tuple[int, object]]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RuntimeError("Para leer Excel instale openpyxl (pip install openpyxl)")
+    # read_only: openpyxl recorre la hoja sin cargarla entera
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet] if sheet else wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else None for h in next(rows, ())]
+        for n, values in enumerate(rows, start=1):
+            if all(v is None or v == "" for v in values):
+                continue
+            yield n, {
+                k: (v if v != "" else None)
+                for k, v in zip(header, values)
+                if k
+            }
+    finally:
+        wb.close()
+
+
+def read_file(path: str, sheet: Optional[str] = None) -> Iterator[Tuple[int, object]]:
+    """(número de fila, dict) por registro, igual que ingest.iter_records."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".xlsx", ".xlsm"):
+        return _xlsx_records(path, sheet)
+    if ext == ".csv":
+        return iter_records(_file_chunks(path), "csv")
+    raise ValueError(f"Formato no soportado: {ext or path} (use .csv o .xlsx)")
+
+
+# ---------- Carga ----------
+
+def _balance_key(row: dict) -> tuple:
+    return row["id_product"], row["id_warehouse"], row["expiration_date"]
+
+
+class Importer:
+    def __init__(self, db: Session, batch_size: int = 1000):
+        self.db = db
+        self.batch_size = batch_size
+        self.codes: Dict[str, Dict[int, int]] = {}  # tipo -> {code: id}
+        for kind, (model, id_attr, _) in _CATALOGS.items():
+            self.codes[kind] = dict(db.execute(select(model.code, getattr(model, id_attr))).all())
+        self.compositions: Set[Tuple[int, int]] = set(
+            db.execute(select(TabKitComposition.id_kit, TabKitComposition.id_product)).all()
+        )
+
+    # -- validación: fila -> dict listo para insertar, o excepción --
+
+    def _catalog_row(self, kind: str, record: dict) -> dict:
+        _, _, schema = _CATALOGS[kind]
+        item = schema.model_validate(record)
+        if item.code is None:
+            raise ValueError("code es obligatorio")
+        return item.model_dump()
+
+    def _lookup(self, kind: str, record: dict, column: str) -> int:
+        code = record.get(column)
+        if code is None:
+            raise ValueError(f"{column} es obligatorio")
+        try:
+            return self.codes[kind][int(code)]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"{column} {code} no existe")
+
+    def _composition_row(self, record: dict) -> dict:
+        id_kit = self._lookup("kits", record, "kit_code")
+        item = schemas.KitCompositionBase.model_validate({
+            "id_product": self._lookup("products", record, "product_code"),
+            "quantaty": record.get("quantaty"),
+            "add_user": record.get("add_user"),
+        })
+        return dict(item.model_dump(), id_kit=id_kit)
+
+    def _balance_row(self, record: dict) -> dict:
+        item = schemas.TransactionCreate.model_validate({
+            "id_product": self._lookup("products", record, "product_code"),
+            "id_warehouse": self._lookup("warehouses", record, "warehouse_code"),
+            "type_transaction": 0,
+            "quantaty_products": record.get("quantaty_products"),
+            "expiration_date": record.get("expiration_date"),
+            "add_user": record.get("add_user"),
+        })
+        if item.quantaty_products <= 0:
+            raise ValueError("quantaty_products debe ser mayor que 0")
+        row = {k: getattr(item, k) for k in (
+            "id_product", "id_warehouse", "type_transaction", "quantaty_products", "expiration_date", "add_user",
+        )}
+        row["description"] = OPENING_DESCRIPTION
+        return row
+
+    # -- escritura: cada función devuelve qué omitió por existir (filas; en saldos, las claves) --
+
+    def _write_catalog(self, kind: str, rows: List[dict]) -> int:
+        model, id_attr, _ = _CATALOGS[kind]
+        codes = self.codes[kind]
+        new, seen = [], set()
+        for r in rows:
+            if r["code"] not in codes and r["code"] not in seen:
+                seen.add(r["code"])
+                new.append(r)
+        if new:
+            self.db.execute(insert(model.__table__), new)
+            codes.update(self.db.execute(
+                select(model.code, getattr(model, id_attr)).where(model.code.in_(seen))
+            ).all())
+            versions.mark(self.db, kind)
+        return len(rows) - len(new)
+
+    def _write_compositions(self, rows: List[dict]) -> int:
+        new = []
+        for r in rows:
+            key = (r["id_kit"], r["id_product"])
+            if key not in self.compositions:
+                self.compositions.add(key)
+                new.append(r)
+        if new:
+            self.db.execute(insert(TabKitComposition.__table__), new)
+            versions.mark(self.db, "kits")
+        return len(rows) - len(new)
+
+    def _write_balances(self, rows: List[dict]) -> Set[tuple]:
+        """Una fila ya sumada por clave; devuelve las claves omitidas por estar cargadas."""
+        pairs = {(r["id_product"], r["id_warehouse"]) for r in rows}
+        # Saldos iniciales ya cargados de estos pares (índice producto/bodega/tipo del libro)
+        loaded = set(self.db.execute(
+            select(_ledger.c.id_product, _ledger.c.id_warehouse, _ledger.c.expiration_date).where(
+                tuple_(_ledger.c.id_product, _ledger.c.id_warehouse).in_(sorted(pairs)),
+                _ledger.c.type_transaction == 0,
+                _ledger.c.description == OPENING_DESCRIPTION,
+            )
+        ).all())
+        new = [r for r in rows if _balance_key(r) not in loaded]
+        stock.insert_movements(self.db, new)
+        return {_balance_key(r) for r in rows} & loaded
+
+    def run(self, kind: str, records: Iterable[Tuple[int, object]], progress=None) -> dict:
+        """
+        Valida y carga los registros de un tipo. Las filas inválidas se informan
+        y se omiten; cada lote se confirma por separado, así que cortar la carga
+        a la mitad deja lotes completos y volver a correrla continúa donde quedó.
+        Los saldos se suman por clave al leer y se escriben al final, por lotes.
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Tipo desconocido: {kind}")
+        received = inserted = skipped = failed = 0
+        errors: list = []
+        batch: list = []
+        balances: Dict[tuple, dict] = {}  # clave -> fila con la cantidad sumada
+        lines: Dict[tuple, int] = {}  # clave -> líneas del archivo que la forman
+
+        def flush():
+            nonlocal inserted, skipped
+            if not batch:
+                return
+            if kind in _CATALOGS:
+                omitted = self._write_catalog(kind, batch)
+                total = len(batch)
+            elif kind == "compositions":
+                omitted = self._write_compositions(batch)
+                total = len(batch)
+            else:
+                # El reporte cuenta líneas del archivo, no claves
+                omitted = sum(lines[k] for k in self._write_balances(batch))
+                total = sum(lines[_balance_key(r)] for r in batch)
+            self.db.commit()
+            skipped += omitted
+            inserted += total - omitted
+            batch.clear()
+            if progress:
+                progress(kind, received)
+
+        for n, record in records:
+            received += 1
+            try:
+                if isinstance(record, str):
+                    raise ValueError(record)
+                if kind in _CATALOGS:
+                    row = self._catalog_row(kind, record)
+                elif kind == "compositions":
+                    row = self._composition_row(record)
+                else:
+                    row = self._balance_row(record)
+            except ValidationError as e:
+                failed += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"row": n, "detail": e.errors(include_url=False, include_input=False, include_context=False)})
+                continue
+            except ValueError as e:
+                failed += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"row": n, "detail": str(e)})
+                continue
+            if kind == "balances":
+                key = _balance_key(row)
+                if key in balances:
+                    balances[key]["quantaty_products"] += row["quantaty_products"]
+                else:
+                    balances[key] = row
+                lines[key] = lines.get(key, 0) + 1
+                if progress and received % self.batch_size == 0:
+                    progress(kind, received)
+                continue
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                flush()
+        flush()
+
+        for row in balances.values():
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                flush()
+        flush()
+
+        return {
+            "kind": kind,
+            "received": received,
+            "inserted": inserted,
+            "skipped": skipped,
+            "failed": failed,
+            "errors": errors,
+        }
@@ -0,0 +1,275 @@
+# backend/app/changefeed.py
+"""
+Feed de cambios del libro de movimientos y de los saldos, servido por SSE en GET /changes.
+
+Cada commit que toca tab_product_transaction deja sus eventos en tab_change_event
+dentro de la misma transacción (como app.versions con los contadores), así que
+un evento existe si y solo si el cambio se confirmó, y lo ven todos los workers:
+
+- transaction.created / transaction.updated / transaction.deleted: id del
+  movimiento, producto, bodega, tipo y cantidad;
+- balance: saldo resultante de cada producto/bodega tocado (qty_in, qty_out, stock);
+- bulk: en lugar de los anteriores si un commit cambia más de
+  CHANGE_FEED_MAX_EVENTS movimientos (cargas masivas): el cliente recarga.
+
+El id del evento es el id de SSE: el cliente reanuda con Last-Event-ID (o
+?last_event_id=) y recibe lo que se perdió. Si ese punto ya se purgó
+(CHANGE_FEED_RETENTION_S) recibe un evento reset y debe recargar todo.
+
+Las escrituras Core (stock.insert_movements) llaman a record_rows().
+"""
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import anyio
+from sqlalchemy import delete, event, func, inspect, insert, select, tuple_
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .database import autoinc_step, engine
+from .models import TabChangeEvent, TabProductTransaction, TabStockBalance
+
+events = TabChangeEvent.__table__
+balance = TabStockBalance.__table__
+
+TX_FIELDS = ("id_product_transaction", "id_product", "id_warehouse", "type_transaction", "quantaty_products")
+BALANCE_CHUNK = 500  # pares producto/bodega por SELECT de saldos
+FETCH_LIMIT = 500  # eventos por lectura del stream
+GAP_WAIT_S = 2  # espera por un id intermedio de una transacción que todavía no confirma
+KEEPALIVE_S = 15
+PURGE_EVERY_S = 60
+
+_INFO_KEY = "change_events"
+_WRITTEN_KEY = "change_events_written"
+_last_purge = time.monotonic()  # primera limpieza al minuto de arrancar, no en el primer commit
+
+
+# ---------- Registro (en la transacción de la escritura) ----------
+
+def _pending(session: Session) -> dict:
+    # bulk: {transactions, first_id, last_id} una vez superado CHANGE_FEED_MAX_EVENTS
+    return session.info.setdefault(_INFO_KEY, {"tx": {}, "balances": set(), "bulk": None})
+
+
+def record(session: Session, kind: str, tx: dict) -> None:
+    """Anota un cambio de movimiento; se escribe al hacer commit la sesión."""
+    if not settings.change_feed:
+        return
+    pending = _pending(session)
+    tx_id = tx["id_product_transaction"]
+    bulk = pending["bulk"]
+    if bulk is None and len(pending["tx"]) >= settings.change_feed_max_events and tx_id not in pending["tx"]:
+        # Carga masiva: solo se cuentan, sin guardar cada cambio en memoria
+        ids = list(pending["tx"])
+        bulk = pending["bulk"] = {"transactions": len(ids), "first_id": min(ids), "last_id": max(ids)}
+        pending["tx"].clear()
+        pending["balances"].clear()
+    if bulk is not None:
+        bulk["transactions"] += 1
+        bulk["first_id"] = min(bulk["first_id"], tx_id)
+        bulk["last_id"] = max(bulk["last_id"], tx_id)
+        return
+    previous = pending["tx"].get(tx_id)
+    if previous is not None and previous[0] == "transaction.created":
+        if kind == "transaction.deleted":
+            del pending["tx"][tx_id]  # nació y murió en la misma transacción
+            pending["balances"].add((tx["id_product"], tx["id_warehouse"]))
+            return
+        kind = "transaction.created"
+    pending["tx"][tx_id] = (kind, {k: tx.get(k) for k in TX_FIELDS})
+    pending["balances"].add((tx["id_product"], tx["id_warehouse"]))
+
+
+def record_rows(session: Session, rows: Iterable[dict]) -> None:
+    """Altas escritas con Core (dicts con id_product_transaction)."""
+    for r in rows:
+        record(session, "transaction.created", r)
+
+
+def _before(obj, attr):
+    hist = inspect(obj).attrs[attr].history
+    if hist.deleted:
+        return hist.deleted[0]
+    if hist.unchanged:
+        return hist.unchanged[0]
+    return getattr(obj, attr)
+
+
+@event.listens_for(Session, "after_flush")
+def _track(session: Session, flush_context):
+    if not settings.change_feed:
+        return
+    for obj in session.new:
+        if isinstance(obj, TabProductTransaction):
+            record(session, "transaction.created", {k: getattr(obj, k) for k in TX_FIELDS})
+    for obj in session.dirty:
+        if isinstance(obj, TabProductTransaction) and session.is_modified(obj):
+            # El saldo del producto/bodega anterior también cambió
+            _pending(session)["balances"].add((_before(obj, "id_product"), _before(obj, "id_warehouse")))
+            record(session, "transaction.updated", {k: getattr(obj, k) for k in TX_FIELDS})
+    for obj in session.deleted:
+        if isinstance(obj, TabProductTransaction):
+            record(session, "transaction.deleted", {k: _before(obj, k) for k in TX_FIELDS})
+
+
+def _balances(conn, keys: Set[Tuple[int, int]]) -> Dict[Tuple[int, int], dict]:
+    found = {}
+    keys = sorted(keys)
+    for i in range(0, len(keys), BALANCE_CHUNK):
+        rows = conn.execute(
+            select(balance.c.id_product, balance.c.id_warehouse, balance.c.qty_in, balance.c.qty_out, balance.c.stock)
+            .where(tuple_(balance.c.id_product, balance.c.id_warehouse).in_(keys[i:i + BALANCE_CHUNK]))
+        ).all()
+        found.update({(r.id_product, r.id_warehouse): r._asdict() for r in rows})
+    return found
+
+
+@event.listens_for(Session, "before_commit")
+def _write_on_commit(session: Session):
+    global _last_purge
+    session.flush()  # before_commit corre antes del flush final del commit
+    pending = session.info.pop(_INFO_KEY, None)
+    if not pending:
+        return
+    conn = session.connection()
+    now = datetime.now()
+    if pending["bulk"] is not None:
+        rows = [{"kind": "bulk", "payload": json.dumps(pending["bulk"]), "created_at": now}]
+    else:
+        rows = [
+            {"kind": kind, "payload": json.dumps(payload), "created_at": now}
+            for kind, payload in pending["tx"].values()
+        ]
+        found = _balances(conn, pending["balances"])
+        for p, w in sorted(pending["balances"]):
+            row = found.get((p, w)) or {"id_product": p, "id_warehouse": w, "qty_in": 0, "qty_out": 0, "stock": 0}
+            rows.append({"kind": "balance", "payload": json.dumps(row), "created_at": now})
+    conn.execute(insert(events), rows)
+    session.info[_WRITTEN_KEY] = True
+    # Limpieza de eventos vencidos, como mucho una vez por minuto por proceso
+    if time.monotonic() - _last_purge > PURGE_EVERY_S:
+        _last_purge = time.monotonic()
+        conn.execute(delete(events).where(events.c.created_at < now - timedelta(seconds=settings.change_feed_retention_s)))
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_on_commit(session: Session):
+    if session.info.pop(_WRITTEN_KEY, False):
+        notify()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget(session: Session):
+    session.info.pop(_INFO_KEY, None)
+    session.info.pop(_WRITTEN_KEY, None)
+
+
+# ---------- Aviso a los streams del mismo proceso ----------
+
+_listeners: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+
+def notify() -> None:
+    """Despierta a los streams de este proceso (se llama desde cualquier hilo)."""
+    for loop, wake in list(_listeners):
+        loop.call_soon_threadsafe(wake.set)
+
+
+# ---------- Lectura (síncrona: se llama desde un hilo) ----------
+
+def id_step() -> int:
+    with engine.connect() as conn:
+        return autoinc_step(conn)
+
+
+def latest_id() -> int:
+    with engine.connect() as conn:
+        return conn.execute(select(func.max(events.c.id_event))).scalar() or 0
+
+
+def oldest_id() -> Optional[int]:
+    with engine.connect() as conn:
+        return conn.execute(select(func.min(events.c.id_event))).scalar()
+
+
+def fetch(after: int, limit: int = FETCH_LIMIT) -> List[tuple]:
+    with engine.connect() as conn:
+        return [tuple(r) for r in conn.execute(
+            select(events.c.id_event, events.c.kind, events.c.payload)
+            .where(events.c.id_event > after)
+            .order_by(events.c.id_event)
+            .limit(limit)
+        ).all()]
+
+
+# ---------- SSE ----------
+
+def sse(id_event: Optional[int], kind: str, data: str) -> str:
+    head = f"id: {id_event}\n" if id_event is not None else ""
+    return f"{head}event: {kind}\ndata: {data}\n\n"
+
+
+async def stream(last_id: Optional[int]):
+    """
+    Eventos SSE a partir de `last_id` (None = solo los nuevos), en orden de id.
+    Un salto de id puede ser una transacción que todavía no confirma (su evento
+    aparecerá con un id menor al ya visible) o un id quemado para siempre
+    (rollback). Por eso, antes de entregar un evento después de un salto, se
+    espera a que ese evento lleve GAP_WAIT_S visible; cada id se cronometra
+    desde la primera vez que se leyó, así que un lote con varios saltos espera
+    una sola vez. Los ids separados por el paso del autoincremento
+    (@@auto_increment_increment en MySQL) no cuentan como salto.
+    """
+    loop = asyncio.get_running_loop()
+    listener = (loop, asyncio.Event())
+    _listeners.add(listener)
+    try:
+        yield "retry: 3000\n\n"
+        if last_id is None:
+            last_id = await anyio.to_thread.run_sync(latest_id)
+        else:
+            oldest = await anyio.to_thread.run_sync(oldest_id)
+            latest = await anyio.to_thread.run_sync(latest_id)
+            if (oldest is not None and last_id < oldest - 1) or last_id > latest:
+                # El punto de reanudación ya no existe: recargar y seguir desde ahora
+                last_id = latest
+                yield sse(last_id, "reset", json.dumps({"last_event_id": last_id}))
+        step = await anyio.to_thread.run_sync(id_step)
+        seen_at: Dict[int, float] = {}  # id -> primera vez que se leyó (monotonic)
+        last_sent = time.monotonic()
+        while True:
+            rows = await anyio.to_thread.run_sync(fetch, last_id)
+            now = time.monotonic()
+            for row in rows:
+                seen_at.setdefault(row[0], now)
+            sent = 0
+            gap_wait = None  # segundos hasta poder pasar el salto pendiente
+            for id_event, kind, payload in rows:
+                if id_event > last_id + step and now - seen_at[id_event] < GAP_WAIT_S:
+                    gap_wait = seen_at[id_event] + GAP_WAIT_S - now
+                    break
+                last_id = id_event
+                sent += 1
+                yield sse(id_event, kind, payload)
+            for id_event in [i for i in seen_at if i <= last_id]:
+                del seen_at[id_event]
+            if sent:
+                last_sent = time.monotonic()
+                if sent == len(rows) == FETCH_LIMIT:
+                    continue  # hay más pendientes
+            elif time.monotonic() - last_sent >= KEEPALIVE_S:
+                last_sent = time.monotonic()
+                yield ": keepalive\n\n"
+            # Hasta el próximo aviso de este proceso o el siguiente sondeo (otros workers)
+            timeout = settings.change_feed_poll_s if gap_wait is None else min(settings.change_feed_poll_s, gap_wait)
+            with anyio.move_on_after(timeout):
+                await listener[1].wait()
+            # Evento nuevo antes de leer: un aviso durante la lectura no se pierde
+            _listeners.discard(listener)
+            listener = (loop, asyncio.Event())
+            _listeners.add(listener)
+    finally:
+        _listeners.discard(listener)
@@ -1,9 +1,51 @@
 from pydantic_settings import BaseSettings
+from typing import Optional
 import os
 
 class Settings(BaseSettings):
     database_url: str
     cors_origins: str = "*"
+    # Pool de conexiones (por worker; uno solo compartido por toda la app)
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_recycle: int = 1800  # segundos; evita conexiones cortadas por el servidor
+    db_pool_timeout: float = 30  # segundos esperando conexión libre antes de error
+    # Réplicas de lectura para GET seguros (app/replicas.py)
+    database_replica_urls: str = ""  # separadas por coma; vacío = todo va al primario
+    replica_max_lag_s: float = 5  # una réplica más atrasada no recibe lecturas
+    replica_check_s: float = 1  # cada cuánto se mide atraso y salud de las réplicas
+    slow_query_ms: float = 200  # sentencias más lentas se registran en el logger app.slowquery
+    bulk_batch_size: int = 500
+    allow_negative_stock: bool = False  # true: aceptar salidas sin existencia (como antes)
+    # Group commit de POST /transactions (app/group_commit.py): agrupa altas concurrentes
+    group_commit: bool = False
+    group_commit_max_rows: int = 200  # filas por INSERT/commit como máximo
+    group_commit_max_wait_ms: float = 5  # espera máxima desde la primera fila del lote
+    fast_json: bool = True  # respuestas orjson sin revalidar (app/responses.py)
+    # Caché de nombres de catálogos (app/refcache.py)
+    refcache_size: int = 10000  # entradas por catálogo
+    refcache_refresh_s: float = 5  # revisar mod_date para cambios de otros workers; 0 = no
+    auto_migrate: bool = True  # aplicar migraciones al arrancar la API
+    # Idempotency-Key en escrituras (app/idempotency.py)
+    idempotency_ttl_s: int = 24 * 3600  # cuánto se recuerda una respuesta
+    idempotency_cache_size: int = 10000  # respuestas en el LRU del proceso
+    idempotency_lock_s: float = 60  # una reserva sin latido de su proceso por este tiempo se da por abandonada
+    # Feed de cambios por SSE en GET /changes (app/changefeed.py)
+    change_feed: bool = True  # false: no se registran eventos
+    change_feed_retention_s: int = 24 * 3600  # reanudar desde más atrás recibe un evento reset
+    change_feed_poll_s: float = 1  # consulta de eventos nuevos (los del mismo worker avisan al instante)
+    change_feed_max_events: int = 1000  # por commit; más cambios se resumen en un evento bulk
+    # Fotos de productos y kits (app/photos.py)
+    photo_dir: str = os.path.join(os.path.dirname(__file__), "..", "media", "photos")
+    photo_max_bytes: int = 10 * 1024 * 1024
+    photo_max_pixels: int = 40_000_000  # ancho x alto; más que esto se rechaza antes de decodificar
+    photo_thumb_sizes: str = "128,512"  # lados máximos en px de las miniaturas, separados por coma
+    # Ruta asíncrona (asyncpg / asyncmy / aiosqlite) para los endpoints calientes
+    db_async: bool = False
+    async_database_url: Optional[str] = None  # por defecto se deriva de database_url
+    # PgBouncer en modo transacción (Supabase pooler, puerto 6543) no admite sentencias
+    # preparadas con nombre: con asyncpg se desactivan sus cachés. None = detectar por el puerto
+    db_transaction_pooler: Optional[bool] = None
     
     class Config:
         env_file = os.path.join(os.path.dirname(__file__), "..", ".env")
@@ -1,18 +1,41 @@
 # backend/app/database.py
-from sqlalchemy import create_engine
+import uuid
+from typing import Dict, Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlalchemy.orm import sessionmaker, declarative_base
-import os
 
-# Obtener URL de la base de datos desde variable de entorno
-DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://localhost/warehouse")
+from .config import settings
+from .pool import InstrumentedAsyncPool, InstrumentedQueuePool
+
+# Obtener URL de la base de datos desde la configuración (variable de entorno o .env)
+DATABASE_URL = settings.database_url
+
+# ---------- Registro de engines ----------
+# Un solo engine (y pool) por rol y por worker, dimensionado desde Settings
+engines: Dict[str, Engine] = {}
+
+def _pool_kwargs(url: str) -> dict:
+    kwargs = {"pool_pre_ping": True, "pool_recycle": settings.db_pool_recycle}
+    if not url.startswith("sqlite"):
+        kwargs.update(
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+        )
+    return kwargs
+
+def get_engine(role: str = "primary", url: Optional[str] = None) -> Engine:
+    """Engine compartido del rol indicado; se crea la primera vez."""
+    if role not in engines:
+        url = url or DATABASE_URL
+        engines[role] = create_engine(url, poolclass=InstrumentedQueuePool, **_pool_kwargs(url))
+    return engines[role]
 
 # Crear engine de SQLAlchemy
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=10
-)
+engine = get_engine()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
@@ -23,4 +46,119 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def is_unique_violation(e: IntegrityError) -> bool:
+    """True si el IntegrityError es por un índice único (y no NOT NULL, FK, etc.)."""
+    orig = e.orig
+    sqlstate = getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+    if sqlstate:  # PostgreSQL
+        return sqlstate == "23505"
+    args = getattr(orig, "args", ())
+    if args and args[0] == 1062:  # MySQL/MariaDB ER_DUP_ENTRY
+        return True
+    return "UNIQUE constraint failed" in str(orig)  # SQLite
+
+def autoinc_step(conn) -> int:
+    """
+    Paso entre ids autoincrementales consecutivos: @@auto_increment_increment en
+    MySQL/MariaDB (p. ej. 2 en replicación multi-primario), 1 en los demás.
+    Se lee una vez por conexión.
+    """
+    if conn.dialect.name not in ("mysql", "mariadb"):
+        return 1
+    step = conn.info.get("autoinc_step")
+    if step is None:
+        step = conn.info["autoinc_step"] = int(conn.execute(text("SELECT @@auto_increment_increment")).scalar())
+    return step
+
+# ---------- Réplicas de lectura (opcional, DATABASE_REPLICA_URLS) ----------
+# Roles "replica0", "replica1", ... en el mismo registro de engines
+REPLICA_URLS = [u.strip() for u in settings.database_replica_urls.split(",") if u.strip()]
+
+def replica_engines() -> Dict[str, Engine]:
+    return {f"replica{i}": get_engine(f"replica{i}", url) for i, url in enumerate(REPLICA_URLS)}
+
+def get_read_db():
+    """
+    Sesión para GET que toleran datos de hace unos segundos: va a una réplica
+    al día (ver app/replicas.py) o al primario.
+    """
+    from . import replicas
+    role, bind = replicas.choose()
+    db = SessionLocal(bind=bind)
+    try:
+        if role != "primary":
+            try:
+                db.connection()  # la réplica se cayó desde el último chequeo: al primario
+            except OperationalError:
+                replicas.mark_down(role)
+                db.close()
+                role, db = "primary", SessionLocal()
+        replicas.set_source(role)
+        yield db
+    finally:
+        db.close()
+
+# ---------- Ruta asíncrona (opcional, DB_ASYNC=true) ----------
+# Driver asíncrono equivalente a cada driver síncrono
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+asyncmy",
+    "mariadb": "mariadb+asyncmy",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_url(url: str) -> str:
+    u = make_url(url)
+    driver = ASYNC_DRIVERS.get(u.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No hay driver asíncrono configurado para {u.get_backend_name()}")
+    return u.set(drivername=driver).render_as_string(hide_password=False)
+
+# Puerto del pooler de Supabase en modo transacción (el modo sesión usa 5432)
+TRANSACTION_POOLER_PORTS = {6543}
+
+def _async_connect_args(url: str) -> dict:
+    """
+    asyncpg prepara cada sentencia con nombre y la guarda por conexión. Detrás de
+    un pooler en modo transacción (Supabase :6543, PgBouncer pool_mode=transaction)
+    la siguiente transacción puede ir a otra conexión del servidor, y falla con
+    "prepared statement ... does not exist" o "already exists". Ahí se desactivan
+    la caché de asyncpg y la del dialecto, y cada sentencia lleva un nombre único.
+    """
+    u = make_url(url)
+    if u.get_driver_name() != "asyncpg":
+        return {}
+    pooled = settings.db_transaction_pooler
+    if pooled is None:
+        pooled = u.port in TRANSACTION_POOLER_PORTS
+    if not pooled:
+        return {}
+    return {
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+    }
+
+async_engine = None
+AsyncSessionLocal = None
+
+def init_async():
+    """Crea el engine asíncrono la primera vez (solo si se usa la ruta asíncrona)."""
+    global async_engine, AsyncSessionLocal
+    if async_engine is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        url = settings.async_database_url or async_url(DATABASE_URL)
+        async_engine = create_async_engine(
+            url, poolclass=InstrumentedAsyncPool, connect_args=_async_connect_args(url), **_pool_kwargs(url)
+        )
+        # expire_on_commit=False: tras el commit no se pueden recargar atributos sin await
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return async_engine
+
+async def get_async_db():
+    """Sesión AsyncSession para los endpoints async def."""
+    init_async()
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,16 +1,5 @@
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import Engine
-from sqlalchemy.pool import QueuePool
-from .config import settings
-
-engine: Engine = create_engine(
-    settings.database_url,  # ✅ Cambiado de settings.url
-    poolclass=QueuePool,
-    pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=5,
-    future=True,
-)
+from sqlalchemy import text
+from .database import engine  # mismo pool que los routers ORM
 
 def db_ping() -> bool:
     with engine.connect() as conn:
@@ -19,22 +8,11 @@ def db_ping() -> bool:
 
 def on_hand(product_id: int) -> int:
     """
-    Intenta leer de la vista vw_inventory; si no existe, usa la función fn_on_hand.
+    Existencias totales del producto (todas las bodegas) leídas de tab_stock_balance.
     """
     with engine.connect() as conn:
-        try:
-            row = conn.execute(
-                text("SELECT on_hand FROM vw_inventory WHERE id_product = :pid"),
-                {"pid": product_id},
-            ).first()
-            if row and row[0] is not None:
-                return int(row[0])
-        except Exception:
-            # Si la vista no existe, caemos a la función
-            pass
-
         row = conn.execute(
-            text("SELECT fn_on_hand(:pid) AS on_hand"),
+            text("SELECT COALESCE(SUM(stock), 0) FROM tab_stock_balance WHERE id_product = :pid"),
             {"pid": product_id},
         ).first()
         return int(row[0] if row and row[0] is not None else 0)
\ No newline at end of file
@@ -0,0 +1,78 @@
+# backend/app/export.py
+"""
+Exportación del libro de movimientos en streaming (CSV o NDJSON).
+
+La consulta usa un cursor del lado del servidor (yield_per / stream_results) y
+cada bloque de filas se serializa y se envía en cuanto llega, así que la memoria
+no depende del número de filas exportadas.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Iterator, Optional
+
+from sqlalchemy import select
+
+from .database import SessionLocal
+from .models import TabProductTransaction
+
+ledger = TabProductTransaction.__table__
+
+COLUMNS = [c.name for c in ledger.columns]
+
+CHUNK_ROWS = 1000
+
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+
+def build_query(
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    id_warehouse: Optional[int] = None,
+    id_product: Optional[int] = None,
+    type_transaction: Optional[int] = None,
+):
+    stmt = select(*ledger.columns)
+    if date_from is not None:
+        stmt = stmt.where(ledger.c.add_date >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(ledger.c.add_date < date_to)
+    if id_warehouse is not None:
+        stmt = stmt.where(ledger.c.id_warehouse == id_warehouse)
+    if id_product is not None:
+        stmt = stmt.where(ledger.c.id_product == id_product)
+    if type_transaction is not None:
+        stmt = stmt.where(ledger.c.type_transaction == type_transaction)
+    return stmt.order_by(ledger.c.id_product_transaction)
+
+
+def _json_default(v):
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    raise TypeError(f"Not serializable: {type(v)!r}")
+
+
+def stream(stmt, fmt: str) -> Iterator[bytes]:
+    """Genera el archivo por bloques. Abre su propia sesión: corre mientras se envía la respuesta."""
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=CHUNK_ROWS))
+        if fmt == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(COLUMNS)
+            for chunk in result.partitions():
+                writer.writerows(chunk)
+                yield buf.getvalue().encode()
+                buf.seek(0)
+                buf.truncate()
+            if buf.tell():
+                yield buf.getvalue().encode()
+        else:
+            for chunk in result.partitions():
+                yield "".join(
+                    json.dumps(dict(zip(COLUMNS, row)), default=_json_default) + "\n" for row in chunk
+                ).encode()
+    finally:
+        db.close()
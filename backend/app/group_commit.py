@@ -0,0 +1,123 @@
+# backend/app/group_commit.py
+"""
+Group commit de altas en el libro (GROUP_COMMIT=true).
+
+Con muchas altas concurrentes, cada POST /transactions paga su propio INSERT
+y su propio commit (un fsync en la BD). Aquí las peticiones dejan su fila en
+una cola y esperan; un hilo escritor junta lo que llegue en
+GROUP_COMMIT_MAX_WAIT_MS (o hasta GROUP_COMMIT_MAX_ROWS filas), lo inserta con
+stock.insert_movements (un INSERT multi-fila, saldos y lotes) y confirma una
+sola vez. Recién después del commit cada petición recibe su propia respuesta.
+
+Si el lote falla (p. ej. una salida sin existencia) se deshace y se reintenta
+fila por fila con SAVEPOINT: solo la petición culpable recibe el error.
+
+Cada fila lleva la reserva de Idempotency-Key de su petición (si la hay); las
+filas escritas la marcan en la misma transacción del lote.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List
+
+from sqlalchemy.orm import Session
+
+from . import idempotency, metrics, stock
+from .config import settings
+from .database import SessionLocal
+from .ingest import WRITE_ERRORS
+
+log = logging.getLogger(__name__)
+
+
+class _Pending:
+    __slots__ = ("row", "claim", "future", "queued_at")
+
+    def __init__(self, row: dict):
+        self.row = row
+        self.claim = idempotency.current.get()  # el hilo escritor no ve el contexto de la petición
+        self.future: Future = Future()
+        self.queued_at = time.perf_counter()
+
+
+class GroupCommitWriter:
+    """
+    Cola de filas del libro con un hilo escritor (arranca con la primera fila).
+    `respond(db, ids)` arma la respuesta de cada id dentro de la transacción del lote.
+    """
+
+    def __init__(self, respond: Callable[[Session, List[int]], list]):
+        self.respond = respond
+        self._queue: "queue.Queue[_Pending]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, row: dict) -> Future:
+        """Encola una fila (claves de ingest.LEDGER_COLUMNS); el Future se resuelve tras el commit."""
+        pending = _Pending(row)
+        self._queue.put(pending)
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                    self._thread.start()
+        return pending.future
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + settings.group_commit_max_wait_ms / 1000
+            while len(batch) < settings.group_commit_max_rows:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                self._flush(batch)
+            except Exception as e:  # el hilo no puede morir: cada petición recibe el error
+                log.exception("group commit: falló un lote de %d filas", len(batch))
+                for p in batch:
+                    if not p.future.done():
+                        p.future.set_exception(e)
+
+    def _flush(self, batch: List[_Pending]) -> None:
+        t0 = time.perf_counter()
+        db = SessionLocal()
+        try:
+            results = {}  # posición en el lote -> respuesta o excepción
+            try:
+                ids = stock.insert_movements(db, [p.row for p in batch])
+                ok = list(range(len(batch)))
+            except WRITE_ERRORS:
+                db.rollback()
+                ids, ok = [], []
+                for n, p in enumerate(batch):
+                    try:
+                        with db.begin_nested():
+                            ids += stock.insert_movements(db, [p.row])
+                        ok.append(n)
+                    except WRITE_ERRORS as e:
+                        results[n] = e
+            for n, out in zip(ok, self.respond(db, ids) if ids else []):
+                results[n] = out
+            claims = [batch[n].claim for n in ok if batch[n].claim is not None]
+            if claims:
+                idempotency.mark_committed(db.connection(), claims)
+            db.commit()
+        finally:
+            db.close()
+
+        done = time.perf_counter()
+        metrics.GROUP_COMMIT_ROWS.observe(len(batch))
+        metrics.GROUP_COMMIT_FLUSH.observe(done - t0)
+        for n, p in enumerate(batch):
+            metrics.GROUP_COMMIT_WAIT.observe(done - p.queued_at)
+            if isinstance(results[n], Exception):
+                p.future.set_exception(results[n])
+            else:
+                p.future.set_result(results[n])
@@ -0,0 +1,416 @@
+# backend/app/idempotency.py
+"""
+Idempotency-Key en escrituras (POST, PUT, PATCH, DELETE).
+
+El cliente manda un encabezado Idempotency-Key único por operación y lo repite
+en los reintentos. La primera petición con esa clave se ejecuta y, si termina
+con 2xx, su respuesta se guarda en tab_idempotency_key y en un LRU del proceso
+durante IDEMPOTENCY_TTL_S; los reintentos reciben la misma respuesta (con
+Idempotent-Replayed: true) sin volver a tocar el libro.
+
+- Mientras la primera petición está en curso, la clave queda reservada (fila con
+  status_code NULL y el id del proceso en owner): un reintento simultáneo recibe
+  409 en lugar de duplicar. Un hilo renueva heartbeat_at de las reservas del
+  proceso; solo una reserva sin latido por IDEMPOTENCY_LOCK_S (proceso caído) se
+  puede volver a tomar.
+- El commit que escribe en el libro marca committed_at en la misma transacción
+  (listener before_commit, o el lote del group commit). Desde ahí la clave ya no
+  se libera: si la respuesta no llega a guardarse (error o caída después del
+  commit), los reintentos reciben 409 en vez de repetir la escritura.
+- Las respuestas que no son 2xx y no confirmaron nada no se guardan: se pueden
+  reintentar con la misma clave.
+- Reusar una clave con otro método, ruta o cuerpo devuelve 422. La huella del
+  cuerpo se calcula a medida que la app lo lee, sin juntarlo en memoria (las
+  cargas masivas siguen en streaming).
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, NamedTuple, Optional
+
+import anyio
+from sqlalchemy import delete, event, func, insert, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import metrics
+from .config import settings
+from .database import engine
+from .models import TabIdempotencyKey
+
+log = logging.getLogger(__name__)
+
+HEADER = b"idempotency-key"
+REPLAYED_HEADER = (b"idempotent-replayed", b"true")
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+MAX_KEY_LENGTH = 255
+PURGE_EVERY_S = 60
+OWNER = uuid.uuid4().hex  # este proceso, dueño de sus reservas
+
+# No se guardan: los vuelve a poner el servidor al responder
+_SKIP_HEADERS = {b"content-length", b"date", b"server"}
+
+table = TabIdempotencyKey.__table__
+
+
+class Stored(NamedTuple):
+    fingerprint: str
+    status_code: int
+    headers: list  # [(bytes, bytes)]
+    body: bytes
+    expires_at: datetime
+
+
+PENDING = "pending"  # la petición original sigue en curso
+PROCESSED = "processed"  # la escritura se confirmó pero su respuesta no se guardó
+
+
+class Claim:
+    """Reserva de una clave por una petición en curso de este proceso."""
+    __slots__ = ("key", "fingerprint")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.fingerprint = ""  # se conoce al terminar de leer el cuerpo
+
+
+# Reserva de la petición actual; la ven los listeners de Session (la copia del
+# contexto llega al threadpool) y group_commit la guarda con cada fila
+current: ContextVar[Optional[Claim]] = ContextVar("idempotency_claim", default=None)
+
+
+class ResponseCache:
+    """LRU de respuestas completas por clave, acotado y con vencimiento."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, Stored]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Stored]:
+        with self._lock:
+            stored = self._data.get(key)
+            if stored is None:
+                return None
+            if stored.expires_at <= datetime.now():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return stored
+
+    def put(self, key: str, stored: Stored) -> None:
+        with self._lock:
+            self._data[key] = stored
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+cache = ResponseCache(settings.idempotency_cache_size)
+_last_purge = 0.0
+
+
+class _Hasher:
+    """sha256 de método, ruta, query y cuerpo; el cuerpo entra por partes."""
+
+    def __init__(self, scope):
+        self._h = hashlib.sha256()
+        for part in (scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b"")):
+            self._h.update(len(part).to_bytes(8, "big"))
+            self._h.update(part)
+
+    def update(self, chunk: bytes) -> None:
+        self._h.update(chunk)
+
+    def hexdigest(self) -> str:
+        return self._h.hexdigest()
+
+
+def fingerprint(method: str, path: str, query: bytes, body: bytes) -> str:
+    h = _Hasher({"method": method, "path": path, "query_string": query})
+    h.update(body)
+    return h.hexdigest()
+
+
+# ---------- Reservas vivas: latido ----------
+
+_active: Dict[str, Claim] = {}
+_active_lock = threading.Lock()
+_heartbeat = None
+
+
+def _beat_once() -> None:
+    with _active_lock:
+        keys = list(_active)
+    if keys:
+        with engine.begin() as conn:
+            conn.execute(
+                update(table).where(table.c.idem_key.in_(keys), table.c.owner == OWNER)
+                .values(heartbeat_at=datetime.now())
+            )
+
+
+def _run_heartbeat() -> None:
+    while True:
+        time.sleep(settings.idempotency_lock_s / 3)
+        try:
+            _beat_once()
+        except Exception:
+            log.warning("idempotency: no se pudo renovar el latido de las reservas", exc_info=True)
+
+
+def _track(claim: Claim) -> None:
+    global _heartbeat
+    with _active_lock:
+        _active[claim.key] = claim
+        if _heartbeat is None:
+            _heartbeat = threading.Thread(target=_run_heartbeat, name="idempotency-heartbeat", daemon=True)
+            _heartbeat.start()
+
+
+def _untrack(key: str) -> None:
+    with _active_lock:
+        _active.pop(key, None)
+
+
+# ---------- Base de datos (síncrono: se llama desde un hilo) ----------
+
+def _load(key: str):
+    """Stored, PENDING, PROCESSED o None (no existe, venció o su dueño cayó sin escribir)."""
+    with engine.begin() as conn:
+        row = conn.execute(select(table).where(table.c.idem_key == key)).first()
+        if row is None:
+            return None
+        now = datetime.now()
+        if row.expires_at <= now:
+            conn.execute(delete(table).where(table.c.idem_key == key, table.c.expires_at == row.expires_at))
+            return None
+        if row.status_code is not None:
+            headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in json.loads(row.headers or "[]")]
+            return Stored(row.fingerprint, row.status_code, headers, row.body or b"", row.expires_at)
+        cutoff = now - timedelta(seconds=settings.idempotency_lock_s)
+        if (row.heartbeat_at or row.created_at) >= cutoff:
+            return PENDING  # el dueño sigue vivo
+        if row.committed_at is not None:
+            return PROCESSED
+        # Dueño caído sin confirmar nada: la reserva se libera (si nadie la renovó entretanto)
+        conn.execute(delete(table).where(
+            table.c.idem_key == key, table.c.status_code.is_(None), table.c.committed_at.is_(None),
+            func.coalesce(table.c.heartbeat_at, table.c.created_at) < cutoff,
+        ))
+        return None
+
+
+def _claim(claim: Claim) -> bool:
+    """Reserva la clave; False si otra petición la reservó primero."""
+    now = datetime.now()
+    try:
+        with engine.begin() as conn:
+            conn.execute(insert(table).values(
+                idem_key=claim.key, fingerprint="", created_at=now,
+                expires_at=now + timedelta(seconds=settings.idempotency_ttl_s),
+                owner=OWNER, heartbeat_at=now,
+            ))
+    except IntegrityError:
+        return False
+    _track(claim)
+    return True
+
+
+def mark_committed(conn: Connection, claims: Iterable[Claim]) -> None:
+    """Marca las claves como escritas; se llama dentro de la transacción de la escritura."""
+    now = datetime.now()
+    for claim in claims:
+        values = {"committed_at": now}
+        if claim.fingerprint:
+            values["fingerprint"] = claim.fingerprint
+        conn.execute(
+            update(table).where(table.c.idem_key == claim.key, table.c.owner == OWNER).values(**values)
+        )
+
+
+def _complete(claim: Claim, stored: Stored) -> None:
+    global _last_purge
+    headers = json.dumps([(k.decode("latin-1"), v.decode("latin-1")) for k, v in stored.headers])
+    try:
+        with engine.begin() as conn:
+            conn.execute(
+                update(table).where(table.c.idem_key == claim.key, table.c.owner == OWNER)
+                .values(fingerprint=stored.fingerprint, status_code=stored.status_code, headers=headers,
+                        body=stored.body, expires_at=stored.expires_at)
+            )
+            # Limpieza de claves vencidas, como mucho una vez por minuto por proceso
+            if time.monotonic() - _last_purge > PURGE_EVERY_S:
+                _last_purge = time.monotonic()
+                conn.execute(delete(table).where(table.c.expires_at <= datetime.now()))
+    finally:
+        _untrack(claim.key)
+
+
+def _release(claim: Claim) -> None:
+    """Libera la reserva si no llegó a confirmar ninguna escritura."""
+    try:
+        with engine.begin() as conn:
+            conn.execute(delete(table).where(
+                table.c.idem_key == claim.key, table.c.owner == OWNER,
+                table.c.status_code.is_(None), table.c.committed_at.is_(None),
+            ))
+    finally:
+        _untrack(claim.key)
+
+
+# ---------- Marca en la transacción de la escritura ----------
+
+_WROTE_KEY = "idempotency_wrote"
+
+
+@event.listens_for(Session, "after_flush")
+def _wrote_orm(session: Session, flush_context):
+    if current.get() is not None:
+        session.info[_WROTE_KEY] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _wrote_core(state):
+    if current.get() is not None and (state.is_insert or state.is_update or state.is_delete):
+        state.session.info[_WROTE_KEY] = True
+
+
+@event.listens_for(Session, "before_commit")
+def _mark_on_commit(session: Session):
+    claim = current.get()
+    if claim is None:
+        return
+    session.flush()  # before_commit corre antes del flush final del commit
+    if session.info.pop(_WROTE_KEY, False):
+        mark_committed(session.connection(), [claim])
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget(session: Session):
+    session.info.pop(_WROTE_KEY, None)
+
+
+# ---------- Middleware ----------
+
+async def _json(send, status: int, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start", "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _replay(send, stored: Stored) -> None:
+    headers = stored.headers + [(b"content-length", str(len(stored.body)).encode()), REPLAYED_HEADER]
+    await send({"type": "http.response.start", "status": stored.status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": stored.body})
+
+
+class IdempotencyMiddleware:
+    """Middleware ASGI puro; solo actúa en escrituras que traen Idempotency-Key."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in WRITE_METHODS:
+            return await self.app(scope, receive, send)
+        raw_key = next((v for k, v in scope["headers"] if k == HEADER), None)
+        if raw_key is None:
+            return await self.app(scope, receive, send)
+        key = raw_key.decode("latin-1").strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return await _json(send, 400, f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+
+        stored = cache.get(key)
+        source = "memory"
+        if stored is None:
+            stored = await anyio.to_thread.run_sync(_load, key)
+            source = "db"
+        claim = None
+        if stored is None:
+            claim = Claim(key)
+            if not await anyio.to_thread.run_sync(_claim, claim):
+                stored = PENDING  # otra petición con la misma clave se adelantó
+        if stored is PENDING:
+            metrics.IDEMPOTENCY.inc("in_progress")
+            return await _json(send, 409, "A request with this Idempotency-Key is still in progress")
+        if stored is PROCESSED:
+            metrics.IDEMPOTENCY.inc("processed")
+            return await _json(
+                send, 409, "A request with this Idempotency-Key was already processed; its response is not available"
+            )
+        if stored is not None:
+            # La huella del reintento se calcula leyendo el cuerpo por partes
+            hasher = _Hasher(scope)
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                hasher.update(message.get("body", b""))
+                if not message.get("more_body"):
+                    break
+            if stored.fingerprint != hasher.hexdigest():
+                metrics.IDEMPOTENCY.inc("mismatch")
+                return await _json(send, 422, "Idempotency-Key was already used with a different request")
+            cache.put(key, stored)
+            metrics.IDEMPOTENCY.inc(f"replayed_{source}")
+            return await _replay(send, stored)
+
+        hasher = _Hasher(scope)
+        body_done = False
+
+        async def receive_hashing():
+            nonlocal body_done
+            message = await receive()
+            if message["type"] == "http.request" and not body_done:
+                hasher.update(message.get("body", b""))
+                if not message.get("more_body"):
+                    body_done = True
+                    claim.fingerprint = hasher.hexdigest()
+            elif message["type"] == "http.disconnect":
+                body_done = True
+            return message
+
+        response = {"status": 500, "headers": [], "body": []}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                # Lo que la app no leyó del cuerpo igual entra en la huella
+                while not body_done:
+                    await receive_hashing()
+                response["status"] = message["status"]
+                response["headers"] = [(k, v) for k, v in message.get("headers", []) if k.lower() not in _SKIP_HEADERS]
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+            await send(message)
+
+        completed = False
+        token = current.set(claim)
+        try:
+            await self.app(scope, receive_hashing, capture)
+            if 200 <= response["status"] < 300 and claim.fingerprint:
+                stored = Stored(
+                    claim.fingerprint, response["status"], response["headers"], b"".join(response["body"]),
+                    datetime.now() + timedelta(seconds=settings.idempotency_ttl_s),
+                )
+                await anyio.to_thread.run_sync(_complete, claim, stored)
+                cache.put(key, stored)
+                completed = True
+                metrics.IDEMPOTENCY.inc("stored")
+        finally:
+            current.reset(token)
+            if not completed:
+                # También si el cliente se desconectó: la reserva no puede quedar colgada
+                # (si la escritura ya se confirmó, _release la deja y los reintentos reciben 409)
+                with anyio.CancelScope(shield=True):
+                    await anyio.to_thread.run_sync(_release, claim)
@@ -0,0 +1,212 @@
+# backend/app/ingest.py
+"""
+Carga masiva de movimientos: lectura del cuerpo en streaming (JSON, NDJSON o CSV),
+validación por bloques contra TransactionCreate e inserción multi-fila.
+"""
+import codecs
+import csv
+import json
+from typing import Iterable, Iterator, Optional, Tuple
+
+import anyio
+from pydantic import ValidationError
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from . import schemas, stock
+
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = {
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "text/csv": "csv",
+}
+
+# Columnas del libro que se escriben en cada fila (todas las filas con las mismas claves)
+LEDGER_COLUMNS = (
+    "id_product", "id_warehouse", "type_transaction", "id_planification_expense_request",
+    "id_kit", "quantaty_kit", "quantaty_products", "description", "expiration_date", "add_user",
+)
+
+
+def detect_format(content_type: Optional[str]) -> Optional[str]:
+    mime = (content_type or "").split(";")[0].strip().lower()
+    return FORMATS.get(mime)
+
+
+def sync_chunks(request) -> Iterator[bytes]:
+    """
+    Recorre el cuerpo asíncrono de la petición desde un hilo del threadpool,
+    para poder parsear y escribir en la BD con código síncrono sin cargarlo entero.
+    """
+    it = request.stream().__aiter__()
+    while True:
+        try:
+            chunk = anyio.from_thread.run(it.__anext__)
+        except StopAsyncIteration:
+            return
+        if chunk:
+            yield chunk
+
+
+def _lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Decodifica UTF-8 de forma incremental y corta en líneas (conservando el salto)."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *complete, pending = pending.split("\n")
+        for line in complete:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def iter_records(chunks: Iterable[bytes], fmt: str) -> Iterator[Tuple[int, object]]:
+    """
+    Devuelve (número de fila, dict) por cada registro; si el registro no se pudo
+    leer, en lugar del dict viene el mensaje de error. Las filas empiezan en 1.
+    Un arreglo JSON se tiene que leer completo; NDJSON y CSV se leen en streaming.
+    """
+    if fmt == "json":
+        try:
+            data = json.loads(b"".join(chunks))
+        except ValueError as e:
+            yield 1, f"Invalid JSON: {e}"
+            return
+        if not isinstance(data, list):
+            yield 1, "JSON body must be an array of transactions"
+            return
+        yield from enumerate(data, start=1)
+    elif fmt == "ndjson":
+        n = 0
+        for line in _lines(chunks):
+            if not line.strip():
+                continue
+            n += 1
+            try:
+                yield n, json.loads(line)
+            except ValueError as e:
+                yield n, f"Invalid JSON: {e}"
+    else:
+        # csv.DictReader acepta saltos de línea dentro de campos entre comillas
+        reader = csv.DictReader(_lines(chunks))
+        for n, rec in enumerate(reader, start=1):
+            yield n, {k: (v if v != "" else None) for k, v in rec.items() if k}
+
+
+def ledger_row(item: schemas.TransactionCreate) -> dict:
+    """Fila para stock.insert_movements a partir de un TransactionCreate ya validado."""
+    return {k: getattr(item, k) for k in LEDGER_COLUMNS}
+
+
+def _to_row(record) -> dict:
+    item = schemas.TransactionCreate.model_validate(record)
+    if item.type_transaction not in (0, 1):
+        raise ValueError("type_transaction must be 0 (in) or 1 (out)")
+    return ledger_row(item)
+
+
+# Errores de escritura de un lote: de la BD o por existencia insuficiente
+WRITE_ERRORS = (DBAPIError, stock.InsufficientStock)
+
+
+def _write_error(e: Exception) -> str:
+    return str(e.orig) if isinstance(e, DBAPIError) else str(e)
+
+
+def _error(errors: list, row: int, detail) -> None:
+    if len(errors) < MAX_REPORTED_ERRORS:
+        errors.append({"row": row, "detail": detail})
+
+
+def ingest(db: Session, records: Iterable[Tuple[int, object]], atomic: bool, batch_size: int) -> dict:
+    """
+    Valida e inserta los registros por lotes de `batch_size`.
+
+    atomic=True: todo en una transacción; con un solo error no se inserta nada.
+    atomic=False: cada lote se confirma por separado y las filas inválidas se
+    omiten; si un lote falla en la BD se reintenta fila por fila para aislar la culpable.
+    """
+    received = inserted = failed = 0
+    errors: list = []
+    batch: list = []  # [(fila, dict)]
+
+    def flush():
+        nonlocal inserted, failed
+        if not batch:
+            return
+        rows = [r for _, r in batch]
+        if atomic:
+            stock.insert_movements(db, rows)
+            inserted += len(rows)
+        else:
+            try:
+                stock.insert_movements(db, rows)
+                db.commit()
+                inserted += len(rows)
+            except WRITE_ERRORS:
+                db.rollback()
+                for n, r in batch:
+                    try:
+                        with db.begin_nested():
+                            stock.insert_movements(db, [r])
+                        inserted += 1
+                    except WRITE_ERRORS as e:
+                        failed += 1
+                        _error(errors, n, _write_error(e))
+                db.commit()
+        batch.clear()
+
+    try:
+        for n, record in records:
+            received += 1
+            if isinstance(record, str):
+                failed += 1
+                _error(errors, n, record)
+                continue
+            try:
+                batch.append((n, _to_row(record)))
+            except ValidationError as e:
+                failed += 1
+                _error(errors, n, e.errors(include_url=False, include_input=False, include_context=False))
+                continue
+            except ValueError as e:
+                failed += 1
+                _error(errors, n, str(e))
+                continue
+            if len(batch) >= batch_size:
+                if atomic and failed:
+                    batch.clear()  # ya no se va a confirmar nada: solo validar el resto
+                    continue
+                flush()
+        if not (atomic and failed):
+            flush()
+    except WRITE_ERRORS as e:
+        db.rollback()
+        return {
+            "mode": "atomic" if atomic else "best_effort",
+            "received": received,
+            "inserted": 0 if atomic else inserted,
+            "failed": received - (0 if atomic else inserted),
+            "errors": errors + [{"row": None, "detail": _write_error(e)}],
+        }
+
+    if atomic:
+        if failed:
+            db.rollback()
+            inserted = 0
+        else:
+            db.commit()
+
+    return {
+        "mode": "atomic" if atomic else "best_effort",
+        "received": received,
+        "inserted": inserted,
+        "failed": failed,
+        "errors": errors,
+    }
@@ -0,0 +1,254 @@
+# backend/app/lots.py
+"""
+Saldos por lote (producto, bodega, vencimiento) con asignación FEFO.
+
+- Una entrada (type_transaction=0) suma al lote de su expiration_date.
+- Las salidas bloquean (FOR UPDATE) los lotes con existencia del producto en la
+  bodega. Una salida con expiration_date consume primero ese lote, hasta lo que
+  tenga; el resto, y las salidas sin expiration_date, se asignan
+  First-Expired-First-Out, del vencimiento más próximo al más lejano. Lo que no
+  alcance queda como negativo en el lote sin vencimiento, así que la suma de los
+  lotes siempre coincide con tab_stock_balance.
+- Lo que consumió cada salida queda en tab_lot_allocation; al modificar o borrar
+  la salida se devuelve a sus lotes y se vuelve a asignar.
+
+Igual que app.stock, las escrituras ORM pasan por un after_flush y las escrituras
+Core (stock.insert_movements) llaman a record_movements().
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, event, func, insert, inspect, select, tuple_, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from . import stock
+from .models import TabLotAllocation, TabProductTransaction, TabStockLot
+
+NO_EXPIRY = datetime(9999, 12, 31)
+REBUILD_CHUNK = 1000
+
+lot = TabStockLot.__table__
+allocation = TabLotAllocation.__table__
+ledger = TabProductTransaction.__table__
+
+# (id_product, id_warehouse, vencimiento) -> cantidad
+LotDeltas = Dict[Tuple[int, int, datetime], int]
+
+_KEYS = ("id_product", "id_warehouse", "type_transaction", "quantaty_products", "expiration_date")
+
+
+def lot_key(expiration_date: Optional[datetime]) -> datetime:
+    return expiration_date or NO_EXPIRY
+
+
+def apply_lot_deltas(conn: Connection, deltas: LotDeltas) -> None:
+    params = [
+        {"id_product": p, "id_warehouse": w, "expiration_date": e, "qty": q}
+        for (p, w, e), q in deltas.items()
+        if q
+    ]
+    if not params:
+        return
+    stmt = stock.upsert_add(conn.dialect.name, lot, ("id_product", "id_warehouse", "expiration_date"), ("qty",))
+    if stmt is not None:
+        conn.execute(stmt, params)
+        return
+    for prm in params:
+        res = conn.execute(
+            update(lot)
+            .where(
+                lot.c.id_product == prm["id_product"],
+                lot.c.id_warehouse == prm["id_warehouse"],
+                lot.c.expiration_date == prm["expiration_date"],
+            )
+            .values(qty=lot.c.qty + prm["qty"], mod_date=func.now())
+        )
+        if res.rowcount == 0:
+            conn.execute(insert(lot).values(**prm))
+
+
+def release(conn: Connection, tx_ids: List[int], deltas: LotDeltas) -> None:
+    """Devuelve a sus lotes (en `deltas`) lo que habían consumido las salidas `tx_ids`."""
+    if not tx_ids:
+        return
+    rows = conn.execute(
+        select(allocation.c.id_product, allocation.c.id_warehouse, allocation.c.expiration_date, allocation.c.qty)
+        .where(allocation.c.id_product_transaction.in_(tx_ids))
+    ).all()
+    for p, w, e, q in rows:
+        deltas[(p, w, e)] += q
+    conn.execute(delete(allocation).where(allocation.c.id_product_transaction.in_(tx_ids)))
+
+
+def allocate(conn: Connection, outflows: List[dict]) -> None:
+    """
+    Asigna lotes a las salidas (dicts con id_product_transaction, id_product,
+    id_warehouse, quantaty_products, expiration_date) y los descuenta.
+    Una consulta con bloqueo para todas las salidas, un upsert y un INSERT.
+    """
+    if not outflows:
+        return
+    deltas: LotDeltas = defaultdict(int)
+    allocations = []
+
+    available: Dict[Tuple[int, int], list] = defaultdict(list)
+    pairs = sorted({(o["id_product"], o["id_warehouse"]) for o in outflows})
+    rows = conn.execute(
+        select(lot.c.id_product, lot.c.id_warehouse, lot.c.expiration_date, lot.c.qty)
+        .where(tuple_(lot.c.id_product, lot.c.id_warehouse).in_(pairs), lot.c.qty > 0)
+        .order_by(lot.c.id_product, lot.c.id_warehouse, lot.c.expiration_date)
+        .with_for_update()
+    ).all()
+    for p, w, e, q in rows:
+        available[(p, w)].append([e, q])
+
+    def take(entry, remaining: int, parts: Dict[datetime, int]) -> int:
+        use = min(entry[1], remaining)
+        if use > 0:
+            entry[1] -= use
+            parts[entry[0]] += use
+            remaining -= use
+        return remaining
+
+    for o in outflows:
+        p, w = o["id_product"], o["id_warehouse"]
+        remaining = o.get("quantaty_products") or 0
+        parts: Dict[datetime, int] = defaultdict(int)
+        if o.get("expiration_date") is not None:
+            # El lote pedido solo da lo que tiene; el resto sigue por FEFO
+            for entry in available[(p, w)]:
+                if entry[0] == o["expiration_date"]:
+                    remaining = take(entry, remaining, parts)
+                    break
+        for entry in available[(p, w)]:
+            if remaining <= 0:
+                break
+            remaining = take(entry, remaining, parts)
+        if remaining > 0:
+            # Sobregiro: se registra en el lote sin vencimiento
+            parts[NO_EXPIRY] += remaining
+        for e, q in parts.items():
+            deltas[(p, w, e)] -= q
+            allocations.append({
+                "id_product_transaction": o["id_product_transaction"],
+                "expiration_date": e,
+                "id_product": p,
+                "id_warehouse": w,
+                "qty": q,
+            })
+
+    apply_lot_deltas(conn, deltas)
+    if allocations:
+        conn.execute(insert(allocation), allocations)
+
+
+def record_movements(conn: Connection, rows: Iterable[dict]) -> None:
+    """Refleja en los lotes movimientos nuevos (dicts con id_product_transaction)."""
+    deltas: LotDeltas = defaultdict(int)
+    outflows = []
+    for r in rows:
+        if r["type_transaction"] == 0:
+            deltas[(r["id_product"], r["id_warehouse"], lot_key(r.get("expiration_date")))] += r.get("quantaty_products") or 0
+        else:
+            outflows.append(r)
+    apply_lot_deltas(conn, deltas)
+    allocate(conn, outflows)
+
+
+def _old_values(obj) -> dict:
+    return {k: stock._old_value(obj, k) for k in _KEYS}
+
+
+def _current_values(obj) -> dict:
+    values = {k: getattr(obj, k) for k in _KEYS}
+    values["id_product_transaction"] = obj.id_product_transaction
+    return values
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_lots(session: Session, flush_context):
+    """Traslada a los lotes los movimientos del libro que se acaban de escribir."""
+    deltas: LotDeltas = defaultdict(int)
+    released, new_rows = [], []
+
+    def reverse(obj):
+        old = _old_values(obj)
+        if old["type_transaction"] == 0:
+            deltas[(old["id_product"], old["id_warehouse"], lot_key(old["expiration_date"]))] -= old["quantaty_products"] or 0
+        else:
+            released.append(obj.id_product_transaction)
+
+    for obj in session.new:
+        if isinstance(obj, TabProductTransaction):
+            new_rows.append(_current_values(obj))
+    for obj in session.dirty:
+        if isinstance(obj, TabProductTransaction):
+            state = inspect(obj)
+            if any(state.attrs[k].history.has_changes() for k in _KEYS):
+                reverse(obj)
+                new_rows.append(_current_values(obj))
+    for obj in session.deleted:
+        if isinstance(obj, TabProductTransaction):
+            reverse(obj)
+
+    if not (deltas or released or new_rows):
+        return
+    # Entradas nuevas y reversiones van en un solo upsert; las salidas se asignan después
+    outflows = []
+    for r in new_rows:
+        if r["type_transaction"] == 0:
+            deltas[(r["id_product"], r["id_warehouse"], lot_key(r["expiration_date"]))] += r["quantaty_products"] or 0
+        else:
+            outflows.append(r)
+    conn = session.connection()
+    release(conn, released, deltas)
+    apply_lot_deltas(conn, deltas)
+    allocate(conn, outflows)
+
+
+def rebuild_lots(conn: Connection) -> int:
+    """
+    Recalcula lotes y asignaciones desde el libro: suma las entradas por
+    vencimiento y vuelve a asignar FEFO todas las salidas en orden de id.
+    """
+    conn.execute(delete(allocation))
+    conn.execute(delete(lot))
+    qty = func.coalesce(ledger.c.quantaty_products, 0)
+    exp = func.coalesce(ledger.c.expiration_date, NO_EXPIRY)
+    conn.execute(insert(lot).from_select(
+        ["id_product", "id_warehouse", "expiration_date", "qty"],
+        select(ledger.c.id_product, ledger.c.id_warehouse, exp, func.sum(qty))
+        .where(ledger.c.type_transaction == 0)
+        .group_by(ledger.c.id_product, ledger.c.id_warehouse, exp),
+    ))
+    # Por bloques de id (keyset) para no tener todo el libro en memoria
+    last_id = 0
+    while True:
+        chunk = conn.execute(
+            select(
+                ledger.c.id_product_transaction, ledger.c.id_product, ledger.c.id_warehouse,
+                ledger.c.quantaty_products, ledger.c.expiration_date,
+            )
+            .where(ledger.c.type_transaction != 0, ledger.c.id_product_transaction > last_id)
+            .order_by(ledger.c.id_product_transaction)
+            .limit(REBUILD_CHUNK)
+        ).mappings().all()
+        if not chunk:
+            break
+        allocate(conn, [dict(r) for r in chunk])
+        last_id = chunk[-1]["id_product_transaction"]
+    return conn.execute(select(func.count()).select_from(lot)).scalar() or 0
+
+
+def expiring(db: Session, until: datetime, since: Optional[datetime] = None, id_warehouse: Optional[int] = None):
+    """Lotes con existencia que vencen antes de `until` (y desde `since`, si se indica)."""
+    stmt = select(lot.c.id_product, lot.c.id_warehouse, lot.c.expiration_date, lot.c.qty).where(
+        lot.c.expiration_date < until, lot.c.qty > 0
+    )
+    if since is not None:
+        stmt = stmt.where(lot.c.expiration_date >= since)
+    if id_warehouse is not None:
+        stmt = stmt.where(lot.c.id_warehouse == id_warehouse)
+    return db.execute(stmt.order_by(lot.c.expiration_date, lot.c.id_warehouse, lot.c.id_product)).all()
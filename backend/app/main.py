@@ -1,16 +1,24 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 import os
 
 from .config import settings
-from .database import Base, engine
-from .routers import health, products, warehouses, kits, transactions
+from . import database
+from .database import engine
+from .pagination import NEXT_CURSOR_HEADER
+from .idempotency import IdempotencyMiddleware
+from .metrics import MetricsMiddleware
+from .migrate import upgrade
+from .stock import InsufficientStock
+from .routers import changes, health, metrics, photos, products, warehouses, kits, transactions
 
 # ---------- App ----------
 app = FastAPI(title="Warehouse API", version="0.1.0")
 
-# Crear tablas si no existen (no altera las existentes)
-Base.metadata.create_all(bind=engine)
+# Aplicar migraciones pendientes (python migrate.py hace lo mismo a mano)
+if settings.auto_migrate:
+    upgrade(engine)
 
 # ---------- CORS para Producción ----------
 # Obtener orígenes desde variable de entorno o usar valor por defecto
@@ -23,20 +31,48 @@ if cors_origins_str == "*":
 else:
     origins = [origin.strip() for origin in cors_origins_str.split(",")]
 
+# Reintentos con Idempotency-Key devuelven la respuesta original (dentro de CORS y métricas)
+app.add_middleware(IdempotencyMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Idempotent-Replayed", "X-Read-After", "X-Read-Source"],
 )
+# Réplicas de lectura: token de lectura-tras-escritura y X-Read-Source
+if database.REPLICA_URLS:
+    from .replicas import ReadRoutingMiddleware
+    app.add_middleware(ReadRoutingMiddleware)
+# Latencia por ruta, sentencias SQL y tiempo de BD por petición (GET /metrics)
+app.add_middleware(MetricsMiddleware)
+
+# Salida (o cambio/baja de una entrada) que dejaría existencia negativa, desde cualquier ruta
+@app.exception_handler(InsufficientStock)
+async def insufficient_stock(request: Request, exc: InsufficientStock):
+    return JSONResponse(
+        status_code=409,
+        content={
+            "detail": str(exc),
+            "shortages": [{"id_product": p, "id_warehouse": w, "stock": s} for p, w, s in exc.shortages],
+        },
+    )
 
 # ---------- Routers ----------
+# Con DB_ASYNC=true las versiones async de los endpoints calientes van primero y atienden esas rutas
+if settings.db_async:
+    from .routers import async_routes
+    app.include_router(async_routes.router)
+
 app.include_router(health.router)
+app.include_router(metrics.router)
 app.include_router(products.router)
 app.include_router(warehouses.router)
 app.include_router(kits.router)
 app.include_router(transactions.router)
+app.include_router(photos.router)
+app.include_router(changes.router)
 
 # ---------- Root ----------
 @app.get("/")
@@ -0,0 +1,336 @@
+# backend/app/metrics.py
+"""
+Instrumentación de peticiones y SQL en formato Prometheus.
+
+- MetricsMiddleware (ASGI) mide la latencia de cada petición por ruta (plantilla,
+  p. ej. /transactions/{tx_id}) y abre un RequestStats en un ContextVar.
+- Los eventos before/after_cursor_execute de Engine cuentan las sentencias y el
+  tiempo en base de datos de la petición en curso, y registran en el logger
+  "app.slowquery" las que superan SLOW_QUERY_MS (sentencia + forma de parámetros,
+  nunca los valores).
+- render() arma el texto que sirve GET /metrics, junto con el estado de los pools.
+"""
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from . import database, refcache
+from .config import settings
+from .pool import WAIT_BUCKETS_MS, pool_status
+
+slow_log = logging.getLogger("app.slowquery")
+
+LATENCY_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+BATCH_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Histogram:
+    """Histograma con etiquetas; cada serie guarda cubetas, suma y cuenta."""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...], labels: Tuple[str, ...]):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values) -> None:
+        with self._lock:
+            s = self._series.get(label_values)
+            if s is None:
+                s = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    s[0][i] += 1
+                    break
+            s[1] += value
+            s[2] += 1
+
+    def lines(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = [(k, list(v[0]), v[1], v[2]) for k, v in self._series.items()]
+        for label_values, counts, total, n in series:
+            base = _labels(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(zip(self.labels, label_values), le=bound)} {cumulative}"
+            yield f"{self.name}_bucket{_labels(zip(self.labels, label_values), le='+Inf')} {n}"
+            yield f"{self.name}_sum{base} {total:.6f}"
+            yield f"{self.name}_count{base} {n}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def lines(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            yield f"{self.name}{_labels(zip(self.labels, label_values))} {value:g}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs, **extra) -> str:
+    items = [f'{k}="{_escape(v)}"' for k, v in list(pairs) + list(extra.items())]
+    return "{" + ",".join(items) + "}" if items else ""
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Latencia de la petición por ruta",
+    LATENCY_BUCKETS_S, ("method", "route", "status"),
+)
+REQUEST_STATEMENTS = Histogram(
+    "http_request_db_statements", "Sentencias SQL emitidas por petición",
+    STATEMENT_BUCKETS, ("method", "route"),
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds", "Tiempo en base de datos por petición",
+    LATENCY_BUCKETS_S, ("method", "route"),
+)
+DB_STATEMENTS = Counter("db_statements_total", "Sentencias SQL ejecutadas", ("operation",))
+SLOW_QUERIES = Counter("db_slow_queries_total", "Sentencias más lentas que SLOW_QUERY_MS", ("operation",))
+IDEMPOTENCY = Counter(
+    "idempotency_requests_total",
+    "Escrituras con Idempotency-Key por resultado (stored, replayed_memory, replayed_db, in_progress, processed, mismatch)",
+    ("outcome",),
+)
+VERSION_BUMPS = Counter(
+    "version_bumps_total", "Rondas de incremento de versiones (app/versions.py) por resultado (ok, failed)",
+    ("outcome",),
+)
+
+READ_ROUTING = Counter(
+    "db_read_routing_total",
+    "Lecturas de get_read_db por destino (primary, replicaN) y motivo (ok, down, lag, read_after)",
+    ("target", "reason"),
+)
+GROUP_COMMIT_ROWS = Histogram(
+    "group_commit_batch_rows", "Filas por lote del group commit de POST /transactions", BATCH_BUCKETS, (),
+)
+GROUP_COMMIT_FLUSH = Histogram(
+    "group_commit_flush_seconds", "Duración de cada lote (INSERT multi-fila + commit)", LATENCY_BUCKETS_S, (),
+)
+GROUP_COMMIT_WAIT = Histogram(
+    "group_commit_wait_seconds", "Espera de cada alta desde que entra a la cola hasta su commit",
+    LATENCY_BUCKETS_S, (),
+)
+
+
+# ---------- Contexto por petición ----------
+
+class RequestStats:
+    __slots__ = ("statements", "db_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+
+
+# El objeto es mutable: los endpoints síncronos corren en el threadpool con una copia
+# del contexto, pero esa copia apunta al mismo RequestStats
+current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def _operation(statement: str) -> str:
+    word = statement.lstrip().split(None, 1)
+    return word[0].upper() if word else "OTHER"
+
+
+def _params_shape(parameters, executemany: bool) -> str:
+    """Describe los parámetros sin exponer valores: nombres/cantidad y filas en executemany."""
+    if executemany and parameters:
+        return f"executemany x{len(parameters)} of {_params_shape(parameters[0], False)}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(v).__name__ for v in parameters) + ")"
+    return type(parameters).__name__
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _observe(statement, parameters, executemany, elapsed: float) -> None:
+    operation = _operation(statement)
+    DB_STATEMENTS.inc(operation)
+
+    stats = current.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += elapsed
+
+    if elapsed * 1000 >= settings.slow_query_ms:
+        SLOW_QUERIES.inc(operation)
+        slow_log.warning(
+            "slow query %.1f ms: %s | params %s",
+            elapsed * 1000, " ".join(statement.split()), _params_shape(parameters, executemany),
+        )
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _observe(statement, parameters, executemany, time.perf_counter() - conn.info["query_start"].pop())
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(ctx):
+    # La sentencia que falla (p. ej. un INSERT duplicado) no llega a after_cursor_execute:
+    # sin esto su inicio queda en la pila y no se cuenta
+    conn = ctx.connection
+    starts = conn.info.get("query_start") if conn is not None else None
+    if not starts or ctx.statement is None:
+        return
+    executemany = bool(ctx.execution_context is not None and ctx.execution_context.executemany)
+    _observe(ctx.statement, ctx.parameters, executemany, time.perf_counter() - starts.pop())
+
+
+# ---------- Middleware ----------
+
+class MetricsMiddleware:
+    """Middleware ASGI puro: mide hasta el último fragmento del cuerpo (incluye streaming)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = current.set(stats)
+        status = {"code": 500}
+        t0 = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current.reset(token)
+            route = scope.get("route")
+            # Rutas sin coincidencia (404) se agrupan para no crear una serie por URL
+            path = getattr(route, "path", None) or "<unmatched>"
+            method = scope["method"]
+            REQUEST_LATENCY.observe(time.perf_counter() - t0, method, path, status["code"])
+            REQUEST_STATEMENTS.observe(stats.statements, method, path)
+            REQUEST_DB_TIME.observe(stats.db_seconds, method, path)
+
+
+# ---------- Exposición ----------
+
+def _pool_lines():
+    pools = {role: pool_status(eng.pool) for role, eng in database.engines.items()}
+    if database.async_engine is not None:
+        pools["async"] = pool_status(database.async_engine.pool)
+
+    gauges = (
+        ("db_pool_size", "size", "Conexiones fijas del pool"),
+        ("db_pool_checked_out", "checked_out", "Conexiones en uso"),
+        ("db_pool_overflow", "overflow", "Conexiones abiertas por encima de pool_size"),
+        ("db_pool_max_overflow", "max_overflow", "Límite de overflow"),
+    )
+    for name, key, help_text in gauges:
+        yield f"# HELP {name} {help_text}"
+        yield f"# TYPE {name} gauge"
+        for role, st in pools.items():
+            if key in st:
+                yield f"{name}{_labels([('pool', role)])} {st[key]}"
+
+    yield "# HELP db_pool_checkout_timeouts_total Checkouts que agotaron pool_timeout"
+    yield "# TYPE db_pool_checkout_timeouts_total counter"
+    for role, st in pools.items():
+        if "timeouts" in st:
+            yield f"db_pool_checkout_timeouts_total{_labels([('pool', role)])} {st['timeouts']}"
+
+    name = "db_pool_checkout_wait_seconds"
+    yield f"# HELP {name} Espera para obtener una conexión del pool"
+    yield f"# TYPE {name} histogram"
+    for role, st in pools.items():
+        histogram = st.get("wait_histogram_ms")
+        if histogram is None:
+            continue
+        for bound in list(WAIT_BUCKETS_MS) + ["+Inf"]:
+            le = bound if bound == "+Inf" else bound / 1000
+            yield f"{name}_bucket{_labels([('pool', role)], le=le)} {histogram[str(bound)]}"
+        yield f"{name}_sum{_labels([('pool', role)])} {st['wait_sum_ms'] / 1000:.6f}"
+        yield f"{name}_count{_labels([('pool', role)])} {st['checkouts'] + st['timeouts']}"
+
+
+def _refcache_lines():
+    caches = {"products": refcache.products, "warehouses": refcache.warehouses, "kits": refcache.kits}
+    stats = {name: cache.stats() for name, cache in caches.items()}
+    for name, key, kind, help_text in (
+        ("refcache_entries", "size", "gauge", "Entradas en el caché de catálogos"),
+        ("refcache_hits_total", "hits", "counter", "Ids resueltos desde el caché"),
+        ("refcache_misses_total", "misses", "counter", "Ids leídos de la base de datos"),
+    ):
+        yield f"# HELP {name} {help_text}"
+        yield f"# TYPE {name} {kind}"
+        for catalog, st in stats.items():
+            yield f"{name}{_labels([('catalog', catalog)])} {st[key]}"
+
+
+def _version_lines():
+    from . import versions  # importa metrics: aquí para no crear un ciclo
+
+    yield "# HELP version_bumps_pending Conjuntos con un incremento de versión fallido esperando reintento"
+    yield "# TYPE version_bumps_pending gauge"
+    yield f"version_bumps_pending {versions._publisher.pending()}"
+
+
+def _replica_lines():
+    from . import replicas  # importa database y metrics: aquí para no crear un ciclo
+
+    status = replicas.status()
+    if not status:
+        return
+    yield "# HELP db_replica_up Réplica disponible para lecturas (último chequeo)"
+    yield "# TYPE db_replica_up gauge"
+    for st in status:
+        yield f"db_replica_up{_labels([('replica', st['replica'])])} {int(st['up'])}"
+    yield "# HELP db_replica_lag_seconds Atraso estimado de la réplica respecto del primario"
+    yield "# TYPE db_replica_lag_seconds gauge"
+    for st in status:
+        if st["lag_s"] is not None:
+            yield f"db_replica_lag_seconds{_labels([('replica', st['replica'])])} {st['lag_s']}"
+
+
+def render() -> str:
+    lines = []
+    for metric in (REQUEST_LATENCY, REQUEST_STATEMENTS, REQUEST_DB_TIME, DB_STATEMENTS, SLOW_QUERIES, IDEMPOTENCY,
+                   VERSION_BUMPS, READ_ROUTING, GROUP_COMMIT_ROWS, GROUP_COMMIT_FLUSH, GROUP_COMMIT_WAIT):
+        lines.extend(metric.lines())
+    lines.extend(_pool_lines())
+    lines.extend(_refcache_lines())
+    lines.extend(_version_lines())
+    lines.extend(_replica_lines())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,238 @@
+# backend/app/migrate.py
+"""
+Migraciones versionadas del esquema.
+
+Cada archivo app/migrations/NNNN_nombre.py define upgrade(conn) y se aplica una
+sola vez, en orden, registrando la versión en tab_schema_migrations. Las
+migraciones deben ser idempotentes (checkfirst / IF NOT EXISTS): la base puede
+venir de create_all o de los scripts de sql/. Tampoco deben usar los modelos
+vivos de app.models para crear tablas o índices que ya existían al escribirlas:
+cada una declara lo que crea, tal como era en ese momento.
+
+upgrade() corre con un lock de la base (pg_advisory_lock en PostgreSQL,
+GET_LOCK en MySQL/MariaDB, un archivo de lock junto a la base en SQLite): con
+varios workers arrancando a la vez, uno aplica las migraciones y los demás
+esperan y vuelven a leer las versiones aplicadas.
+
+check_plans() ejecuta EXPLAIN sobre las consultas calientes y avisa si alguna dejó
+de usar su índice; `python migrate.py check-plans` sale con código 1 en ese caso.
+"""
+import importlib.util
+import json
+import re
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Tuple
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, func, select, text
+from sqlalchemy.engine import Connection, Engine
+
+MIGRATIONS_DIR = Path(__file__).with_name("migrations")
+_FILE_RE = re.compile(r"^(\d{4})_(\w+)\.py$")
+
+LOCK_NAME = "warehouse_schema_migrations"
+LOCK_KEY = 0x5741524D  # clave del advisory lock de PostgreSQL ("WARM")
+LOCK_TIMEOUT_S = 600
+
+_meta = MetaData()
+schema_migrations = Table(
+    "tab_schema_migrations",
+    _meta,
+    Column("version", String(4), primary_key=True),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime, server_default=func.now(), nullable=False),
+)
+
+
+def available() -> List[Tuple[str, str, Path]]:
+    found = []
+    for path in MIGRATIONS_DIR.iterdir():
+        m = _FILE_RE.match(path.name)
+        if m:
+            found.append((m.group(1), m.group(2), path))
+    return sorted(found)
+
+
+def _load(path: Path):
+    spec = importlib.util.spec_from_file_location(f"app.migrations.m{path.stem}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def applied(conn: Connection) -> set:
+    _meta.create_all(bind=conn, checkfirst=True)
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def status(engine: Engine) -> List[Tuple[str, str, bool]]:
+    with engine.begin() as conn:
+        done = applied(conn)
+    return [(version, name, version in done) for version, name, _ in available()]
+
+
+@contextmanager
+def _sqlite_lock(engine: Engine):
+    database = engine.url.database
+    try:
+        import fcntl
+    except ImportError:  # Windows: un solo proceso en desarrollo
+        fcntl = None
+    if fcntl is None or not database or database == ":memory:":
+        yield
+        return
+    with open(f"{database}.migrate.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@contextmanager
+def migration_lock(engine: Engine):
+    """Lock exclusivo entre procesos mientras se aplican migraciones."""
+    dialect = engine.dialect.name
+    if dialect == "sqlite":
+        with _sqlite_lock(engine):
+            yield
+        return
+    if dialect not in ("postgresql", "mysql", "mariadb"):
+        yield
+        return
+    # Locks de sesión: se toman y sueltan en una conexión propia que queda abierta mientras tanto
+    with engine.connect() as conn:
+        if dialect == "postgresql":
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": LOCK_KEY})
+        else:
+            got = conn.execute(text("SELECT GET_LOCK(:name, :timeout)"), {"name": LOCK_NAME, "timeout": LOCK_TIMEOUT_S}).scalar()
+            if got != 1:
+                raise RuntimeError(f"No se obtuvo el lock de migraciones en {LOCK_TIMEOUT_S} s")
+        conn.commit()  # el lock es de la sesión: no deja una transacción abierta
+        try:
+            yield
+        finally:
+            if dialect == "postgresql":
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LOCK_KEY})
+            else:
+                conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME})
+            conn.commit()
+
+
+def upgrade(engine: Engine) -> List[str]:
+    """Aplica las migraciones pendientes, cada una en su propia transacción."""
+    ran = []
+    with migration_lock(engine):
+        # Dentro del lock: otro proceso pudo aplicarlas mientras se esperaba
+        with engine.begin() as conn:
+            done = applied(conn)
+        for version, name, path in available():
+            if version in done:
+                continue
+            module = _load(path)
+            with engine.begin() as conn:
+                module.upgrade(conn)
+                conn.execute(schema_migrations.insert().values(version=version, name=name))
+            ran.append(f"{version}_{name}")
+    return ran
+
+
+# ---------- Regresión de planes de ejecución ----------
+
+# (nombre, SQL, índices aceptados). "PRIMARY" = clave primaria de la tabla.
+HOT_QUERIES = (
+    (
+        "stock_lookup",
+        "SELECT qty_in, qty_out, stock FROM tab_stock_balance WHERE id_product = 1 AND id_warehouse = 1",
+        ("PRIMARY",),
+    ),
+    (
+        "ledger_stock_by_type",
+        "SELECT SUM(quantaty_products) FROM tab_product_transaction "
+        "WHERE id_warehouse = 1 AND id_product = 1 AND type_transaction = 0",
+        ("ix_tr_wh_prod_type_qty", "ix_tr_prod_wh_type_qty"),
+    ),
+    (
+        "ledger_group_by_product_warehouse",
+        "SELECT id_product, id_warehouse, type_transaction, SUM(quantaty_products) "
+        "FROM tab_product_transaction GROUP BY id_product, id_warehouse, type_transaction",
+        ("ix_tr_prod_wh_type_qty",),
+    ),
+    (
+        "kit_components",
+        "SELECT id_product, quantaty FROM tab_kit_composition WHERE id_kit = 1",
+        ("ix_kc_kit_prod_qty",),
+    ),
+    (
+        "lots_expiring",
+        "SELECT id_product, id_warehouse, expiration_date, qty FROM tab_stock_lot "
+        "WHERE expiration_date >= '2025-01-01' AND expiration_date < '2025-02-01' AND qty > 0",
+        ("ix_lot_exp_wh_prod_qty",),
+    ),
+    (
+        "ledger_page_by_add_date",
+        "SELECT id_product_transaction FROM tab_product_transaction "
+        "ORDER BY add_date DESC, id_product_transaction DESC LIMIT 100",
+        ("ix_tr_add_date_id",),
+    ),
+)
+
+
+def _indexes_sqlite(conn: Connection, sql: str) -> set:
+    used = set()
+    for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")):
+        detail = row[-1]
+        m = re.search(r"USING (?:COVERING )?INDEX (\w+)", detail)
+        if m:
+            name = m.group(1)
+            used.add("PRIMARY" if name.startswith("sqlite_autoindex_") else name)
+        if "PRIMARY KEY" in detail:
+            used.add("PRIMARY")
+    return used
+
+
+def _indexes_mysql(conn: Connection, sql: str) -> set:
+    rows = conn.execute(text(f"EXPLAIN {sql}")).mappings().all()
+    return {r["key"] for r in rows if r["key"]}
+
+
+def _indexes_postgresql(conn: Connection, sql: str) -> set:
+    # Con tablas pequeñas el planificador prefiere Seq Scan: se desactiva solo para el EXPLAIN
+    conn.execute(text("SET LOCAL enable_seqscan = off"))
+    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    used = set()
+
+    def walk(node):
+        if isinstance(node, dict):
+            name = node.get("Index Name")
+            if name:
+                used.add("PRIMARY" if name.endswith("_pkey") else name)
+            for v in node.values():
+                walk(v)
+        elif isinstance(node, list):
+            for v in node:
+                walk(v)
+
+    walk(plan)
+    return used
+
+
+def check_plans(engine: Engine) -> List[Tuple[str, bool, set]]:
+    """Devuelve (consulta, ok, índices usados) para cada consulta caliente."""
+    explain = {
+        "sqlite": _indexes_sqlite,
+        "mysql": _indexes_mysql,
+        "mariadb": _indexes_mysql,
+        "postgresql": _indexes_postgresql,
+    }.get(engine.dialect.name)
+    if explain is None:
+        raise RuntimeError(f"EXPLAIN no soportado para {engine.dialect.name}")
+
+    results = []
+    for name, sql, expected in HOT_QUERIES:
+        with engine.begin() as conn:
+            used = explain(conn, sql)
+        results.append((name, bool(used & set(expected)), used))
+    return results
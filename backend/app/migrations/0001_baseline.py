@@ -0,0 +1,100 @@
+"""
+Esquema base: tablas del catálogo, el libro y los saldos tal como eran al
+introducir las migraciones (las tablas posteriores las crea cada migración).
+
+Si la base se creó con sql/01_schema.sql, el catálogo de productos se llama
+tab_products; se renombra a tab_productos, que es el nombre que usa el ORM.
+"""
+from sqlalchemy import (
+    Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table, Text, func, inspect, text
+)
+
+meta = MetaData()
+
+
+def _audit():
+    return (
+        Column("add_user", Integer, nullable=True),
+        Column("add_date", DateTime, server_default=func.now(), nullable=False),
+        Column("mod_user", Integer, nullable=True),
+        Column("mod_date", DateTime, server_default=func.now(), onupdate=func.now(), nullable=False),
+    )
+
+
+Table(
+    "tab_productos", meta,
+    Column("id_product", Integer, primary_key=True, autoincrement=True, index=True),
+    Column("id_product_type", Integer, nullable=True),
+    Column("id_unit_measurement", Integer, nullable=True),
+    Column("code", Integer, nullable=False, unique=True, index=True),
+    Column("cname", String(255), nullable=False, index=True),
+    Column("description", Text, nullable=True),
+    Column("photo", String(512), nullable=True),
+    Column("unit_cost", Float, nullable=True),
+    *_audit(),
+)
+
+Table(
+    "tab_warehouse", meta,
+    Column("id_warehouse", Integer, primary_key=True, autoincrement=True, index=True),
+    Column("code", Integer, nullable=False, unique=True, index=True),
+    Column("cname", String(255), nullable=False, index=True),
+    Column("description", Text, nullable=True),
+    *_audit(),
+)
+
+Table(
+    "tab_kit", meta,
+    Column("id_kit", Integer, primary_key=True, autoincrement=True, index=True),
+    Column("code", Integer, nullable=False, unique=True, index=True),
+    Column("cname", String(255), nullable=False),
+    Column("description", String(255), nullable=True),
+    Column("photo", String(512), nullable=True),
+    *_audit(),
+)
+
+Table(
+    "tab_kit_composition", meta,
+    Column("id_kit_composition", Integer, primary_key=True, autoincrement=True, index=True),
+    Column("id_kit", Integer, ForeignKey("tab_kit.id_kit"), nullable=False),
+    Column("id_product", Integer, ForeignKey("tab_productos.id_product"), nullable=False),
+    Column("quantaty", Integer, nullable=False),
+    *_audit(),
+    Index("ix_kc_kit_prod_qty", "id_kit", "id_product", "quantaty"),
+)
+
+Table(
+    "tab_product_transaction", meta,
+    Column("id_product_transaction", Integer, primary_key=True, autoincrement=True, index=True),
+    Column("id_product", Integer, ForeignKey("tab_productos.id_product"), nullable=False),
+    Column("id_warehouse", Integer, ForeignKey("tab_warehouse.id_warehouse"), nullable=False),
+    Column("type_transaction", Integer, nullable=False),
+    Column("id_planification_expense_request", Integer, nullable=True),
+    Column("id_kit", Integer, ForeignKey("tab_kit.id_kit"), nullable=True),
+    Column("quantaty_kit", Integer, nullable=True),
+    Column("quantaty_products", Integer, nullable=False),
+    Column("description", Text, nullable=True),
+    Column("expiration_date", DateTime, nullable=True),
+    *_audit(),
+    Index("ix_tr_add_date_id", "add_date", "id_product_transaction"),
+    Index("ix_tr_mod_date_id", "mod_date", "id_product_transaction"),
+    Index("ix_tr_wh_prod_type_qty", "id_warehouse", "id_product", "type_transaction", "quantaty_products"),
+    Index("ix_tr_prod_wh_type_qty", "id_product", "id_warehouse", "type_transaction", "quantaty_products"),
+)
+
+Table(
+    "tab_stock_balance", meta,
+    Column("id_product", Integer, ForeignKey("tab_productos.id_product"), primary_key=True),
+    Column("id_warehouse", Integer, ForeignKey("tab_warehouse.id_warehouse"), primary_key=True, index=True),
+    Column("qty_in", Integer, nullable=False, default=0, server_default="0"),
+    Column("qty_out", Integer, nullable=False, default=0, server_default="0"),
+    Column("stock", Integer, nullable=False, default=0, server_default="0"),
+    Column("mod_date", DateTime, server_default=func.now(), onupdate=func.now(), nullable=False),
+)
+
+
+def upgrade(conn):
+    tables = set(inspect(conn).get_table_names())
+    if "tab_products" in tables and "tab_productos" not in tables:
+        conn.execute(text("ALTER TABLE tab_products RENAME TO tab_productos"))
+    meta.create_all(bind=conn)
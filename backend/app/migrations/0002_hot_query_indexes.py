@@ -0,0 +1,36 @@
+"""
+Índices compuestos de cobertura para las consultas calientes del libro y los kits,
+más el índice de texto sobre la descripción de los movimientos.
+"""
+from sqlalchemy import Column, Index, Integer, MetaData, Table
+
+from app.search import ensure_search_index
+
+meta = MetaData()
+
+
+def _cols(*names):
+    return [Column(n, Integer) for n in names]  # para CREATE INDEX solo importa el nombre
+
+
+transactions = Table(
+    "tab_product_transaction", meta,
+    *_cols("id_product_transaction", "id_product", "id_warehouse", "type_transaction", "quantaty_products",
+           "add_date", "mod_date"),
+)
+compositions = Table("tab_kit_composition", meta, *_cols("id_kit", "id_product", "quantaty"))
+
+t, kc = transactions.c, compositions.c
+INDEXES = (
+    Index("ix_tr_wh_prod_type_qty", t.id_warehouse, t.id_product, t.type_transaction, t.quantaty_products),
+    Index("ix_tr_prod_wh_type_qty", t.id_product, t.id_warehouse, t.type_transaction, t.quantaty_products),
+    Index("ix_tr_add_date_id", t.add_date, t.id_product_transaction),
+    Index("ix_tr_mod_date_id", t.mod_date, t.id_product_transaction),
+    Index("ix_kc_kit_prod_qty", kc.id_kit, kc.id_product, kc.quantaty),
+)
+
+
+def upgrade(conn):
+    for idx in INDEXES:
+        idx.create(conn, checkfirst=True)
+    ensure_search_index(conn)
@@ -0,0 +1,14 @@
+"""
+vw_inventory usaba la convención 1=entrada / 2=salida de sql/01_schema.sql, pero la
+API guarda 0=entrada / 1=salida. Se redefine sobre tab_stock_balance, que ya aplica
+la convención de la API.
+"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    conn.execute(text("DROP VIEW IF EXISTS vw_inventory"))
+    conn.execute(text(
+        "CREATE VIEW vw_inventory AS "
+        "SELECT id_product, id_warehouse, stock AS on_hand FROM tab_stock_balance"
+    ))
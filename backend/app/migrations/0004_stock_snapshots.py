@@ -0,0 +1,23 @@
+"""Tabla de saldos al cierre de periodo para consultar existencias a una fecha."""
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, MetaData, Table, func
+
+meta = MetaData()
+
+# Solo para resolver las FK; ya existen
+Table("tab_productos", meta, Column("id_product", Integer, primary_key=True))
+Table("tab_warehouse", meta, Column("id_warehouse", Integer, primary_key=True))
+
+snapshot = Table(
+    "tab_stock_snapshot", meta,
+    Column("snapshot_date", DateTime, primary_key=True),
+    Column("id_product", Integer, ForeignKey("tab_productos.id_product"), primary_key=True),
+    Column("id_warehouse", Integer, ForeignKey("tab_warehouse.id_warehouse"), primary_key=True),
+    Column("qty_in", Integer, nullable=False, default=0, server_default="0"),
+    Column("qty_out", Integer, nullable=False, default=0, server_default="0"),
+    Column("stock", Integer, nullable=False, default=0, server_default="0"),
+    Column("add_date", DateTime, server_default=func.now(), nullable=False),
+)
+
+
+def upgrade(conn):
+    snapshot.create(conn, checkfirst=True)
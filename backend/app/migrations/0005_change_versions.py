@@ -0,0 +1,21 @@
+"""Contadores de versión por tabla para ETag / If-None-Match (ver app/versions.py)."""
+from sqlalchemy import BigInteger, Column, MetaData, String, Table, select
+
+# app.versions.NAMES al escribir la migración
+NAMES = ("products", "warehouses", "kits", "stock")
+
+meta = MetaData()
+
+table = Table(
+    "tab_change_version", meta,
+    Column("table_name", String(64), primary_key=True),
+    Column("version", BigInteger, nullable=False, default=0, server_default="0"),
+)
+
+
+def upgrade(conn):
+    table.create(conn, checkfirst=True)
+    existing = set(conn.execute(select(table.c.table_name)).scalars())
+    missing = [{"table_name": name, "version": 0} for name in NAMES if name not in existing]
+    if missing:
+        conn.execute(table.insert(), missing)
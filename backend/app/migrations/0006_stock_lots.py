@@ -0,0 +1,118 @@
+"""
+Saldos por lote (vencimiento) y asignaciones FEFO de las salidas. Los lotes se
+calculan desde el libro: las salidas existentes se asignan FEFO en orden de id.
+
+El cálculo es una copia congelada de app.lots (entradas por vencimiento; cada
+salida consume su lote hasta lo que tenga, el resto FEFO y el faltante en el lote
+sin vencimiento): la migración no debe cambiar si cambia la lógica de la app.
+"""
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, MetaData, Table, delete, func, insert, select
+
+NO_EXPIRY = datetime(9999, 12, 31)
+CHUNK = 1000
+
+meta = MetaData()
+
+# Solo para resolver las FK; ya existen
+Table("tab_productos", meta, Column("id_product", Integer, primary_key=True))
+Table("tab_warehouse", meta, Column("id_warehouse", Integer, primary_key=True))
+
+ledger = Table(
+    "tab_product_transaction", meta,
+    Column("id_product_transaction", Integer, primary_key=True),
+    Column("id_product", Integer),
+    Column("id_warehouse", Integer),
+    Column("type_transaction", Integer),
+    Column("quantaty_products", Integer),
+    Column("expiration_date", DateTime),
+)
+
+lot = Table(
+    "tab_stock_lot", meta,
+    Column("id_product", Integer, ForeignKey("tab_productos.id_product"), primary_key=True),
+    Column("id_warehouse", Integer, ForeignKey("tab_warehouse.id_warehouse"), primary_key=True),
+    Column("expiration_date", DateTime, primary_key=True),
+    Column("qty", Integer, nullable=False, default=0, server_default="0"),
+    Column("mod_date", DateTime, server_default=func.now(), onupdate=func.now(), nullable=False),
+    Index("ix_lot_exp_wh_prod_qty", "expiration_date", "id_warehouse", "id_product", "qty"),
+)
+
+allocation = Table(
+    "tab_lot_allocation", meta,
+    Column("id_product_transaction", Integer, primary_key=True),
+    Column("expiration_date", DateTime, primary_key=True),
+    Column("id_product", Integer, nullable=False),
+    Column("id_warehouse", Integer, nullable=False),
+    Column("qty", Integer, nullable=False),
+)
+
+
+def _allocate(lots: dict, row) -> dict:
+    """Lo que consume la salida `row` de `lots` ({vencimiento: cantidad} de su producto y bodega)."""
+    remaining = row.quantaty_products or 0
+    parts = defaultdict(int)
+    order = sorted(lots)
+    if row.expiration_date is not None and row.expiration_date in lots:
+        order.insert(0, row.expiration_date)
+    for e in order:
+        if remaining <= 0:
+            break
+        use = min(lots[e], remaining)
+        if use > 0:
+            lots[e] -= use
+            parts[e] += use
+            remaining -= use
+    if remaining > 0:
+        lots[NO_EXPIRY] = lots.get(NO_EXPIRY, 0) - remaining
+        parts[NO_EXPIRY] += remaining
+    return parts
+
+
+def upgrade(conn):
+    lot.create(conn, checkfirst=True)
+    allocation.create(conn, checkfirst=True)
+    conn.execute(delete(allocation))
+    conn.execute(delete(lot))
+
+    # (producto, bodega) -> {vencimiento: cantidad}
+    lots = defaultdict(lambda: defaultdict(int))
+    for p, w, e, q in conn.execute(
+        select(ledger.c.id_product, ledger.c.id_warehouse, ledger.c.expiration_date,
+               func.sum(func.coalesce(ledger.c.quantaty_products, 0)))
+        .where(ledger.c.type_transaction == 0)
+        .group_by(ledger.c.id_product, ledger.c.id_warehouse, ledger.c.expiration_date)
+    ):
+        lots[(p, w)][e or NO_EXPIRY] += q or 0
+
+    # Salidas por bloques de id (keyset) para no tener todo el libro en memoria
+    last_id = 0
+    while True:
+        chunk = conn.execute(
+            select(ledger.c.id_product_transaction, ledger.c.id_product, ledger.c.id_warehouse,
+                   ledger.c.quantaty_products, ledger.c.expiration_date)
+            .where(ledger.c.type_transaction != 0, ledger.c.id_product_transaction > last_id)
+            .order_by(ledger.c.id_product_transaction)
+            .limit(CHUNK)
+        ).all()
+        if not chunk:
+            break
+        rows = []
+        for r in chunk:
+            for e, q in _allocate(lots[(r.id_product, r.id_warehouse)], r).items():
+                rows.append({
+                    "id_product_transaction": r.id_product_transaction, "expiration_date": e,
+                    "id_product": r.id_product, "id_warehouse": r.id_warehouse, "qty": q,
+                })
+        conn.execute(insert(allocation), rows)
+        last_id = chunk[-1].id_product_transaction
+
+    rows = [
+        {"id_product": p, "id_warehouse": w, "expiration_date": e, "qty": q}
+        for (p, w), by_exp in lots.items()
+        for e, q in by_exp.items()
+    ]
+    for i in range(0, len(rows), CHUNK):
+        conn.execute(insert(lot), rows[i:i + CHUNK])
@@ -0,0 +1,85 @@
+"""
+Fotos fuera de las filas. sql/01_schema.sql crea photo como LONGBLOB en
+tab_productos y tab_kit; cada imagen guardada ahí pasa al almacén de app.photos
+y la columna queda como VARCHAR(512) con la referencia "/photos/<sha>.<ext>".
+Los valores que ya eran texto (URLs) se conservan. Con create_all la columna ya
+es VARCHAR y no hay nada que hacer.
+"""
+import logging
+
+from sqlalchemy import column, inspect, select, table, text, update
+
+from app import photos
+
+log = logging.getLogger(__name__)
+
+CHUNK = 100  # filas por lectura: los BLOB pueden pesar varios MB
+
+TABLES = (("tab_productos", "id_product"), ("tab_kit", "id_kit"))
+
+
+def _convert(value: bytes):
+    """Referencia para una imagen, el texto si era una URL, o None si no se reconoce."""
+    if photos.sniff(value[:16]):
+        try:
+            digest, ext, size = photos.store.put_bytes(value)
+        except ValueError:  # firma de imagen pero contenido dañado, o demasiados píxeles
+            return None
+        photos.make_thumbnails(digest, ext)
+        return photos.describe(digest, ext, size, {})["photo"]
+    try:
+        decoded = value.decode("utf-8").strip()
+    except UnicodeDecodeError:
+        return None
+    return decoded if decoded and len(decoded) <= 512 else None
+
+
+def _migrate_table(conn, name: str, pk: str) -> None:
+    t = table(name, column(pk), column("photo"))
+    as_bytes = conn.dialect.name != "sqlite"  # la columna sigue siendo binaria hasta el ALTER
+    last, moved, dropped = 0, 0, 0
+    while True:
+        rows = conn.execute(
+            select(t.c[pk], t.c.photo)
+            .where(t.c[pk] > last, t.c.photo.isnot(None))
+            .order_by(t.c[pk])
+            .limit(CHUNK)
+        ).all()
+        if not rows:
+            break
+        for id_, value in rows:
+            if isinstance(value, str):
+                value = value.encode("utf-8")
+            ref = _convert(bytes(value))
+            moved += ref is not None
+            dropped += ref is None
+            if ref is not None and as_bytes:
+                ref = ref.encode("utf-8")
+            conn.execute(update(t).where(t.c[pk] == id_).values(photo=ref))
+        last = rows[-1][0]
+    if dropped:
+        log.warning("%s: %d fotos no reconocidas quedaron en NULL", name, dropped)
+    log.info("%s: %d fotos convertidas a referencia", name, moved)
+
+    if conn.dialect.name in ("mysql", "mariadb"):
+        conn.execute(text(f"ALTER TABLE {name} MODIFY photo VARCHAR(512) NULL"))
+    elif conn.dialect.name == "postgresql":
+        conn.execute(text(
+            f"ALTER TABLE {name} ALTER COLUMN photo TYPE VARCHAR(512) USING convert_from(photo, 'UTF8')"
+        ))
+
+
+def upgrade(conn):
+    insp = inspect(conn)
+    for name, pk in TABLES:
+        if not insp.has_table(name):
+            continue
+        col = next((c for c in insp.get_columns(name) if c["name"] == "photo"), None)
+        if col is None:
+            continue
+        try:
+            binary = col["type"].python_type is bytes
+        except NotImplementedError:
+            binary = False
+        if binary:
+            _migrate_table(conn, name, pk)
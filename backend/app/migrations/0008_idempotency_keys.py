@@ -0,0 +1,20 @@
+"""Respuestas guardadas por Idempotency-Key (ver app/idempotency.py)."""
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, MetaData, String, Table, Text
+
+meta = MetaData()
+
+# owner, heartbeat_at y committed_at llegan en 0011
+idempotency_key = Table(
+    "tab_idempotency_key", meta,
+    Column("idem_key", String(255), primary_key=True),
+    Column("fingerprint", String(64), nullable=False),
+    Column("status_code", Integer, nullable=True),
+    Column("headers", Text, nullable=True),
+    Column("body", LargeBinary(16 * 1024 * 1024), nullable=True),
+    Column("created_at", DateTime, nullable=False),
+    Column("expires_at", DateTime, nullable=False, index=True),
+)
+
+
+def upgrade(conn):
+    idempotency_key.create(conn, checkfirst=True)
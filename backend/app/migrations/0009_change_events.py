@@ -0,0 +1,17 @@
+"""Eventos para el feed de cambios por SSE (ver app/changefeed.py)."""
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, Text
+
+meta = MetaData()
+
+change_event = Table(
+    "tab_change_event", meta,
+    Column("id_event", Integer, primary_key=True, autoincrement=True),
+    Column("kind", String(32), nullable=False),
+    Column("payload", Text, nullable=False),
+    Column("created_at", DateTime, nullable=False, index=True),
+    sqlite_autoincrement=True,
+)
+
+
+def upgrade(conn):
+    change_event.create(conn, checkfirst=True)
@@ -0,0 +1,34 @@
+"""
+Unicidad de code en productos, bodegas y kits. Los routers ya no consultan el
+código antes del INSERT/UPDATE: el índice único lo garantiza y el choque se
+responde con 409. create_all ya crea esos índices únicos (ix_<tabla>_code), pero
+sql/01_schema.sql solo crea índices simples (idx_products_code, idx_wh_code,
+idx_kit_code). Si hay códigos repetidos la migración falla y los lista: hay que
+corregirlos a mano antes de volver a aplicarla.
+"""
+from sqlalchemy import Column, Index, Integer, MetaData, Table, func, inspect, select
+
+TABLES = ("tab_productos", "tab_warehouse", "tab_kit")
+
+
+def _has_unique_code(conn, name: str) -> bool:
+    insp = inspect(conn)
+    indexes = [i for i in insp.get_indexes(name) if i.get("unique")]
+    constraints = insp.get_unique_constraints(name)
+    return any(list(i["column_names"]) == ["code"] for i in indexes + constraints)
+
+
+def upgrade(conn):
+    meta = MetaData()
+    for name in TABLES:
+        if _has_unique_code(conn, name):
+            continue
+        t = Table(name, meta, Column("code", Integer))
+        dupes = conn.execute(
+            select(t.c.code, func.count()).group_by(t.c.code).having(func.count() > 1).order_by(t.c.code)
+        ).all()
+        if dupes:
+            listed = ", ".join(f"{code} ({n} filas)" for code, n in dupes[:20])
+            more = f" y {len(dupes) - 20} más" if len(dupes) > 20 else ""
+            raise RuntimeError(f"{name}: códigos repetidos, corregir antes de migrar: {listed}{more}")
+        Index(f"ux_{name}_code", t.c.code, unique=True).create(conn)
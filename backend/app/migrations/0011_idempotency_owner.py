@@ -0,0 +1,19 @@
+"""
+Reservas de Idempotency-Key con dueño y latido, y marca de escritura confirmada
+(ver app/idempotency.py). 0008 creó la tabla sin ellas; con create_all ya existen.
+"""
+from sqlalchemy import Column, DateTime, String, inspect, text
+
+COLUMNS = (
+    Column("owner", String(64), nullable=True),
+    Column("heartbeat_at", DateTime, nullable=True),
+    Column("committed_at", DateTime, nullable=True),
+)
+
+
+def upgrade(conn):
+    existing = {c["name"] for c in inspect(conn).get_columns("tab_idempotency_key")}
+    for col in COLUMNS:
+        if col.name not in existing:
+            ddl = col.type.compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE tab_idempotency_key ADD COLUMN {col.name} {ddl} NULL"))
@@ -1,12 +1,14 @@
 # backend/app/models.py
 from sqlalchemy import (
-    Column, Integer, String, Text, Float, DateTime, ForeignKey, func
+    BigInteger, Column, Integer, LargeBinary, String, Text, Float, DateTime, ForeignKey, Index, func
 )
 from sqlalchemy.orm import relationship
 from .database import Base
 
 class TabProductos(Base):
     __tablename__ = "tab_productos"
+    # add_date/mod_date vuelven en el mismo INSERT/UPDATE (RETURNING donde existe): sin refresh
+    __mapper_args__ = {"eager_defaults": True}
     
     id_product = Column(Integer, primary_key=True, autoincrement=True, index=True)
     id_product_type = Column(Integer, nullable=True)
@@ -26,6 +28,7 @@ class TabProductos(Base):
 
 class TabWarehouse(Base):
     __tablename__ = "tab_warehouse"
+    __mapper_args__ = {"eager_defaults": True}
     
     id_warehouse = Column(Integer, primary_key=True, autoincrement=True, index=True)
     code = Column(Integer, nullable=False, unique=True, index=True)
@@ -40,6 +43,7 @@ class TabWarehouse(Base):
 
 class TabKit(Base):
     __tablename__ = "tab_kit"
+    __mapper_args__ = {"eager_defaults": True}
     
     id_kit = Column(Integer, primary_key=True, autoincrement=True, index=True)
     code = Column(Integer, nullable=False, unique=True, index=True)
@@ -56,6 +60,7 @@ class TabKit(Base):
 
 class TabKitComposition(Base):
     __tablename__ = "tab_kit_composition"
+    __mapper_args__ = {"eager_defaults": True}
     
     id_kit_composition = Column(Integer, primary_key=True, autoincrement=True, index=True)
     id_kit = Column(Integer, ForeignKey("tab_kit.id_kit"), nullable=False)
@@ -68,9 +73,15 @@ class TabKitComposition(Base):
     
     kit = relationship("TabKit", back_populates="compositions")
     product = relationship("TabProductos", back_populates="kit_compositions")
+    
+    # Cubre la expansión de kits (salida de kits y kits armables)
+    __table_args__ = (
+        Index("ix_kc_kit_prod_qty", "id_kit", "id_product", "quantaty"),
+    )
 
 class TabProductTransaction(Base):
     __tablename__ = "tab_product_transaction"
+    __mapper_args__ = {"eager_defaults": True}
     
     id_product_transaction = Column(Integer, primary_key=True, autoincrement=True, index=True)
     id_product = Column(Integer, ForeignKey("tab_productos.id_product"), nullable=False)
@@ -89,4 +100,108 @@ class TabProductTransaction(Base):
     
     product = relationship("TabProductos", back_populates="product_transactions")
     warehouse = relationship("TabWarehouse", back_populates="product_transactions")
-    kit = relationship("TabKit", back_populates="product_transactions")
\ No newline at end of file
+    kit = relationship("TabKit", back_populates="product_transactions")
+    
+    __table_args__ = (
+        # Paginación por cursor ordenando por fecha (ver app/pagination.py)
+        Index("ix_tr_add_date_id", "add_date", "id_product_transaction"),
+        Index("ix_tr_mod_date_id", "mod_date", "id_product_transaction"),
+        # Índices de cobertura para existencias por bodega/producto/tipo y su agregación
+        Index("ix_tr_wh_prod_type_qty", "id_warehouse", "id_product", "type_transaction", "quantaty_products"),
+        Index("ix_tr_prod_wh_type_qty", "id_product", "id_warehouse", "type_transaction", "quantaty_products"),
+    )
+
+class TabStockBalance(Base):
+    """Saldo acumulado por (producto, bodega); lo mantiene app.stock en cada escritura del libro."""
+    __tablename__ = "tab_stock_balance"
+    
+    id_product = Column(Integer, ForeignKey("tab_productos.id_product"), primary_key=True)
+    id_warehouse = Column(Integer, ForeignKey("tab_warehouse.id_warehouse"), primary_key=True, index=True)
+    qty_in = Column(Integer, nullable=False, default=0, server_default="0")
+    qty_out = Column(Integer, nullable=False, default=0, server_default="0")
+    stock = Column(Integer, nullable=False, default=0, server_default="0")
+    mod_date = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+class TabStockLot(Base):
+    """
+    Saldo por lote (producto, bodega, vencimiento); lo mantiene app.lots.
+    Sin vencimiento se usa lots.NO_EXPIRY (la fecha forma parte de la clave primaria).
+    """
+    __tablename__ = "tab_stock_lot"
+    
+    id_product = Column(Integer, ForeignKey("tab_productos.id_product"), primary_key=True)
+    id_warehouse = Column(Integer, ForeignKey("tab_warehouse.id_warehouse"), primary_key=True)
+    expiration_date = Column(DateTime, primary_key=True)
+    qty = Column(Integer, nullable=False, default=0, server_default="0")
+    mod_date = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+    
+    __table_args__ = (
+        # Reporte de vencimientos: rango por fecha, cubierto sin tocar la tabla
+        Index("ix_lot_exp_wh_prod_qty", "expiration_date", "id_warehouse", "id_product", "qty"),
+    )
+
+class TabLotAllocation(Base):
+    """
+    Lotes consumidos por cada salida del libro (FEFO). Sin FK al libro: al borrar
+    un movimiento, app.lots todavía lee sus asignaciones para devolverlas al lote.
+    """
+    __tablename__ = "tab_lot_allocation"
+    
+    id_product_transaction = Column(Integer, primary_key=True)
+    expiration_date = Column(DateTime, primary_key=True)
+    id_product = Column(Integer, nullable=False)
+    id_warehouse = Column(Integer, nullable=False)
+    qty = Column(Integer, nullable=False)
+
+class TabStockSnapshot(Base):
+    """Saldo por (producto, bodega) al cierre de un periodo (movimientos con add_date < snapshot_date)."""
+    __tablename__ = "tab_stock_snapshot"
+    
+    snapshot_date = Column(DateTime, primary_key=True)
+    id_product = Column(Integer, ForeignKey("tab_productos.id_product"), primary_key=True)
+    id_warehouse = Column(Integer, ForeignKey("tab_warehouse.id_warehouse"), primary_key=True)
+    qty_in = Column(Integer, nullable=False, default=0, server_default="0")
+    qty_out = Column(Integer, nullable=False, default=0, server_default="0")
+    stock = Column(Integer, nullable=False, default=0, server_default="0")
+    add_date = Column(DateTime, server_default=func.now(), nullable=False)
+
+class TabChangeVersion(Base):
+    """Contador de cambios por conjunto de tablas; lo incrementa app.versions al hacer commit."""
+    __tablename__ = "tab_change_version"
+    
+    table_name = Column(String(64), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
+
+class TabIdempotencyKey(Base):
+    """
+    Respuesta guardada por Idempotency-Key (app/idempotency.py). status_code NULL
+    = la petición original todavía está en curso (owner la mantiene viva con
+    heartbeat_at) o ya confirmó su escritura (committed_at) sin guardar la respuesta.
+    """
+    __tablename__ = "tab_idempotency_key"
+    
+    idem_key = Column(String(255), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)  # sha256 de método, ruta y cuerpo
+    status_code = Column(Integer, nullable=True)
+    headers = Column(Text, nullable=True)  # JSON [[nombre, valor], ...]
+    body = Column(LargeBinary(16 * 1024 * 1024), nullable=True)  # MEDIUMBLOB en MySQL
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    owner = Column(String(64), nullable=True)  # proceso que tiene la reserva
+    heartbeat_at = Column(DateTime, nullable=True)  # último latido del owner
+    committed_at = Column(DateTime, nullable=True)  # la escritura se confirmó (misma transacción)
+
+class TabChangeEvent(Base):
+    """
+    Eventos de cambio del libro y los saldos (app/changefeed.py), escritos en la
+    misma transacción que el cambio. GET /changes los sirve por SSE en orden de id.
+    """
+    __tablename__ = "tab_change_event"
+    
+    id_event = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String(32), nullable=False)  # transaction.created, balance, ...
+    payload = Column(Text, nullable=False)  # JSON compacto
+    created_at = Column(DateTime, nullable=False, index=True)
+    
+    # SQLite: AUTOINCREMENT para no reusar ids aunque la purga vacíe la tabla
+    __table_args__ = ({"sqlite_autoincrement": True},)
@@ -0,0 +1,84 @@
+# backend/app/pagination.py
+"""
+Paginación por cursor (keyset) para los listados.
+
+En lugar de OFFSET, cada página filtra a partir de la última fila devuelta
+(columna de orden + id), así que la página 1000 cuesta lo mismo que la primera.
+El cursor siguiente viaja en la cabecera X-Next-Cursor y es opaco para el cliente.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Literal, Optional
+
+from fastapi import HTTPException, Response
+from sqlalchemy import String, and_, or_, type_coerce
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+SortField = Literal["id", "add_date", "mod_date"]
+
+
+def encode_cursor(sort: str, value, row_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps({"s": sort, "v": value, "id": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str):
+    """Devuelve (valor, id) del cursor; 400 si es inválido o de otro orden."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if data["s"] != sort:
+            raise ValueError("sort mismatch")
+        value = data["v"]
+        if sort != "id":
+            value = datetime.fromisoformat(value)
+        return value, int(data["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(
+    query, model, id_attr: str, sort: str, cursor: Optional[str], skip: int, limit: int,
+    dialect: Optional[str] = None,
+):
+    """
+    Ordena la consulta (Query o select()) de forma descendente por `sort`
+    (desempatando por id) y aplica el cursor. Sin cursor se respeta `skip` por
+    compatibilidad. Con select() hay que indicar el `dialect` del motor.
+    """
+    id_col = getattr(model, id_attr)
+    if sort == "id":
+        order = [id_col.desc()]
+    else:
+        sort_col = getattr(model, sort)
+        order = [sort_col.desc(), id_col.desc()]
+
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort)
+        if sort == "id":
+            query = query.filter(id_col < last_id)
+        else:
+            key = sort_col
+            if (dialect or query.session.get_bind().dialect.name) == "sqlite":
+                # SQLite guarda las fechas como texto y CURRENT_TIMESTAMP no lleva
+                # microsegundos: se compara texto con texto en el mismo formato
+                key, value = type_coerce(sort_col, String), value.isoformat(sep=" ")
+            query = query.filter(or_(key < value, and_(key == value, id_col < last_id)))
+
+    query = query.order_by(*order)
+    if skip and not cursor:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+
+def set_next_cursor(response: Response, rows, id_attr: str, sort: str, limit: int) -> None:
+    """Publica el cursor de la página siguiente si la actual vino completa."""
+    if not rows or len(rows) < limit:
+        return
+    last = rows[-1]
+    value = getattr(last, id_attr) if sort == "id" else getattr(last, sort)
+    response.headers[NEXT_CURSOR_HEADER] = encode_cursor(sort, value, getattr(last, id_attr))
@@ -0,0 +1,229 @@
+# backend/app/photos.py
+"""
+Fotos de productos y kits en un almacén direccionado por contenido.
+
+Cada imagen se guarda una sola vez en disco (PHOTO_DIR) con el nombre de su
+SHA-256; la fila del producto/kit solo guarda la referencia "/photos/<sha>.<ext>"
+(la ruta desde la que la sirve la API). Como el contenido de un nombre nunca
+cambia, se sirve con Cache-Control immutable y ETag = nombre.
+
+Antes de publicar el original, Pillow lo decodifica completo: un archivo con
+firma válida pero contenido roto se rechaza (415) y no queda en el almacén, y
+uno de más de PHOTO_MAX_PIXELS píxeles se rechaza (413) sin decodificarlo.
+
+Al subir se generan miniaturas WebP "<sha>_<lado>.webp" para cada tamaño de
+PHOTO_THUMB_SIZES (requiere Pillow; sin Pillow se sirve el original y solo se
+valida la firma).
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .config import settings
+
+log = logging.getLogger(__name__)
+
+PHOTO_PREFIX = "/photos/"
+CONTENT_TYPES = {"jpg": "image/jpeg", "png": "image/png", "webp": "image/webp", "gif": "image/gif"}
+THUMB_FORMAT = "webp"
+PIL_FORMATS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif"}
+
+_NAME_RE = re.compile(r"^([0-9a-f]{64})(?:_(\d+))?\.(jpg|png|webp|gif)$")
+
+
+class PhotoTooLarge(ValueError):
+    pass
+
+
+def sniff(head: bytes) -> Optional[str]:
+    """Extensión según la firma del archivo (no se confía en el Content-Type)."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    return None
+
+
+def verify(path, ext: str) -> None:
+    """Decodifica la imagen con Pillow; ValueError si no es válida, PhotoTooLarge si es enorme."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return  # sin Pillow solo queda la firma
+    try:
+        with Image.open(path) as img:
+            if PIL_FORMATS.get(img.format) != ext:
+                raise ValueError(f"El contenido no corresponde a la firma {ext}")
+            width, height = img.size
+            if width * height > settings.photo_max_pixels:
+                raise PhotoTooLarge(f"La foto supera {settings.photo_max_pixels} píxeles")
+            img.load()
+    except Image.DecompressionBombError:
+        raise PhotoTooLarge(f"La foto supera {settings.photo_max_pixels} píxeles")
+    except (OSError, SyntaxError, EOFError) as e:  # UnidentifiedImageError es OSError
+        raise ValueError(f"La imagen está dañada o no se puede leer: {e}")
+
+
+def parse_name(name: str) -> Optional[Tuple[str, Optional[int], str]]:
+    """(sha, lado de la miniatura o None, extensión); None si el nombre no es válido."""
+    m = _NAME_RE.match(name)
+    if not m:
+        return None
+    return m.group(1), int(m.group(2)) if m.group(2) else None, m.group(3)
+
+
+def thumb_sizes() -> List[int]:
+    return sorted({int(s) for s in settings.photo_thumb_sizes.split(",") if s.strip()})
+
+
+def thumb_name(digest: str, size: int) -> str:
+    return f"{digest}_{size}.{THUMB_FORMAT}"
+
+
+class LocalPhotoStore:
+    """Archivos en <root>/<2 primeros caracteres del sha>/<nombre>."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def path(self, name: str) -> Path:
+        return self.root / name[:2] / name
+
+    def exists(self, name: str) -> bool:
+        return self.path(name).is_file()
+
+    def _tmp(self):
+        tmp_dir = self.root / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False)
+
+    def _publish(self, tmp_path: str, name: str) -> None:
+        # rename atómico: un lector nunca ve un archivo a medio escribir
+        target = self.path(name)
+        if target.exists():
+            os.unlink(tmp_path)
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, target)
+
+    def put_stream(self, chunks: Iterable[bytes], max_bytes: int) -> Tuple[str, str, int]:
+        """Guarda el contenido calculando el SHA-256 al vuelo. Devuelve (sha, ext, bytes)."""
+        sha = hashlib.sha256()
+        size = 0
+        head = b""
+        tmp = self._tmp()
+        try:
+            with tmp:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise PhotoTooLarge(f"La foto supera {max_bytes} bytes")
+                    if len(head) < 16:
+                        head += chunk[:16]
+                    sha.update(chunk)
+                    tmp.write(chunk)
+            ext = sniff(head)
+            if ext is None:
+                raise ValueError("El archivo no es una imagen JPEG, PNG, WebP o GIF")
+            verify(tmp.name, ext)  # antes de publicar: nada inválido llega al almacén
+            digest = sha.hexdigest()
+            self._publish(tmp.name, f"{digest}.{ext}")
+        except BaseException:
+            if os.path.exists(tmp.name):
+                os.unlink(tmp.name)
+            raise
+        return digest, ext, size
+
+    def put_bytes(self, data: bytes) -> Tuple[str, str, int]:
+        return self.put_stream((data,), len(data))
+
+    def put_thumbnail(self, name: str, image) -> None:
+        tmp = self._tmp()
+        try:
+            with tmp:
+                image.save(tmp, format=THUMB_FORMAT.upper(), quality=80)
+            self._publish(tmp.name, name)
+        except BaseException:
+            if os.path.exists(tmp.name):
+                os.unlink(tmp.name)
+            raise
+
+
+store = LocalPhotoStore(settings.photo_dir)
+
+
+def make_thumbnails(digest: str, ext: str, sizes: Optional[Iterable[int]] = None) -> Dict[int, str]:
+    """Genera las miniaturas que falten; devuelve {lado: nombre} de las disponibles."""
+    sizes = list(thumb_sizes() if sizes is None else sizes)
+    done = {s: thumb_name(digest, s) for s in sizes if store.exists(thumb_name(digest, s))}
+    missing = [s for s in sizes if s not in done]
+    if not missing:
+        return done
+    try:
+        from PIL import Image
+    except ImportError:
+        log.warning("Pillow no está instalado: no se generan miniaturas")
+        return done
+    with Image.open(store.path(f"{digest}.{ext}")) as img:
+        img.load()
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+        for size in missing:
+            thumb = img.copy()
+            thumb.thumbnail((size, size))
+            store.put_thumbnail(thumb_name(digest, size), thumb)
+            done[size] = thumb_name(digest, size)
+    return done
+
+
+def describe(digest: str, ext: str, size: int, thumbnails: Dict[int, str]) -> dict:
+    return {
+        "photo": PHOTO_PREFIX + f"{digest}.{ext}",
+        "sha256": digest,
+        "content_type": CONTENT_TYPES[ext],
+        "size": size,
+        "thumbnails": {s: PHOTO_PREFIX + name for s, name in sorted(thumbnails.items())},
+    }
+
+
+def save(chunks: Iterable[bytes]) -> dict:
+    """Guarda una foto subida (una vez por contenido) y sus miniaturas."""
+    digest, ext, size = store.put_stream(chunks, settings.photo_max_bytes)
+    return describe(digest, ext, size, make_thumbnails(digest, ext))
+
+
+def resolve(name: str) -> Optional[Tuple[Path, str]]:
+    """
+    Archivo y Content-Type para servir `name`. Una miniatura que no existe se
+    genera si el tamaño está configurado; si no se puede, se devuelve el original
+    (otro nombre: el router redirige a su URL en lugar de servirlo con este).
+    """
+    parsed = parse_name(name)
+    if parsed is None:
+        return None
+    digest, size, ext = parsed
+    if size is None:
+        return (store.path(name), CONTENT_TYPES[ext]) if store.exists(name) else None
+    if store.exists(name):
+        return store.path(name), CONTENT_TYPES[ext]
+    original = next((f"{digest}.{e}" for e in CONTENT_TYPES if store.exists(f"{digest}.{e}")), None)
+    if original is None:
+        return None
+    if ext == THUMB_FORMAT and size in thumb_sizes():
+        try:
+            made = make_thumbnails(digest, original.rsplit(".", 1)[1], [size])
+        except (OSError, SyntaxError, EOFError, ValueError, MemoryError):
+            # Original anterior a la validación al subir y que Pillow no puede leer
+            log.warning("no se pudo generar la miniatura %s", name, exc_info=True)
+            made = {}
+        if name in made.values():
+            return store.path(name), CONTENT_TYPES[ext]
+    return store.path(original), CONTENT_TYPES[original.rsplit(".", 1)[1]]
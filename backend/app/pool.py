@@ -0,0 +1,105 @@
+# backend/app/pool.py
+"""
+Pool de conexiones instrumentado.
+
+InstrumentedQueuePool (y su variante async) mide cuánto espera cada checkout y
+cuenta los timeouts, para dimensionar pool_size / max_overflow por worker con datos.
+pool_status() junta esas métricas con el estado vivo del pool.
+"""
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Límites superiores (ms) del histograma de espera en checkout
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_sum_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)  # el último es +Inf
+
+    def observe(self, wait_ms: float, timed_out: bool) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_sum_ms += wait_ms
+            self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+            for i, bound in enumerate(WAIT_BUCKETS_MS):
+                if wait_ms <= bound:
+                    self.buckets[i] += 1
+                    break
+            else:
+                self.buckets[-1] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            cumulative, histogram = 0, {}
+            for bound, count in zip(list(WAIT_BUCKETS_MS) + ["+Inf"], self.buckets):
+                cumulative += count
+                histogram[str(bound)] = cumulative
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_sum_ms": round(self.wait_sum_ms, 3),
+                "wait_max_ms": round(self.wait_max_ms, 3),
+                "wait_histogram_ms": histogram,
+            }
+
+
+class _TimedCheckout:
+    """Mide el tiempo dentro de _do_get (esperando conexión libre o abriendo una nueva)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.observe((time.perf_counter() - t0) * 1000, timed_out=True)
+            raise
+        self.stats.observe((time.perf_counter() - t0) * 1000, timed_out=False)
+        return conn
+
+    def recreate(self):
+        # recreate() se usa al invalidar el pool: conservar las métricas acumuladas
+        new = super().recreate()
+        new.stats = self.stats
+        return new
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class InstrumentedAsyncPool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_status(pool) -> dict:
+    """Estado vivo del pool + métricas de checkout (si el pool está instrumentado)."""
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+            timeout_s=pool.timeout(),
+        )
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        status.update(stats.snapshot())
+    return status
@@ -0,0 +1,128 @@
+# backend/app/refcache.py
+"""
+Caché en memoria de catálogos: id -> (code, cname) de productos, bodegas y kits.
+
+Son tablas pequeñas que casi no cambian pero se leen en cada consulta del libro
+solo para poner nombres. Cada caché es un LRU acotado por proceso:
+
+- Los routers CRUD guardan la entrada al crear o modificar y la descartan al
+  eliminar (en este worker), siempre después del commit.
+- Los demás workers se enteran por mod_date: como mucho cada REFCACHE_REFRESH_S
+  segundos se consultan los ids modificados desde la última revisión y se
+  descartan. REFCACHE_REFRESH_S=0 desactiva la revisión.
+- Los ids inexistentes no se guardan, así que un alta nunca encuentra datos viejos.
+- Con una sesión de réplica (database.get_read_db) las lecturas van al primario:
+  el caché es de todo el proceso y una réplica atrasada lo dejaría con nombres viejos.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from . import database
+from .config import settings
+from .models import TabKit, TabProductos, TabWarehouse
+
+Ref = Tuple[int, str]  # (code, cname)
+
+
+def _rows(db: Session, stmt) -> list:
+    bind = db.get_bind()
+    if bind is not database.engine and bind in database.engines.values():
+        with database.engine.connect() as conn:
+            return conn.execute(stmt).all()
+    return db.execute(stmt).all()
+
+
+class RefCache:
+    def __init__(self, model, id_attr: str, maxsize: int):
+        self.model = model
+        self.id_col = getattr(model, id_attr)
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[int, Ref]" = OrderedDict()
+        self._checked_at = 0.0
+        self._since = None  # mayor mod_date visto en la última revisión
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, db: Session, id_: Optional[int]) -> Optional[Ref]:
+        if id_ is None:
+            return None
+        return self.get_many(db, (id_,)).get(id_)
+
+    def get_many(self, db: Session, ids: Iterable[Optional[int]]) -> Dict[int, Ref]:
+        """Devuelve {id: (code, cname)}; los que faltan se leen en una sola consulta."""
+        self._maybe_refresh(db)
+        found, missing = {}, []
+        with self._lock:
+            for id_ in set(ids):
+                if id_ is None:
+                    continue
+                ref = self._data.get(id_)
+                if ref is None:
+                    missing.append(id_)
+                else:
+                    self._data.move_to_end(id_)
+                    found[id_] = ref
+            self.hits += len(found)
+            self.misses += len(missing)
+        if missing:
+            rows = _rows(db, select(self.id_col, self.model.code, self.model.cname).where(self.id_col.in_(missing)))
+            with self._lock:
+                for id_, code, name in rows:
+                    found[id_] = self._data[id_] = (code, name)
+                    self._data.move_to_end(id_)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return found
+
+    def put(self, id_: int, code: int, name: str) -> None:
+        """Guarda los datos recién escritos (llamar después del commit)."""
+        with self._lock:
+            self._data[id_] = (code, name)
+            self._data.move_to_end(id_)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, id_: Optional[int] = None) -> None:
+        """Descarta un id (o todo el caché si id_ es None)."""
+        with self._lock:
+            if id_ is None:
+                self._data.clear()
+            else:
+                self._data.pop(id_, None)
+
+    def _maybe_refresh(self, db: Session) -> None:
+        interval = settings.refcache_refresh_s
+        now = time.monotonic()
+        if interval <= 0 or now - self._checked_at < interval:
+            return
+        self._checked_at = now
+        mod_date = self.model.mod_date
+        if self._since is None:
+            self._since = _rows(db, select(func.max(mod_date)))[0][0]
+            return
+        # >= : mod_date puede tener resolución de segundos; repetir ids es inofensivo
+        rows = _rows(db, select(self.id_col, mod_date).where(mod_date >= self._since))
+        with self._lock:
+            for id_, changed in rows:
+                self._data.pop(id_, None)
+                if changed > self._since:
+                    self._since = changed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+products = RefCache(TabProductos, "id_product", settings.refcache_size)
+warehouses = RefCache(TabWarehouse, "id_warehouse", settings.refcache_size)
+kits = RefCache(TabKit, "id_kit", settings.refcache_size)
+
+
+def name(ref: Optional[Ref]) -> Optional[str]:
+    return ref[1] if ref else None
@@ -0,0 +1,241 @@
+# backend/app/replicas.py
+"""
+Réplicas de lectura para los GET seguros (DATABASE_REPLICA_URLS).
+
+Los endpoints que usan database.get_read_db leen de una réplica solo si está al
+día; si no, del primario. Las escrituras y las lecturas puntuales siguen en get_db.
+
+Atraso: un hilo de fondo lee cada REPLICA_CHECK_S los contadores de
+tab_change_version (app.versions) del primario y de cada réplica. Una réplica
+está "al día hasta" el último instante en que el primario tenía contadores que
+ella ya alcanzó; atraso = ahora - ese instante. No depende del motor ni del tipo
+de replicación, así que sirve igual con dos bases locales cualesquiera.
+
+- Una réplica caída (error al chequear o al conectar) o con más de
+  REPLICA_MAX_LAG_S de atraso no recibe lecturas.
+- Leer lo propio: la respuesta a cada escritura trae X-Read-After (y la cookie
+  read_after) con la hora del commit. Una lectura que la devuelve va a una
+  réplica solo si esa réplica ya está al día hasta esa hora. Pasado
+  REPLICA_MAX_LAG_S cualquier réplica aceptable ya la incluye, y la cookie vence.
+- X-Read-Source en la respuesta dice de dónde se leyó (primary, replica0, ...).
+"""
+import itertools
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from http.cookies import SimpleCookie
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+from . import database, metrics
+from .config import settings
+from .models import TabChangeVersion
+
+log = logging.getLogger(__name__)
+
+READ_AFTER_HEADER = "X-Read-After"
+SOURCE_HEADER = "X-Read-Source"
+COOKIE = "read_after"
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+_versions = TabChangeVersion.__table__
+
+
+class Replica:
+    def __init__(self, role: str, engine: Engine):
+        self.role = role
+        self.engine = engine
+        self.up = False  # hasta el primer chequeo
+        self.synced_at = 0.0  # time.time() hasta el que la réplica tiene todos los cambios
+
+    def lag(self, now: Optional[float] = None) -> float:
+        return (now or time.time()) - self.synced_at
+
+
+replicas: Dict[str, Replica] = {role: Replica(role, eng) for role, eng in database.replica_engines().items()}
+_round_robin = itertools.count()
+_history: deque = deque()  # [(time.time(), {conjunto: versión})] del primario
+_checker = None
+_checker_lock = threading.Lock()
+
+
+def _read_versions(engine: Engine) -> Dict[str, int]:
+    with engine.connect() as conn:
+        return dict(conn.execute(select(_versions.c.table_name, _versions.c.version)).all())
+
+
+def check_once() -> None:
+    """Mide salud y atraso de cada réplica contra el primario."""
+    now = time.time()
+    try:
+        _history.append((now, _read_versions(database.engine)))
+    except OperationalError:
+        log.warning("réplicas: no se pudo leer el primario", exc_info=True)
+        return
+    # Historia suficiente para medir atrasos hasta el doble del máximo aceptado
+    while len(_history) > 1 and _history[0][0] < now - 2 * settings.replica_max_lag_s - settings.replica_check_s:
+        _history.popleft()
+    for r in replicas.values():
+        try:
+            seen = _read_versions(r.engine)
+        except Exception as e:  # cualquier falla de la réplica la saca de rotación
+            if r.up:
+                log.warning("réplica %s caída: %s", r.role, e)
+            r.up = False
+            continue
+        if not r.up:
+            log.info("réplica %s disponible", r.role)
+        r.up = True
+        # El primario se leyó antes que la réplica: si ella ya tiene esos contadores, está al día hasta `now`
+        for t, primary in reversed(_history):
+            if all(seen.get(name, 0) >= v for name, v in primary.items()):
+                r.synced_at = max(r.synced_at, t)
+                break
+
+
+def _run() -> None:
+    while True:
+        try:
+            check_once()
+        except Exception:
+            log.exception("réplicas: falló el chequeo")
+        time.sleep(settings.replica_check_s)
+
+
+def _start_checker() -> None:
+    global _checker
+    if _checker is None:
+        with _checker_lock:
+            if _checker is None:
+                check_once()  # la primera lectura ya sabe si hay réplicas al día
+                _checker = threading.Thread(target=_run, name="replica-check", daemon=True)
+                _checker.start()
+
+
+def mark_down(role: str) -> None:
+    """Saca una réplica de rotación hasta que el próximo chequeo la encuentre bien."""
+    r = replicas.get(role)
+    if r is not None and r.up:
+        log.warning("réplica %s caída (error al conectar)", role)
+        r.up = False
+
+
+def _on_error(role: str):
+    def handle_error(ctx):
+        if ctx.is_disconnect:
+            mark_down(role)
+    return handle_error
+
+
+for _r in replicas.values():
+    event.listen(_r.engine, "handle_error", _on_error(_r.role))
+
+
+# ---------- Elección por petición ----------
+
+class ReadRouting:
+    __slots__ = ("read_after", "source")
+
+    def __init__(self, read_after: Optional[float]):
+        self.read_after = read_after
+        self.source: Optional[str] = None
+
+
+# Mutable por el mismo motivo que metrics.RequestStats (copia del contexto en el threadpool)
+current: ContextVar[Optional[ReadRouting]] = ContextVar("read_routing", default=None)
+
+
+def choose() -> Tuple[str, Engine]:
+    """(rol, engine) para una lectura: una réplica al día o el primario."""
+    if not replicas:
+        return "primary", database.engine
+    _start_checker()
+    now = time.time()
+    routing = current.get()
+    read_after = routing.read_after if routing else None
+    up = [r for r in replicas.values() if r.up]
+    fresh = [r for r in up if r.lag(now) <= settings.replica_max_lag_s]
+    usable = [r for r in fresh if read_after is None or r.synced_at >= read_after]
+    if usable:
+        r = usable[next(_round_robin) % len(usable)]
+        metrics.READ_ROUTING.inc(r.role, "ok")
+        return r.role, r.engine
+    reason = "down" if not up else "lag" if not fresh else "read_after"
+    metrics.READ_ROUTING.inc("primary", reason)
+    return "primary", database.engine
+
+
+def set_source(role: str) -> None:
+    routing = current.get()
+    if routing is not None:
+        routing.source = role
+
+
+def status() -> list:
+    now = time.time()
+    return [
+        {"replica": r.role, "up": r.up, "lag_s": round(r.lag(now), 3) if r.synced_at else None}
+        for r in replicas.values()
+    ]
+
+
+# ---------- Middleware ----------
+
+def _read_after(scope) -> Optional[float]:
+    header = cookie = None
+    for k, v in scope["headers"]:
+        if k == b"x-read-after":
+            header = v.decode("latin-1")
+        elif k == b"cookie":
+            morsel = SimpleCookie(v.decode("latin-1")).get(COOKIE)
+            cookie = morsel.value if morsel else cookie
+    values = []
+    for raw in (header, cookie):
+        try:
+            values.append(float(raw))
+        except (TypeError, ValueError):
+            pass
+    return max(values) if values else None
+
+
+class ReadRoutingMiddleware:
+    """
+    Middleware ASGI puro: lee el token de lectura-tras-escritura (encabezado o
+    cookie), lo deja a get_read_db y lo emite en las respuestas a escrituras.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        routing = ReadRouting(_read_after(scope))
+        token = current.set(routing)
+        write = scope["method"] in WRITE_METHODS
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                if routing.source is not None:
+                    headers.append((SOURCE_HEADER.lower().encode(), routing.source.encode()))
+                if write and message["status"] < 400:
+                    # Ya se confirmó: la respuesta sale después del commit
+                    stamp = f"{time.time():.3f}"
+                    max_age = math.ceil(settings.replica_max_lag_s + settings.replica_check_s)
+                    headers.append((READ_AFTER_HEADER.lower().encode(), stamp.encode()))
+                    headers.append((b"set-cookie", f"{COOKIE}={stamp}; Max-Age={max_age}; Path=/; SameSite=Lax".encode()))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current.reset(token)
@@ -0,0 +1,60 @@
+# backend/app/responses.py
+"""
+Respuestas JSON rápidas con orjson.
+
+Los endpoints que ya arman su salida (dicts o filas Row de SQLAlchemy) devuelven
+fast_json(...): FastAPI no vuelve a validar contra response_model ni pasa por
+jsonable_encoder, y orjson serializa las filas directo desde Row (sin dict
+intermedio en Python). response_model se mantiene para la documentación OpenAPI.
+
+FAST_JSON=false vuelve a la ruta estándar de FastAPI (sirve para comparar en
+bench/serialize.py).
+"""
+from decimal import Decimal
+from typing import Any, Optional
+
+import orjson
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.engine import Row, RowMapping
+
+from .config import settings
+
+
+def _default(obj):
+    if isinstance(obj, Row):
+        return obj._asdict()
+    if isinstance(obj, RowMapping):
+        return dict(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class FastJSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _plain(content):
+    # Ruta estándar: Row -> dict para que response_model pueda validarlo
+    if isinstance(content, list):
+        return [_plain(c) for c in content]
+    if isinstance(content, Row):
+        return content._asdict()
+    return content
+
+
+def fast_json(content: Any, response: Optional[Response] = None):
+    """
+    Serializa `content` con orjson y conserva los encabezados/estado que el endpoint
+    haya puesto en su parámetro `response` (X-Next-Cursor, ETag, ...).
+    """
+    if not settings.fast_json:
+        return _plain(content)
+    if response is None:
+        return FastJSONResponse(content)
+    # FastAPI deja status_code=None en el Response inyectado si el endpoint no lo cambia
+    resp = FastJSONResponse(content, status_code=response.status_code or 200)
+    resp.raw_headers.extend(h for h in response.raw_headers if h[0] != b"content-length")
+    return resp
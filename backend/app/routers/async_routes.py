@@ -0,0 +1,124 @@
+# backend/app/routers/async_routes.py
+"""
+Versiones async def de los endpoints más usados, sobre AsyncSession.
+
+Solo se registran con DB_ASYNC=true (ver app/main.py) y antes que los routers
+síncronos, así que atienden las mismas rutas sin ocupar el threadpool. El saldo
+de existencias se mantiene igual que en la ruta síncrona (evento after_flush).
+"""
+import asyncio
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import ingest, models, schemas, search, versions
+from app.config import settings
+from app.database import get_async_db
+from app.pagination import SortField, paginate, set_next_cursor
+from app.responses import fast_json
+from app.routers.transactions import transaction_dicts, transaction_select, writer
+
+router = APIRouter(tags=["async"])
+
+@router.get("/transactions/", response_model=List[schemas.TransactionOut])
+async def list_transactions(
+    response: Response,
+    q: Optional[str] = Query(None, description="Buscar por descripción"),
+    type_transaction: Optional[int] = Query(None, description="0 entrada, 1 salida"),
+    skip: int = 0,
+    limit: int = 100,
+    sort: SortField = Query("id", description="Orden descendente por id, add_date o mod_date"),
+    cursor: Optional[str] = Query(None, description="Cursor X-Next-Cursor de la página anterior"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    dialect = db.bind.dialect.name
+    query = transaction_select()
+    q = search.clean(q)
+    if q:
+        query = query.where(search.search_filter(dialect, q))
+    if type_transaction in (0, 1):
+        query = query.where(models.TabProductTransaction.type_transaction == type_transaction)
+
+    results = (await db.execute(paginate(
+        query, models.TabProductTransaction, "id_product_transaction", sort, cursor, skip, limit, dialect
+    ))).all()
+    set_next_cursor(response, results, "id_product_transaction", sort, limit)
+    # refcache es síncrono: los nombres que falten se leen con la conexión async vía run_sync
+    return fast_json(await db.run_sync(transaction_dicts, results), response)
+
+async def _get_transaction(db: AsyncSession, tx_id: int) -> dict:
+    result = (await db.execute(transaction_select().where(
+        models.TabProductTransaction.id_product_transaction == tx_id
+    ))).first()
+    if not result:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    return (await db.run_sync(transaction_dicts, [result]))[0]
+
+# {tx_id:int}: no debe tapar /transactions/export, /search, etc. del router síncrono
+@router.get("/transactions/{tx_id:int}", response_model=schemas.TransactionOut)
+async def get_transaction(tx_id: int, db: AsyncSession = Depends(get_async_db)):
+    return fast_json(await _get_transaction(db, tx_id))
+
+@router.post("/transactions/", response_model=schemas.TransactionOut, status_code=201)
+async def create_transaction(payload: schemas.TransactionCreate, db: AsyncSession = Depends(get_async_db)):
+    if payload.type_transaction not in (0, 1):
+        raise HTTPException(status_code=400, detail="type_transaction must be 0 (in) or 1 (out)")
+    if settings.group_commit:
+        # Sin ocupar un hilo mientras se espera el lote: con muchas altas concurrentes, lotes más grandes
+        return await asyncio.wrap_future(writer.submit(ingest.ledger_row(payload)))
+
+    row = models.TabProductTransaction(
+        id_product=payload.id_product,
+        id_warehouse=payload.id_warehouse,
+        type_transaction=payload.type_transaction,
+        id_planification_expense_request=payload.id_planification_expense_request,
+        id_kit=payload.id_kit,
+        quantaty_kit=payload.quantaty_kit,
+        quantaty_products=payload.quantaty_products,
+        description=payload.description,
+        expiration_date=payload.expiration_date,
+        add_user=payload.add_user,
+    )
+    db.add(row)
+    await db.flush()  # INSERT ... RETURNING id y fechas
+
+    # Respuesta con lo que ya se tiene (nombres desde refcache), sin releer la fila
+    out = (await db.run_sync(transaction_dicts, [row]))[0]
+    await db.commit()
+    return out
+
+@router.get("/transactions/inventory/{warehouse_id}/{product_id}")
+async def get_inventory(warehouse_id: int, product_id: int, db: AsyncSession = Depends(get_async_db)):
+    bal = await db.get(models.TabStockBalance, (product_id, warehouse_id))
+    entradas = bal.qty_in if bal else 0
+    salidas = bal.qty_out if bal else 0
+    return {
+        "id_warehouse": warehouse_id,
+        "id_product": product_id,
+        "stock": entradas - salidas,
+        "entradas": entradas,
+        "salidas": salidas
+    }
+
+@router.get("/products/inventory/summary", response_model=List[dict])
+async def get_inventory_summary(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    tag = await db.run_sync(lambda s: versions.etag(request, s, ("stock", "products", "warehouses")))
+    cached = versions.check(request, response, tag)
+    if cached:
+        return cached
+    rows = (await db.execute(
+        select(
+            models.TabStockBalance.id_product,
+            models.TabStockBalance.id_warehouse,
+            models.TabProductos.cname.label("product_name"),
+            models.TabWarehouse.cname.label("warehouse_name"),
+            models.TabStockBalance.stock,
+        ).join(
+            models.TabProductos, models.TabStockBalance.id_product == models.TabProductos.id_product
+        ).join(
+            models.TabWarehouse, models.TabStockBalance.id_warehouse == models.TabWarehouse.id_warehouse
+        )
+    )).all()
+    return fast_json(rows, response)
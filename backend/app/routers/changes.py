@@ -0,0 +1,34 @@
+# backend/app/routers/changes.py
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from .. import changefeed
+from ..config import settings
+
+router = APIRouter(prefix="/changes", tags=["changes"])
+
+@router.get("")
+async def change_stream(
+    request: Request,
+    last_event_id: Optional[int] = Query(None, ge=0, description="Reanudar después de este evento (o encabezado Last-Event-ID)"),
+):
+    """
+    Server-Sent Events con los cambios del libro de movimientos y los saldos
+    nuevos por producto/bodega, a medida que se confirman (ver app/changefeed.py).
+    EventSource reanuda solo: al reconectar manda Last-Event-ID.
+    """
+    if not settings.change_feed:
+        raise HTTPException(status_code=404, detail="El feed de cambios está deshabilitado")
+    header = request.headers.get("last-event-id")
+    if header:
+        if not header.isdigit():
+            raise HTTPException(status_code=400, detail="Last-Event-ID inválido")
+        last_event_id = int(header)
+    return StreamingResponse(
+        changefeed.stream(last_event_id),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: que un proxy nginx no retenga los eventos
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
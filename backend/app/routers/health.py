@@ -1,5 +1,7 @@
 from fastapi import APIRouter
+from .. import database, replicas
 from ..db import db_ping
+from ..pool import pool_status
 
 router = APIRouter(prefix="/health", tags=["health"])
 
@@ -11,3 +13,16 @@ def health():
 def health_db():
     db_ping()
     return {"db": "ok"}
+
+@router.get("/pool")
+def health_pool():
+    """Estado y métricas de los pools de conexiones de este worker"""
+    pools = {role: pool_status(eng.pool) for role, eng in database.engines.items()}
+    if database.async_engine is not None:
+        pools["async"] = pool_status(database.async_engine.pool)
+    return pools
+
+@router.get("/replicas")
+def health_replicas():
+    """Réplicas de lectura de este worker: disponibles y atraso estimado en segundos"""
+    return replicas.status()
@@ -1,11 +1,16 @@
 # backend/app/routers/kits.py
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from sqlalchemy import Integer, and_, case, cast, func
 from typing import List, Optional
-from app.database import get_db
-from app.models import TabKit, TabKitComposition, TabProductos
+from app import refcache, versions
+from app.database import get_db, get_read_db, is_unique_violation
+from app.responses import fast_json
+from app.pagination import SortField, paginate, set_next_cursor
+from app.models import TabKit, TabKitComposition, TabStockBalance
 from app.schemas import (
-    KitCreate, KitUpdate, KitOut,
+    KitCreate, KitUpdate, KitOut, KitAvailabilityOut,
     KitCompositionBase, KitCompositionUpdate, KitCompositionOut
 )
 
@@ -14,17 +19,81 @@ router = APIRouter(prefix="/kits", tags=["kits"])
 # -------- Kits --------
 @router.get("/", response_model=List[KitOut])  # ✅ Agregada barra
 def list_kits(
+    request: Request,
+    response: Response,
     q: Optional[str] = Query(None, description="Buscar por nombre"),
     skip: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db),
+    sort: SortField = Query("id", description="Orden descendente por id, add_date o mod_date"),
+    cursor: Optional[str] = Query(None, description="Cursor X-Next-Cursor de la página anterior"),
+    db: Session = Depends(get_read_db),
 ):
+    # Sin cambios desde el ETag del cliente: 304 sin consultar ni serializar
+    cached = versions.not_modified(request, response, db, "kits")
+    if cached:
+        return cached
     query = db.query(TabKit)
     if q:
         query = query.filter(TabKit.cname.like(f"%{q}%"))
-    rows = query.order_by(TabKit.id_kit.desc()).offset(skip).limit(limit).all()
+    rows = paginate(query, TabKit, "id_kit", sort, cursor, skip, limit).all()
+    set_next_cursor(response, rows, "id_kit", sort, limit)
     return rows
 
+@router.get("/availability/{warehouse_id}", response_model=List[KitAvailabilityOut])
+def kits_availability(
+    warehouse_id: int,
+    kit_id: Optional[int] = Query(None, description="Limitar a un kit"),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Cuántos kits completos se pueden armar en la bodega: para cada kit,
+    el mínimo entre sus componentes de floor(stock / quantaty).
+    Se calcula para todos los kits en una sola consulta agrupada.
+    """
+    # Cantidad por kit de cada producto (un producto puede repetirse en la composición)
+    comp = db.query(
+        TabKitComposition.id_kit,
+        TabKitComposition.id_product,
+        func.sum(TabKitComposition.quantaty).label("quantaty"),
+    ).group_by(TabKitComposition.id_kit, TabKitComposition.id_product)
+    if kit_id is not None:
+        comp = comp.filter(TabKitComposition.id_kit == kit_id)
+    comp = comp.subquery()
+    
+    stock = func.coalesce(TabStockBalance.stock, 0)
+    per_component = case(
+        (stock <= 0, 0),
+        else_=cast((stock - stock % comp.c.quantaty) / comp.c.quantaty, Integer),
+    )
+    rows = (
+        db.query(
+            TabKit.id_kit,
+            TabKit.cname.label("kit_name"),
+            func.min(per_component).label("buildable"),
+        )
+        .join(comp, comp.c.id_kit == TabKit.id_kit)
+        .outerjoin(
+            TabStockBalance,
+            and_(
+                TabStockBalance.id_product == comp.c.id_product,
+                TabStockBalance.id_warehouse == warehouse_id,
+            ),
+        )
+        .group_by(TabKit.id_kit, TabKit.cname)
+        .order_by(TabKit.id_kit.desc())
+        .all()
+    )
+    
+    return [
+        {
+            "id_kit": r.id_kit,
+            "kit_name": r.kit_name,
+            "id_warehouse": warehouse_id,
+            "buildable": r.buildable or 0,
+        }
+        for r in rows
+    ]
+
 @router.get("/{kit_id}", response_model=KitOut)
 def get_kit(kit_id: int, db: Session = Depends(get_db)):
     obj = db.get(TabKit, kit_id)  # ✅ Corregido método deprecado
@@ -42,9 +111,17 @@ def create_kit(body: KitCreate, db: Session = Depends(get_db)):
         add_user=body.add_user,
     )
     db.add(obj)
+    try:
+        db.flush()  # INSERT ... RETURNING id y fechas
+    except IntegrityError as e:
+        if not is_unique_violation(e):
+            raise
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Code already exists")
+    out = KitOut.model_validate(obj)  # antes del commit, que expira los atributos
     db.commit()
-    db.refresh(obj)
-    return obj
+    refcache.kits.put(out.id_kit, out.code, out.cname)
+    return out
 
 @router.put("/{kit_id}", response_model=KitOut)
 def update_kit(kit_id: int, body: KitUpdate, db: Session = Depends(get_db)):
@@ -63,9 +140,17 @@ def update_kit(kit_id: int, body: KitUpdate, db: Session = Depends(get_db)):
     if body.mod_user is not None:
         obj.mod_user = body.mod_user
     
+    try:
+        db.flush()
+    except IntegrityError as e:
+        if not is_unique_violation(e):
+            raise
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Code already exists")
+    out = KitOut.model_validate(obj)
     db.commit()
-    db.refresh(obj)
-    return obj
+    refcache.kits.put(kit_id, out.code, out.cname)
+    return out
 
 @router.delete("/{kit_id}", status_code=204)
 def delete_kit(kit_id: int, db: Session = Depends(get_db)):
@@ -74,11 +159,25 @@ def delete_kit(kit_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Kit not found")
     db.delete(obj)
     db.commit()
+    refcache.kits.invalidate(kit_id)
     return None
 
 # -------- Kit Composition --------
+def composition_dict(r, product) -> dict:
+    """Fila de composición + (code, cname) del producto tomado de refcache."""
+    return {
+        "id_kit_composition": r.id_kit_composition,
+        "id_kit": r.id_kit,
+        "id_product": r.id_product,
+        "quantaty": r.quantaty,
+        "add_date": r.add_date,
+        "mod_date": r.mod_date,
+        "product_code": product[0] if product else None,
+        "product_name": product[1] if product else None,
+    }
+
 @router.get("/{kit_id}/composition", response_model=List[KitCompositionOut])
-def list_composition(kit_id: int, db: Session = Depends(get_db)):
+def list_composition(kit_id: int, db: Session = Depends(get_read_db)):
     q = (
         db.query(
             TabKitComposition.id_kit_composition,
@@ -87,35 +186,22 @@ def list_composition(kit_id: int, db: Session = Depends(get_db)):
             TabKitComposition.quantaty,
             TabKitComposition.add_date,
             TabKitComposition.mod_date,
-            TabProductos.code.label("product_code"),
-            TabProductos.cname.label("product_name"),
         )
-        .join(TabProductos, TabProductos.id_product == TabKitComposition.id_product)
         .filter(TabKitComposition.id_kit == kit_id)
         .order_by(TabKitComposition.id_kit_composition.desc())
     )
     rows = q.all()
-    
-    return [
-        {
-            "id_kit_composition": r.id_kit_composition,
-            "id_kit": r.id_kit,
-            "id_product": r.id_product,
-            "quantaty": r.quantaty,
-            "add_date": r.add_date,
-            "mod_date": r.mod_date,
-            "product_code": r.product_code,
-            "product_name": r.product_name,
-        }
-        for r in rows
-    ]
+    # Código y nombre del producto desde el caché de catálogos (sin JOIN)
+    refs = refcache.products.get_many(db, (r.id_product for r in rows))
+    return fast_json([composition_dict(r, refs.get(r.id_product)) for r in rows])
 
 @router.post("/{kit_id}/composition", response_model=KitCompositionOut, status_code=201)
 def add_composition(kit_id: int, body: KitCompositionBase, db: Session = Depends(get_db)):
-    # Validar existencia del kit y el producto
-    if not db.get(TabKit, kit_id):  # ✅ Corregido
+    # Validar existencia del kit y el producto (caché de catálogos)
+    if not refcache.kits.get(db, kit_id):
         raise HTTPException(status_code=404, detail="Kit not found")
-    if not db.get(TabProductos, body.id_product):  # ✅ Corregido
+    p = refcache.products.get(db, body.id_product)
+    if not p:
         raise HTTPException(status_code=404, detail="Product not found")
     
     obj = TabKitComposition(
@@ -125,21 +211,15 @@ def add_composition(kit_id: int, body: KitCompositionBase, db: Session = Depends
         add_user=body.add_user,
     )
     db.add(obj)
+    try:
+        db.flush()
+    except IntegrityError:
+        # Kit o producto eliminado por otro worker después de quedar en caché
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Kit or product not found")
+    out = composition_dict(obj, p)
     db.commit()
-    db.refresh(obj)
-    
-    # Obtener datos del producto
-    p = db.get(TabProductos, body.id_product)
-    return {
-        "id_kit_composition": obj.id_kit_composition,
-        "id_kit": obj.id_kit,
-        "id_product": obj.id_product,
-        "quantaty": obj.quantaty,
-        "add_date": obj.add_date,
-        "mod_date": obj.mod_date,
-        "product_code": p.code if p else None,
-        "product_name": p.cname if p else None,
-    }
+    return out
 
 @router.put("/{kit_id}/composition/{comp_id}", response_model=KitCompositionOut)
 def update_composition(
@@ -154,20 +234,10 @@ def update_composition(
     if body.mod_user is not None:
         obj.mod_user = body.mod_user
     
+    db.flush()
+    out = composition_dict(obj, refcache.products.get(db, obj.id_product))
     db.commit()
-    db.refresh(obj)
-    
-    p = db.get(TabProductos, obj.id_product)
-    return {
-        "id_kit_composition": obj.id_kit_composition,
-        "id_kit": obj.id_kit,
-        "id_product": obj.id_product,
-        "quantaty": obj.quantaty,
-        "add_date": obj.add_date,
-        "mod_date": obj.mod_date,
-        "product_code": p.code if p else None,
-        "product_name": p.cname if p else None,
-    }
+    return out
 
 @router.delete("/{kit_id}/composition/{comp_id}", status_code=204)
 def delete_composition(kit_id: int, comp_id: int, db: Session = Depends(get_db)):
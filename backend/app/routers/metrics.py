@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from .. import metrics
+
+router = APIRouter(tags=["health"])
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Métricas en formato de texto de Prometheus (latencias, SQL por petición, pools)"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
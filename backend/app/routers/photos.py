@@ -0,0 +1,50 @@
+# backend/app/routers/photos.py
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, RedirectResponse
+
+from .. import ingest, photos
+from ..config import settings
+from ..schemas import PhotoOut
+
+router = APIRouter(prefix="/photos", tags=["photos"])
+
+# El nombre es el hash del contenido: nunca cambia, se puede cachear para siempre
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@router.post("/", response_model=PhotoOut, status_code=201)
+async def upload_photo(request: Request):
+    """
+    Sube una imagen (cuerpo binario con Content-Type image/*) y devuelve la
+    referencia para guardar en `photo` del producto o kit. Subir la misma imagen
+    dos veces devuelve la misma referencia sin volver a guardarla.
+    """
+    content_type = (request.headers.get("content-type") or "").split(";")[0].strip().lower()
+    if not content_type.startswith("image/"):
+        raise HTTPException(status_code=415, detail="Envíe la imagen con Content-Type image/*")
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > settings.photo_max_bytes:
+        raise HTTPException(status_code=413, detail=f"La foto supera {settings.photo_max_bytes} bytes")
+    try:
+        return await run_in_threadpool(lambda: photos.save(ingest.sync_chunks(request)))
+    except photos.PhotoTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+
+@router.get("/{name}")
+def get_photo(name: str, request: Request):
+    """Foto o miniatura en streaming, con soporte de Range y caché del navegador."""
+    found = photos.resolve(name)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Foto no encontrada")
+    path, media_type = found
+    if path.name != name:
+        # Miniatura que no se pudo generar: el original tiene su propia URL (y caché);
+        # la redirección no se guarda, para que la miniatura se use cuando exista
+        return RedirectResponse(photos.PHOTO_PREFIX + path.name, status_code=307, headers={"Cache-Control": "no-store"})
+    etag = f'"{path.name}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag in (request.headers.get("if-none-match") or ""):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
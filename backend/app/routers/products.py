@@ -1,39 +1,58 @@
 # backend/app/routers/products.py
+from datetime import datetime, timedelta
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func, case
-from ..database import get_db
-from ..models import TabProductos, TabProductTransaction, TabWarehouse
-from ..schemas import ProductoCreate, ProductoOut, ProductoUpdate
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from ..database import get_db, get_read_db, is_unique_violation
+from ..pagination import SortField, paginate, set_next_cursor
+from .. import lots, refcache, snapshots, versions
+from ..responses import fast_json
+from ..models import TabProductos, TabStockBalance, TabStockSnapshot, TabWarehouse
+from ..schemas import LotOut, ProductoCreate, ProductoOut, ProductoUpdate
 
 router = APIRouter(prefix="/products", tags=["products"])
 
 @router.post("/", response_model=ProductoOut, status_code=201)
 def create_product(payload: ProductoCreate, db: Session = Depends(get_db)):
-    # code único
-    if payload.code:
-        exists = db.query(TabProductos).filter(TabProductos.code == payload.code).first()
-        if exists:
-            raise HTTPException(status_code=409, detail="El código ya existe")
     item = TabProductos(**payload.model_dump())
     db.add(item)
+    try:
+        db.flush()  # INSERT ... RETURNING id y fechas
+    except IntegrityError as e:
+        # code único: lo garantiza el índice, sin SELECT previo
+        if not is_unique_violation(e):
+            raise
+        db.rollback()
+        raise HTTPException(status_code=409, detail="El código ya existe")
+    out = ProductoOut.model_validate(item)  # antes del commit, que expira los atributos
     db.commit()
-    db.refresh(item)
-    return item
+    refcache.products.put(out.id_product, out.code, out.cname)
+    return out
 
 @router.get("/", response_model=List[ProductoOut])
 def list_products(
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
     q: Optional[str] = Query(None, description="Buscar por code o cname"),
     skip: int = 0,
     limit: int = Query(50, le=200),
+    sort: SortField = Query("id", description="Orden descendente por id, add_date o mod_date"),
+    cursor: Optional[str] = Query(None, description="Cursor X-Next-Cursor de la página anterior"),
 ):
+    # Sin cambios desde el ETag del cliente: 304 sin consultar ni serializar
+    cached = versions.not_modified(request, response, db, "products")
+    if cached:
+        return cached
     query = db.query(TabProductos)
     if q:
         like = f"%{q}%"
         query = query.filter((TabProductos.code.like(like)) | (TabProductos.cname.like(like)))
-    return query.order_by(TabProductos.id_product.desc()).offset(skip).limit(limit).all()
+    rows = paginate(query, TabProductos, "id_product", sort, cursor, skip, limit).all()
+    set_next_cursor(response, rows, "id_product", sort, limit)
+    return rows
 
 @router.get("/{id_product}", response_model=ProductoOut)
 def get_product(id_product: int, db: Session = Depends(get_db)):
@@ -48,19 +67,20 @@ def update_product(id_product: int, payload: ProductoUpdate, db: Session = Depen
     if not item:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     data = payload.model_dump(exclude_unset=True)
-    # mantener unicidad de code si cambia
-    if "code" in data and data["code"] is not None:
-        clash = db.query(TabProductos).filter(
-            TabProductos.code == data["code"],
-            TabProductos.id_product != id_product
-        ).first()
-        if clash:
-            raise HTTPException(status_code=409, detail="El código ya existe")
     for k, v in data.items():
         setattr(item, k, v)
+    try:
+        db.flush()  # UPDATE ... RETURNING mod_date
+    except IntegrityError as e:
+        # mantener unicidad de code si cambia (índice único)
+        if not is_unique_violation(e):
+            raise
+        db.rollback()
+        raise HTTPException(status_code=409, detail="El código ya existe")
+    out = ProductoOut.model_validate(item)
     db.commit()
-    db.refresh(item)
-    return item
+    refcache.products.put(id_product, out.code, out.cname)
+    return out
 
 @router.delete("/{id_product}", status_code=204)
 def delete_product(id_product: int, db: Session = Depends(get_db)):
@@ -69,37 +89,58 @@ def delete_product(id_product: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     db.delete(item)
     db.commit()
+    refcache.products.invalidate(id_product)
     return
 
 @router.get("/inventory/summary", response_model=List[dict])
-def get_inventory_summary(db: Session = Depends(get_db)):
+def get_inventory_summary(request: Request, response: Response, db: Session = Depends(get_read_db)):
     """
     Devuelve el stock de cada producto desagregado por bodega
     """
-    # Calcular stock por producto y bodega
+    cached = versions.not_modified(request, response, db, "stock", "products", "warehouses")
+    if cached:
+        return cached
+    # Leer saldos acumulados por producto y bodega
     query = db.query(
-        TabProductTransaction.id_product,
-        TabProductTransaction.id_warehouse,
+        TabStockBalance.id_product,
+        TabStockBalance.id_warehouse,
         TabProductos.cname.label('product_name'),
         TabWarehouse.cname.label('warehouse_name'),
-        func.sum(
-            case(
-                (TabProductTransaction.type_transaction == 0, TabProductTransaction.quantaty_products),
-                else_=-TabProductTransaction.quantaty_products
-            )
-        ).label('stock')
+        TabStockBalance.stock,
     ).join(
-        TabProductos, TabProductTransaction.id_product == TabProductos.id_product
+        TabProductos, TabStockBalance.id_product == TabProductos.id_product
     ).join(
-        TabWarehouse, TabProductTransaction.id_warehouse == TabWarehouse.id_warehouse
-    ).group_by(
-        TabProductTransaction.id_product,
-        TabProductTransaction.id_warehouse,
-        TabProductos.cname,
-        TabWarehouse.cname
+        TabWarehouse, TabStockBalance.id_warehouse == TabWarehouse.id_warehouse
     ).all()
     
-    # Convertir a lista de diccionarios
+    # Las columnas ya tienen los nombres de salida: se serializan directo desde las filas
+    return fast_json(query, response)
+
+@router.get("/inventory/as-of", response_model=List[dict])
+def get_inventory_as_of(
+    at: datetime = Query(..., description="Fecha/hora de corte (movimientos con add_date anterior)"),
+    id_warehouse: Optional[int] = None,
+    db: Session = Depends(get_read_db),
+):
+    """
+    Stock de cada producto por bodega a una fecha pasada: foto de cierre más
+    cercana anterior + movimientos desde esa foto hasta la fecha pedida
+    """
+    bal = snapshots.balances_at(db, at).subquery()
+    query = db.query(
+        bal.c.id_product,
+        bal.c.id_warehouse,
+        TabProductos.cname.label('product_name'),
+        TabWarehouse.cname.label('warehouse_name'),
+        bal.c.stock,
+    ).join(
+        TabProductos, bal.c.id_product == TabProductos.id_product
+    ).join(
+        TabWarehouse, bal.c.id_warehouse == TabWarehouse.id_warehouse
+    )
+    if id_warehouse is not None:
+        query = query.filter(bal.c.id_warehouse == id_warehouse)
+    
     return [
         {
             "id_product": row.id_product,
@@ -108,5 +149,54 @@ def get_inventory_summary(db: Session = Depends(get_db)):
             "warehouse_name": row.warehouse_name,
             "stock": row.stock or 0
         }
-        for row in query
-    ]
\ No newline at end of file
+        for row in query.all()
+    ]
+
+@router.get("/inventory/expiring", response_model=List[LotOut])
+def get_expiring(
+    days: int = Query(30, ge=0, le=3650, description="Vencen dentro de N días"),
+    id_warehouse: Optional[int] = None,
+    include_expired: bool = Query(False, description="Incluir lotes ya vencidos con existencia"),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Lotes con existencia que vencen dentro de N días, del más próximo al más lejano.
+    Rango sobre el índice de tab_stock_lot: no recorre el libro.
+    """
+    now = datetime.now()
+    rows = lots.expiring(db, now + timedelta(days=days), None if include_expired else now, id_warehouse)
+    products = refcache.products.get_many(db, (r.id_product for r in rows))
+    warehouses = refcache.warehouses.get_many(db, (r.id_warehouse for r in rows))
+    return fast_json([
+        {
+            "id_product": r.id_product,
+            "id_warehouse": r.id_warehouse,
+            "expiration_date": r.expiration_date,
+            "qty": r.qty,
+            "days_left": (r.expiration_date - now).days,
+            "product_name": refcache.name(products.get(r.id_product)),
+            "warehouse_name": refcache.name(warehouses.get(r.id_warehouse)),
+        }
+        for r in rows
+    ])
+
+@router.get("/inventory/snapshots", response_model=List[dict])
+def list_snapshots(db: Session = Depends(get_read_db)):
+    """Fotos de cierre disponibles, de la más reciente a la más antigua"""
+    rows = db.query(
+        TabStockSnapshot.snapshot_date,
+        func.count().label("rows"),
+    ).group_by(TabStockSnapshot.snapshot_date).order_by(TabStockSnapshot.snapshot_date.desc()).all()
+    return [{"snapshot_date": r.snapshot_date, "rows": r.rows} for r in rows]
+
+@router.post("/inventory/snapshots", status_code=201)
+def create_snapshot(
+    at: datetime = Query(..., description="Fecha de cierre del periodo"),
+    db: Session = Depends(get_db),
+):
+    """Guarda (o rehace) la foto de cierre a la fecha indicada"""
+    if at > datetime.now():
+        raise HTTPException(status_code=400, detail="La fecha de cierre no puede ser futura")
+    rows = snapshots.take_snapshot(db, at)
+    db.commit()
+    return {"snapshot_date": at, "rows": rows}
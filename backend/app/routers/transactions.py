@@ -1,23 +1,23 @@
 # backend/app/routers/transactions.py
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Optional
-from app.database import get_db
-from app import models, schemas
+from sqlalchemy import and_, func, select, true
+from typing import List, Literal, Optional
+from datetime import datetime
+from app.config import settings
+from app.database import get_db, get_read_db
+from app.pagination import SortField, paginate, set_next_cursor
+from app import export, group_commit, ingest, models, refcache, schemas, search, stock
+from app.responses import fast_json
 
 router = APIRouter(prefix="/transactions", tags=["transactions"])
 
-@router.get("/", response_model=List[schemas.TransactionOut])
-def list_transactions(
-    q: Optional[str] = Query(None, description="Buscar por descripción"),
-    type_transaction: Optional[int] = Query(None, description="0 entrada, 1 salida"),
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
-):
-    # Query con JOINs para traer nombres
-    query = db.query(
+def transaction_select():
+    """Columnas del movimiento, sin JOINs: los nombres salen de refcache (transaction_dicts)."""
+    return select(
         models.TabProductTransaction.id_product_transaction,
         models.TabProductTransaction.id_product,
         models.TabProductTransaction.id_warehouse,
@@ -32,111 +32,134 @@ def list_transactions(
         models.TabProductTransaction.add_date,
         models.TabProductTransaction.mod_user,
         models.TabProductTransaction.mod_date,
-        models.TabProductos.cname.label("product_name"),
-        models.TabWarehouse.cname.label("warehouse_name"),
-        models.TabKit.cname.label("kit_name"),
-    ).join(
-        models.TabProductos,
-        models.TabProductos.id_product == models.TabProductTransaction.id_product
-    ).join(
-        models.TabWarehouse,
-        models.TabWarehouse.id_warehouse == models.TabProductTransaction.id_warehouse
-    ).outerjoin(
-        models.TabKit,
-        models.TabKit.id_kit == models.TabProductTransaction.id_kit
     )
+
+TX_FIELDS = [c.key for c in transaction_select().selected_columns]
+
+def transaction_dict(r, products: dict, warehouses: dict, kits: dict) -> dict:
+    # Fila de transaction_select() (un solo paso, mismo orden) u objeto recién escrito
+    d = r._asdict() if isinstance(r, Row) else {k: getattr(r, k) for k in TX_FIELDS}
+    d["product_name"] = refcache.name(products.get(r.id_product))
+    d["warehouse_name"] = refcache.name(warehouses.get(r.id_warehouse))
+    d["kit_name"] = refcache.name(kits.get(r.id_kit))
+    return d
+
+def transaction_dicts(db: Session, rows) -> List[dict]:
+    """Mapea filas de transaction_select() (u objetos del libro) a dicts con nombres de producto, bodega y kit."""
+    products = refcache.products.get_many(db, (r.id_product for r in rows))
+    warehouses = refcache.warehouses.get_many(db, (r.id_warehouse for r in rows))
+    kits = refcache.kits.get_many(db, (r.id_kit for r in rows))
+    return [transaction_dict(r, products, warehouses, kits) for r in rows]
+
+@router.get("/", response_model=List[schemas.TransactionOut])
+def list_transactions(
+    response: Response,
+    q: Optional[str] = Query(None, description="Buscar por descripción"),
+    type_transaction: Optional[int] = Query(None, description="0 entrada, 1 salida"),
+    skip: int = 0,
+    limit: int = 100,
+    sort: SortField = Query("id", description="Orden descendente por id, add_date o mod_date"),
+    cursor: Optional[str] = Query(None, description="Cursor X-Next-Cursor de la página anterior"),
+    db: Session = Depends(get_read_db),
+):
+    dialect = db.get_bind().dialect.name
+    query = transaction_select()
     
-    # Filtros
+    # Filtros (q con solo espacios = sin filtro)
+    q = search.clean(q)
     if q:
-        query = query.filter(func.lower(models.TabProductTransaction.description).like(f"%{q.lower()}%"))
+        query = query.where(search.search_filter(dialect, q))
     if type_transaction in (0, 1):
-        query = query.filter(models.TabProductTransaction.type_transaction == type_transaction)
+        query = query.where(models.TabProductTransaction.type_transaction == type_transaction)
     
     # Obtener resultados
-    results = query.order_by(models.TabProductTransaction.id_product_transaction.desc()).offset(skip).limit(limit).all()
+    results = db.execute(paginate(
+        query, models.TabProductTransaction, "id_product_transaction", sort, cursor, skip, limit, dialect
+    )).all()
+    set_next_cursor(response, results, "id_product_transaction", sort, limit)
     
-    # Mapear a diccionarios
-    return [
-        {
-            "id_product_transaction": r.id_product_transaction,
-            "id_product": r.id_product,
-            "id_warehouse": r.id_warehouse,
-            "type_transaction": r.type_transaction,
-            "id_planification_expense_request": r.id_planification_expense_request,
-            "id_kit": r.id_kit,
-            "quantaty_kit": r.quantaty_kit,
-            "quantaty_products": r.quantaty_products,
-            "description": r.description,
-            "expiration_date": r.expiration_date,
-            "add_user": r.add_user,
-            "add_date": r.add_date,
-            "mod_user": r.mod_user,
-            "mod_date": r.mod_date,
-            "product_name": r.product_name,
-            "warehouse_name": r.warehouse_name,
-            "kit_name": r.kit_name,
-        }
-        for r in results
-    ]
+    # Mapear a diccionarios (nombres desde el caché de catálogos) y serializar con orjson
+    return fast_json(transaction_dicts(db, results), response)
 
-@router.get("/{tx_id}", response_model=schemas.TransactionOut)
-def get_transaction(tx_id: int, db: Session = Depends(get_db)):
-    result = db.query(
-        models.TabProductTransaction.id_product_transaction,
-        models.TabProductTransaction.id_product,
-        models.TabProductTransaction.id_warehouse,
-        models.TabProductTransaction.type_transaction,
-        models.TabProductTransaction.id_planification_expense_request,
-        models.TabProductTransaction.id_kit,
-        models.TabProductTransaction.quantaty_kit,
-        models.TabProductTransaction.quantaty_products,
-        models.TabProductTransaction.description,
-        models.TabProductTransaction.expiration_date,
-        models.TabProductTransaction.add_user,
-        models.TabProductTransaction.add_date,
-        models.TabProductTransaction.mod_user,
-        models.TabProductTransaction.mod_date,
-        models.TabProductos.cname.label("product_name"),
-        models.TabWarehouse.cname.label("warehouse_name"),
-        models.TabKit.cname.label("kit_name"),
-    ).join(
-        models.TabProductos,
-        models.TabProductos.id_product == models.TabProductTransaction.id_product
-    ).join(
-        models.TabWarehouse,
-        models.TabWarehouse.id_warehouse == models.TabProductTransaction.id_warehouse
-    ).outerjoin(
-        models.TabKit,
-        models.TabKit.id_kit == models.TabProductTransaction.id_kit
-    ).filter(models.TabProductTransaction.id_product_transaction == tx_id).first()
+@router.get("/search", response_model=List[schemas.TransactionOut])
+def search_transactions(
+    q: str = Query(..., min_length=1, description="Texto a buscar en la descripción"),
+    type_transaction: Optional[int] = Query(None, description="0 entrada, 1 salida"),
+    skip: int = 0,
+    limit: int = Query(50, le=200),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Búsqueda de texto sobre la descripción usando el índice de texto del motor
+    (FULLTEXT en MySQL, GIN en PostgreSQL, FTS5 en SQLite), ordenada por relevancia.
+    """
+    q = search.clean(q)
+    if q is None:
+        return fast_json([])  # solo espacios: ninguna palabra que buscar
+    dialect = db.get_bind().dialect.name
+    query = transaction_select().where(search.search_filter(dialect, q))
+    if type_transaction in (0, 1):
+        query = query.where(models.TabProductTransaction.type_transaction == type_transaction)
+    
+    results = db.execute(query.order_by(
+        search.rank_expr(dialect, q).desc(),
+        models.TabProductTransaction.id_product_transaction.desc(),
+    ).offset(skip).limit(limit)).all()
+    return fast_json(transaction_dicts(db, results))
+
+@router.get("/export")
+def export_transactions(
+    format: Literal["csv", "ndjson"] = Query("csv"),
+    date_from: Optional[datetime] = Query(None, description="add_date desde (inclusive)"),
+    date_to: Optional[datetime] = Query(None, description="add_date hasta (exclusive)"),
+    id_warehouse: Optional[int] = None,
+    id_product: Optional[int] = None,
+    type_transaction: Optional[int] = Query(None, description="0 entrada, 1 salida"),
+):
+    """
+    Exporta el libro de movimientos en streaming (CSV o NDJSON) para auditorías,
+    ordenado por id. La memoria usada no depende de cuántas filas se exporten.
+    """
+    stmt = export.build_query(date_from, date_to, id_warehouse, id_product, type_transaction)
+    filename = f"transactions.{format}"
+    return StreamingResponse(
+        export.stream(stmt, format),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+def load_transaction(db: Session, tx_id: int) -> dict:
+    result = db.execute(transaction_select().where(
+        models.TabProductTransaction.id_product_transaction == tx_id
+    )).first()
     
     if not result:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
-    return {
-        "id_product_transaction": result.id_product_transaction,
-        "id_product": result.id_product,
-        "id_warehouse": result.id_warehouse,
-        "type_transaction": result.type_transaction,
-        "id_planification_expense_request": result.id_planification_expense_request,
-        "id_kit": result.id_kit,
-        "quantaty_kit": result.quantaty_kit,
-        "quantaty_products": result.quantaty_products,
-        "description": result.description,
-        "expiration_date": result.expiration_date,
-        "add_user": result.add_user,
-        "add_date": result.add_date,
-        "mod_user": result.mod_user,
-        "mod_date": result.mod_date,
-        "product_name": result.product_name,
-        "warehouse_name": result.warehouse_name,
-        "kit_name": result.kit_name,
-    }
+    return transaction_dicts(db, [result])[0]
+
+def load_transactions(db: Session, ids: List[int]) -> List[dict]:
+    """Varios movimientos con una sola consulta, en el orden de `ids`."""
+    rows = db.execute(transaction_select().where(
+        models.TabProductTransaction.id_product_transaction.in_(ids)
+    )).all()
+    by_id = {r.id_product_transaction: r for r in rows}
+    return transaction_dicts(db, [by_id[i] for i in ids])
+
+# Altas agrupadas con GROUP_COMMIT=true: la respuesta se arma en la transacción del lote
+writer = group_commit.GroupCommitWriter(load_transactions)
+
+@router.get("/{tx_id}", response_model=schemas.TransactionOut)
+def get_transaction(tx_id: int, db: Session = Depends(get_db)):
+    return fast_json(load_transaction(db, tx_id))
 
 @router.post("/", response_model=schemas.TransactionOut, status_code=201)
 def create_transaction(payload: schemas.TransactionCreate, db: Session = Depends(get_db)):
     if payload.type_transaction not in (0, 1):
         raise HTTPException(status_code=400, detail="type_transaction must be 0 (in) or 1 (out)")
+    if settings.group_commit:
+        # Espera (en este hilo del threadpool) el commit del lote en el que entró la fila
+        return writer.submit(ingest.ledger_row(payload)).result()
     
     row = models.TabProductTransaction(
         id_product=payload.id_product,
@@ -151,11 +174,98 @@ def create_transaction(payload: schemas.TransactionCreate, db: Session = Depends
         add_user=payload.add_user,
     )
     db.add(row)
+    # INSERT ... RETURNING id y fechas; el saldo se ajusta en el mismo flush
+    # (una salida sin existencia lanza stock.InsufficientStock -> 409)
+    db.flush()
+    
+    # Respuesta con lo que ya se tiene (nombres desde refcache), sin releer la fila
+    out = transaction_dicts(db, [row])[0]
+    db.commit()
+    return out
+
+@router.post("/bulk", response_model=schemas.BulkIngestOut)
+async def bulk_ingest(
+    request: Request,
+    mode: Literal["atomic", "best_effort"] = Query("atomic", description="atomic: todo o nada; best_effort: omite filas con error"),
+    batch_size: int = Query(settings.bulk_batch_size, ge=1, le=10000, description="Filas por INSERT multi-fila"),
+    db: Session = Depends(get_db),
+):
+    """
+    Carga masiva de movimientos. El cuerpo puede ser un arreglo JSON
+    (application/json), NDJSON (application/x-ndjson) o CSV con encabezados
+    (text/csv), con los mismos campos que POST /transactions.
+    Devuelve un reporte con los errores por fila.
+    """
+    fmt = ingest.detect_format(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Use application/json, application/x-ndjson or text/csv")
+    
+    def run():
+        records = ingest.iter_records(ingest.sync_chunks(request), fmt)
+        return ingest.ingest(db, records, atomic=(mode == "atomic"), batch_size=batch_size)
+    
+    report = await run_in_threadpool(run)
+    if mode == "atomic" and report["failed"]:
+        return JSONResponse(status_code=422, content=report)
+    return report
+
+@router.post("/issue-kit", response_model=schemas.KitIssueOut, status_code=201)
+def issue_kit(payload: schemas.KitIssueCreate, db: Session = Depends(get_db)):
+    """
+    Salida de kits completos: expande la composición del kit, valida existencias
+    de cada componente y registra todas las salidas en un único INSERT multi-fila
+    dentro de una sola transacción (o se registran todas, o ninguna).
+    """
+    if not refcache.kits.get(db, payload.id_kit):
+        raise HTTPException(status_code=404, detail="Kit not found")
+    
+    # Cantidad por kit de cada producto (un producto puede aparecer en varias filas)
+    components = db.query(
+        models.TabKitComposition.id_product,
+        func.sum(models.TabKitComposition.quantaty).label("quantaty"),
+    ).filter(
+        models.TabKitComposition.id_kit == payload.id_kit
+    ).group_by(models.TabKitComposition.id_product).all()
+    if not components:
+        raise HTTPException(status_code=400, detail="Kit has no composition")
+    
+    required = {c.id_product: c.quantaty * payload.quantaty_kit for c in components}
+    available = stock.lock_balances(db, payload.id_warehouse, required)
+    shortages = [
+        f"{pid} (required {qty}, stock {available[pid]})"
+        for pid, qty in required.items()
+        if available[pid] < qty
+    ]
+    if shortages:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Insufficient stock for product(s): " + ", ".join(shortages))
+    
+    rows = [
+        {
+            "id_product": pid,
+            "id_warehouse": payload.id_warehouse,
+            "type_transaction": 1,
+            "id_planification_expense_request": payload.id_planification_expense_request,
+            "id_kit": payload.id_kit,
+            "quantaty_kit": payload.quantaty_kit,
+            "quantaty_products": qty,
+            "description": payload.description,
+            "add_user": payload.add_user,
+        }
+        for pid, qty in required.items()
+    ]
+    stock.insert_movements(db, rows)
     db.commit()
-    db.refresh(row)
     
-    # Retornar con nombres incluidos
-    return get_transaction(row.id_product_transaction, db)
+    return {
+        "id_kit": payload.id_kit,
+        "id_warehouse": payload.id_warehouse,
+        "quantaty_kit": payload.quantaty_kit,
+        "lines": [
+            {"id_product": pid, "quantaty_products": qty, "stock": available[pid] - qty}
+            for pid, qty in required.items()
+        ],
+    }
 
 @router.put("/{tx_id}", response_model=schemas.TransactionOut)
 def update_transaction(tx_id: int, payload: schemas.TransactionUpdate, db: Session = Depends(get_db)):
@@ -170,11 +280,10 @@ def update_transaction(tx_id: int, payload: schemas.TransactionUpdate, db: Sessi
     for k, v in data.items():
         setattr(row, k, v)
     
+    db.flush()  # UPDATE ... RETURNING mod_date
+    out = transaction_dicts(db, [row])[0]
     db.commit()
-    db.refresh(row)
-    
-    # Retornar con nombres incluidos
-    return get_transaction(tx_id, db)
+    return out
 
 @router.delete("/{tx_id}", status_code=204)
 def delete_transaction(tx_id: int, db: Session = Depends(get_db)):
@@ -184,32 +293,75 @@ def delete_transaction(tx_id: int, db: Session = Depends(get_db)):
     db.delete(row)
     db.commit()
 
+@router.get("/inventory/batch", response_model=List[schemas.StockOut])
+def get_inventory_batch(
+    warehouse_id: List[int] = Query(..., description="Una o varias bodegas"),
+    product_id: List[int] = Query([], description="Productos a consultar"),
+    kit_id: Optional[int] = Query(None, description="Consultar los componentes de este kit"),
+    db: Session = Depends(get_db),
+):
+    """
+    Existencias de varios productos (o de los componentes de un kit) en una o
+    varias bodegas con una sola consulta. Las combinaciones sin movimientos
+    se devuelven con stock 0.
+    """
+    if not product_id and kit_id is None:
+        raise HTTPException(status_code=400, detail="product_id or kit_id is required")
+    
+    bal = models.TabStockBalance
+    if kit_id is not None:
+        products = db.query(models.TabKitComposition.id_product).filter(
+            models.TabKitComposition.id_kit == kit_id
+        )
+        if product_id:
+            products = products.filter(models.TabKitComposition.id_product.in_(product_id))
+        product_filter = models.TabProductos.id_product.in_(products.scalar_subquery())
+    else:
+        product_filter = models.TabProductos.id_product.in_(product_id)
+    
+    rows = db.query(
+        models.TabWarehouse.id_warehouse,
+        models.TabProductos.id_product,
+        func.coalesce(bal.qty_in, 0).label("entradas"),
+        func.coalesce(bal.qty_out, 0).label("salidas"),
+    ).select_from(models.TabProductos).join(
+        models.TabWarehouse, true()
+    ).outerjoin(
+        bal,
+        and_(
+            bal.id_product == models.TabProductos.id_product,
+            bal.id_warehouse == models.TabWarehouse.id_warehouse,
+        ),
+    ).filter(
+        product_filter,
+        models.TabWarehouse.id_warehouse.in_(warehouse_id),
+    ).order_by(models.TabWarehouse.id_warehouse, models.TabProductos.id_product).all()
+    
+    return [
+        {
+            "id_warehouse": r.id_warehouse,
+            "id_product": r.id_product,
+            "stock": r.entradas - r.salidas,
+            "entradas": r.entradas,
+            "salidas": r.salidas,
+        }
+        for r in rows
+    ]
+
 @router.get("/inventory/{warehouse_id}/{product_id}")
 def get_inventory(warehouse_id: int, product_id: int, db: Session = Depends(get_db)):
     """
-    Calcula las existencias actuales de un producto en un almacén
-    sumando todas las entradas (type=0) y restando todas las salidas (type=1)
+    Devuelve las existencias actuales de un producto en un almacén
+    leyendo el saldo acumulado (entradas type=0 menos salidas type=1)
     """
-    # Sumar entradas
-    entradas = db.query(func.sum(models.TabProductTransaction.quantaty_products)).filter(
-        models.TabProductTransaction.id_warehouse == warehouse_id,
-        models.TabProductTransaction.id_product == product_id,
-        models.TabProductTransaction.type_transaction == 0
-    ).scalar() or 0
-    
-    # Sumar salidas
-    salidas = db.query(func.sum(models.TabProductTransaction.quantaty_products)).filter(
-        models.TabProductTransaction.id_warehouse == warehouse_id,
-        models.TabProductTransaction.id_product == product_id,
-        models.TabProductTransaction.type_transaction == 1
-    ).scalar() or 0
-    
-    stock = entradas - salidas
+    bal = db.get(models.TabStockBalance, (product_id, warehouse_id))
+    entradas = bal.qty_in if bal else 0
+    salidas = bal.qty_out if bal else 0
     
     return {
         "id_warehouse": warehouse_id,
         "id_product": product_id,
-        "stock": stock,
+        "stock": entradas - salidas,
         "entradas": entradas,
         "salidas": salidas
     }
\ No newline at end of file
@@ -1,10 +1,13 @@
 # backend/app/routers/warehouses.py
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from ..database import get_db
+from .. import refcache, versions
+from ..database import get_db, get_read_db, is_unique_violation
+from ..pagination import SortField, paginate, set_next_cursor
 from ..models import TabWarehouse
 from ..schemas import WarehouseCreate, WarehouseOut, WarehouseUpdate
 
@@ -12,31 +15,43 @@ router = APIRouter(prefix="/warehouses", tags=["warehouses"])
 
 @router.post("/", response_model=WarehouseOut, status_code=201)
 def create_warehouse(payload: WarehouseCreate, db: Session = Depends(get_db)):
-    # Validar código único si existe
-    if payload.code:
-        exists = db.query(TabWarehouse).filter(TabWarehouse.code == payload.code).first()
-        if exists:
-            raise HTTPException(status_code=409, detail="El código ya existe")
-    
-    # Crear warehouse
+    # Crear warehouse; el código único lo valida el índice
     item = TabWarehouse(**payload.model_dump())
     db.add(item)
+    try:
+        db.flush()  # INSERT ... RETURNING id y fechas
+    except IntegrityError as e:
+        if not is_unique_violation(e):
+            raise
+        db.rollback()
+        raise HTTPException(status_code=409, detail="El código ya existe")
+    out = WarehouseOut.model_validate(item)  # antes del commit, que expira los atributos
     db.commit()
-    db.refresh(item)
-    return item
+    refcache.warehouses.put(out.id_warehouse, out.code, out.cname)
+    return out
 
 @router.get("/", response_model=List[WarehouseOut])
 def list_warehouses(
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
     q: Optional[str] = Query(None, description="Buscar por nombre"),
     skip: int = 0,
     limit: int = Query(50, le=200),
+    sort: SortField = Query("id", description="Orden descendente por id, add_date o mod_date"),
+    cursor: Optional[str] = Query(None, description="Cursor X-Next-Cursor de la página anterior"),
 ):
+    # Sin cambios desde el ETag del cliente: 304 sin consultar ni serializar
+    cached = versions.not_modified(request, response, db, "warehouses")
+    if cached:
+        return cached
     query = db.query(TabWarehouse)
     if q:
         like = f"%{q}%"
         query = query.filter(TabWarehouse.cname.like(like))
-    return query.order_by(TabWarehouse.id_warehouse.desc()).offset(skip).limit(limit).all()
+    rows = paginate(query, TabWarehouse, "id_warehouse", sort, cursor, skip, limit).all()
+    set_next_cursor(response, rows, "id_warehouse", sort, limit)
+    return rows
 
 @router.get("/{warehouse_id}", response_model=WarehouseOut)
 def get_warehouse(warehouse_id: int, db: Session = Depends(get_db)):
@@ -52,22 +67,21 @@ def update_warehouse(warehouse_id: int, payload: WarehouseUpdate, db: Session =
         raise HTTPException(status_code=404, detail="Warehouse not found")
     
     data = payload.model_dump(exclude_unset=True)
-    
-    # Validar código único si cambia
-    if "code" in data and data["code"] is not None:
-        clash = db.query(TabWarehouse).filter(
-            TabWarehouse.code == data["code"],
-            TabWarehouse.id_warehouse != warehouse_id
-        ).first()
-        if clash:
-            raise HTTPException(status_code=409, detail="El código ya existe")
-    
     for k, v in data.items():
         setattr(item, k, v)
     
+    try:
+        db.flush()
+    except IntegrityError as e:
+        # Código único si cambia (índice único)
+        if not is_unique_violation(e):
+            raise
+        db.rollback()
+        raise HTTPException(status_code=409, detail="El código ya existe")
+    out = WarehouseOut.model_validate(item)
     db.commit()
-    db.refresh(item)
-    return item
+    refcache.warehouses.put(warehouse_id, out.code, out.cname)
+    return out
 
 @router.delete("/{warehouse_id}", status_code=204)
 def delete_warehouse(warehouse_id: int, db: Session = Depends(get_db)):
@@ -76,4 +90,5 @@ def delete_warehouse(warehouse_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Warehouse not found")
     db.delete(item)
     db.commit()
+    refcache.warehouses.invalidate(warehouse_id)
     return None
\ No newline at end of file
@@ -1,8 +1,14 @@
 # backend/app/schemas.py
-from pydantic import BaseModel, Field, HttpUrl
-from typing import Optional, List
+from pydantic import BaseModel, Field, HttpUrl, field_validator
+from typing import Any, Dict, Optional, List
 from datetime import datetime
 
+def _not_null(v):
+    # En un PUT parcial el campo puede omitirse, pero no enviarse como null (columna NOT NULL)
+    if v is None:
+        raise ValueError("no puede ser null")
+    return v
+
 # ========== PRODUCTOS ==========
 class ProductoBase(BaseModel):
     id_product_type: Optional[int] = None
@@ -29,6 +35,8 @@ class ProductoUpdate(BaseModel):
     add_user: Optional[int] = None
     mod_user: Optional[int] = None
 
+    _code_cname_not_null = field_validator("code", "cname")(_not_null)
+
 class ProductoOut(ProductoBase):
     id_product: int
     add_date: datetime
@@ -48,6 +56,22 @@ class InventoryByWarehouseOut(BaseModel):
     class Config:
         from_attributes = True
 
+class StockOut(BaseModel):
+    id_warehouse: int
+    id_product: int
+    stock: int
+    entradas: int
+    salidas: int
+
+class LotOut(BaseModel):
+    id_product: int
+    id_warehouse: int
+    expiration_date: datetime
+    qty: int
+    days_left: int
+    product_name: Optional[str] = None
+    warehouse_name: Optional[str] = None
+
 # ========== WAREHOUSES ==========
 class WarehouseBase(BaseModel):
     code: Optional[int] = Field(None, description="Código numérico interno")
@@ -65,6 +89,8 @@ class WarehouseUpdate(BaseModel):
     description: Optional[str] = None
     mod_user: Optional[int] = None
 
+    _code_cname_not_null = field_validator("code", "cname")(_not_null)
+
 class WarehouseOut(WarehouseBase):
     id_warehouse: int
     add_date: datetime
@@ -92,6 +118,8 @@ class KitUpdate(BaseModel):
     photo: Optional[str] = Field(None, max_length=512)
     mod_user: Optional[int] = None
 
+    _code_cname_not_null = field_validator("code", "cname")(_not_null)
+
 class KitOut(KitBase):
     id_kit: int
     add_date: datetime
@@ -124,6 +152,12 @@ class KitCompositionOut(BaseModel):
     class Config:
         from_attributes = True
 
+class KitAvailabilityOut(BaseModel):
+    id_kit: int
+    kit_name: str
+    id_warehouse: int
+    buildable: int = Field(..., description="Kits completos que se pueden armar con el stock actual")
+
 # ========== TRANSACTIONS ==========
 class TransactionBase(BaseModel):
     id_product: int
@@ -163,4 +197,45 @@ class TransactionOut(TransactionBase):
     kit_name: Optional[str] = None
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# ---------- KIT ISSUE ----------
+class KitIssueCreate(BaseModel):
+    id_kit: int
+    id_warehouse: int
+    quantaty_kit: int = Field(..., ge=1)
+    id_planification_expense_request: Optional[int] = None
+    description: Optional[str] = None
+    add_user: Optional[int] = None
+
+class KitIssueLineOut(BaseModel):
+    id_product: int
+    quantaty_products: int
+    stock: int  # existencias después de la salida
+
+class KitIssueOut(BaseModel):
+    id_kit: int
+    id_warehouse: int
+    quantaty_kit: int
+    lines: List[KitIssueLineOut]
+
+
+# ---------- BULK INGEST ----------
+class BulkRowError(BaseModel):
+    row: Optional[int] = None  # None = error del lote completo (p.ej. de la BD)
+    detail: Any
+
+class BulkIngestOut(BaseModel):
+    mode: str
+    received: int
+    inserted: int
+    failed: int
+    errors: List[BulkRowError]
+
+# ========== FOTOS ==========
+class PhotoOut(BaseModel):
+    photo: str  # referencia para guardar en products.photo / kits.photo
+    sha256: str
+    content_type: str
+    size: int
+    thumbnails: Dict[int, str]  # lado en px -> ruta de la miniatura
@@ -0,0 +1,115 @@
+# backend/app/search.py
+"""
+Búsqueda de texto sobre tab_product_transaction.description con índice.
+
+- MySQL: índice FULLTEXT + MATCH ... AGAINST (modo lenguaje natural).
+- PostgreSQL: índice GIN sobre to_tsvector + plainto_tsquery / ts_rank.
+- SQLite (local): tabla FTS5 de contenido externo sincronizada por triggers, rank bm25.
+- Otros motores: LIKE sin índice, como antes.
+"""
+from typing import Optional
+
+from sqlalchemy import column, func, literal, literal_column, select, table, text
+from sqlalchemy.engine import Connection
+
+from .models import TabProductTransaction
+
+FTS_CONFIG = "spanish"  # configuración de PostgreSQL (stemming en español)
+FTS_TABLE = "tab_product_transaction_fts"
+
+_description = TabProductTransaction.description
+_id = TabProductTransaction.id_product_transaction
+_fts = table(FTS_TABLE, column("rowid"), column("rank"))
+
+
+def clean(q: Optional[str]) -> Optional[str]:
+    """Texto a buscar sin espacios de los extremos; None si no queda ninguna palabra."""
+    q = (q or "").strip()
+    return q or None
+
+
+def _fts5_query(q: str) -> str:
+    # Cada palabra entre comillas: la entrada del usuario no se interpreta como sintaxis FTS5
+    return " ".join('"' + t.replace('"', '""') + '"' for t in q.split())
+
+
+def _pg_vector():
+    return func.to_tsvector(FTS_CONFIG, func.coalesce(_description, ""))
+
+
+def _pg_query(q: str):
+    return func.plainto_tsquery(FTS_CONFIG, q)
+
+
+def search_filter(dialect: str, q: str):
+    """Condición WHERE que resuelve la búsqueda con el índice de texto del motor."""
+    if dialect in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import match
+        return match(_description, against=q).in_natural_language_mode()
+    if dialect == "postgresql":
+        return _pg_vector().bool_op("@@")(_pg_query(q))
+    if dialect == "sqlite":
+        matches = select(_fts.c.rowid).where(literal_column(FTS_TABLE).op("MATCH")(_fts5_query(q)))
+        return _id.in_(matches)
+    return func.lower(_description).like(f"%{q.lower()}%")
+
+
+def rank_expr(dialect: str, q: str):
+    """Relevancia de cada fila (mayor = más relevante)."""
+    if dialect in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import match
+        return match(_description, against=q).in_natural_language_mode()
+    if dialect == "postgresql":
+        return func.ts_rank(_pg_vector(), _pg_query(q))
+    if dialect == "sqlite":
+        # rank de FTS5 es bm25 negativo: se invierte para ordenar de mayor a menor
+        return (
+            select(-_fts.c.rank)
+            .where(_fts.c.rowid == _id, literal_column(FTS_TABLE).op("MATCH")(_fts5_query(q)))
+            .scalar_subquery()
+        )
+    return literal(0)
+
+
+def ensure_search_index(conn: Connection) -> None:
+    """Crea el índice de texto si falta (idempotente; lo usa la migración 0002)."""
+    dialect = conn.dialect.name
+    if dialect in ("mysql", "mariadb"):
+        exists = conn.execute(text(
+            "SELECT COUNT(*) FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = 'tab_product_transaction' "
+            "AND index_name = 'ft_tr_description'"
+        )).scalar()
+        if not exists:
+            conn.execute(text("ALTER TABLE tab_product_transaction ADD FULLTEXT INDEX ft_tr_description (description)"))
+    elif dialect == "postgresql":
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_tr_description_fts ON tab_product_transaction "
+            f"USING GIN (to_tsvector('{FTS_CONFIG}', coalesce(description, '')))"
+        ))
+    elif dialect == "sqlite":
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+        ), {"name": FTS_TABLE}).first()
+        if exists:
+            return
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            "description, content='tab_product_transaction', content_rowid='id_product_transaction')"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER tr_fts_ai AFTER INSERT ON tab_product_transaction BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id_product_transaction, new.description); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER tr_fts_ad AFTER DELETE ON tab_product_transaction BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) "
+            f"VALUES ('delete', old.id_product_transaction, old.description); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER tr_fts_au AFTER UPDATE OF description ON tab_product_transaction BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) "
+            f"VALUES ('delete', old.id_product_transaction, old.description); "
+            f"INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id_product_transaction, new.description); END"
+        ))
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
@@ -0,0 +1,108 @@
+# backend/app/snapshots.py
+"""
+Existencias a una fecha pasada.
+
+tab_stock_snapshot guarda el saldo de cada (producto, bodega) al cierre de un
+periodo. El stock a la fecha T es la foto más cercana anterior a T más los
+movimientos entre esa foto y T, así que solo se recorre el libro de ese tramo.
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import case, delete, event, func, insert, inspect, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from . import stock
+from .models import TabProductTransaction, TabStockSnapshot
+
+snapshot = TabStockSnapshot.__table__
+ledger = TabProductTransaction.__table__
+
+
+def nearest_snapshot(db: Session, at: datetime) -> Optional[datetime]:
+    return db.execute(
+        select(func.max(snapshot.c.snapshot_date)).where(snapshot.c.snapshot_date <= at)
+    ).scalar()
+
+
+def balances_at(db: Session, at: datetime):
+    """SELECT (id_product, id_warehouse, qty_in, qty_out, stock) con los saldos a la fecha `at`."""
+    base = nearest_snapshot(db, at)
+
+    qty = func.coalesce(ledger.c.quantaty_products, 0)
+    qty_in = func.sum(case((ledger.c.type_transaction == 0, qty), else_=0))
+    qty_out = func.sum(case((ledger.c.type_transaction == 0, 0), else_=qty))
+    movements = select(
+        ledger.c.id_product,
+        ledger.c.id_warehouse,
+        qty_in.label("qty_in"),
+        qty_out.label("qty_out"),
+    ).where(ledger.c.add_date < at)
+    if base is None:
+        return movements.group_by(ledger.c.id_product, ledger.c.id_warehouse).add_columns(
+            (qty_in - qty_out).label("stock")
+        )
+
+    movements = movements.where(ledger.c.add_date >= base).group_by(
+        ledger.c.id_product, ledger.c.id_warehouse
+    )
+    parts = union_all(
+        select(snapshot.c.id_product, snapshot.c.id_warehouse, snapshot.c.qty_in, snapshot.c.qty_out).where(
+            snapshot.c.snapshot_date == base
+        ),
+        movements,
+    ).subquery()
+    return select(
+        parts.c.id_product,
+        parts.c.id_warehouse,
+        func.sum(parts.c.qty_in).label("qty_in"),
+        func.sum(parts.c.qty_out).label("qty_out"),
+        (func.sum(parts.c.qty_in) - func.sum(parts.c.qty_out)).label("stock"),
+    ).group_by(parts.c.id_product, parts.c.id_warehouse)
+
+
+def take_snapshot(db: Session, at: datetime) -> int:
+    """Guarda (o rehace) la foto de cierre a la fecha `at`. No hace commit."""
+    db.execute(delete(snapshot).where(snapshot.c.snapshot_date == at))
+    sel = balances_at(db, at).subquery()
+    db.execute(
+        insert(snapshot).from_select(
+            ["snapshot_date", "id_product", "id_warehouse", "qty_in", "qty_out", "stock"],
+            select(literal(at, snapshot.c.snapshot_date.type), *sel.c),
+        )
+    )
+    return db.execute(
+        select(func.count()).select_from(snapshot).where(snapshot.c.snapshot_date == at)
+    ).scalar() or 0
+
+
+_KEYS = stock._KEYS + ("add_date",)
+
+
+@event.listens_for(Session, "before_flush")
+def _load_add_date(session: Session, flush_context, instances):
+    # Si add_date está expirado, cargarlo ahora: en after_flush la fila borrada ya no existe
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, TabProductTransaction):
+            obj.add_date
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_snapshots(session: Session, flush_context):
+    """
+    Si se modifica o elimina un movimiento anterior a una foto, esa foto queda
+    desactualizada: se borran las posteriores a la fecha del movimiento. Cambiar
+    solo la descripción (u otra columna que no entra en el saldo) no la toca.
+    """
+    dates = []
+    for obj in session.dirty:
+        if isinstance(obj, TabProductTransaction):
+            state = inspect(obj)
+            if any(state.attrs[k].history.has_changes() for k in _KEYS):
+                dates += [stock._old_value(obj, "add_date"), obj.add_date]
+    for obj in session.deleted:
+        if isinstance(obj, TabProductTransaction):
+            dates.append(stock._old_value(obj, "add_date"))
+    dates = [d for d in dates if d is not None]
+    if dates:
+        session.connection().execute(delete(snapshot).where(snapshot.c.snapshot_date > min(dates)))
@@ -0,0 +1,243 @@
+# backend/app/stock.py
+"""
+Saldos de inventario por (producto, bodega).
+
+tab_stock_balance se actualiza en la misma transacción que cada alta, cambio o
+baja de tab_product_transaction, así que leer existencias es una búsqueda por
+clave primaria en lugar de sumar todo el libro de movimientos.
+
+La existencia no puede quedar negativa (salvo ALLOW_NEGATIVE_STOCK=true): el
+upsert del saldo bloquea solo las filas producto/bodega que toca, en orden fijo,
+y si alguna que bajó quedó en negativo se lanza InsufficientStock y la
+transacción se revierte. Dos salidas del mismo producto y bodega se esperan
+entre sí; las de productos distintos no.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import case, delete, event, func, inspect, insert, select, tuple_, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from . import changefeed, database, lots, versions
+from .config import settings
+from .models import TabProductTransaction, TabStockBalance
+
+balance = TabStockBalance.__table__
+ledger = TabProductTransaction.__table__
+
+# (id_product, id_warehouse) -> [entradas, salidas]
+Deltas = Dict[Tuple[int, int], list]
+
+
+class InsufficientStock(Exception):
+    """Un movimiento dejaría negativa la existencia de uno o más producto/bodega."""
+
+    def __init__(self, shortages: List[Tuple[int, int, int]]):
+        self.shortages = shortages  # [(id_product, id_warehouse, existencia resultante)]
+        super().__init__("Insufficient stock for product(s): " + ", ".join(
+            f"{p} in warehouse {w} (short {-s})" for p, w, s in shortages
+        ))
+
+
+def split_qty(type_transaction, quantaty_products) -> Tuple[int, int]:
+    """Devuelve (entrada, salida) de un movimiento: 0=entrada, cualquier otro=salida."""
+    qty = quantaty_products or 0
+    return (qty, 0) if type_transaction == 0 else (0, qty)
+
+
+def add_movement(deltas: Deltas, id_product, id_warehouse, type_transaction, quantaty_products, sign: int = 1):
+    qty_in, qty_out = split_qty(type_transaction, quantaty_products)
+    d = deltas[(id_product, id_warehouse)]
+    d[0] += sign * qty_in
+    d[1] += sign * qty_out
+
+
+def new_deltas() -> Deltas:
+    return defaultdict(lambda: [0, 0])
+
+
+def deltas_from_rows(rows: Iterable[dict]) -> Deltas:
+    """Agrupa filas del libro (dicts) en deltas por producto/bodega."""
+    deltas = new_deltas()
+    for r in rows:
+        add_movement(deltas, r["id_product"], r["id_warehouse"], r["type_transaction"], r.get("quantaty_products"))
+    return deltas
+
+
+def upsert_add(dialect: str, table, keys, columns):
+    """
+    INSERT ... ON CONFLICT que suma `columns` a la fila existente de `table`
+    (clave `keys`), según el motor. None si el motor no tiene upsert.
+    """
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(table)
+        incoming = stmt.excluded
+        set_ = {k: table.c[k] + incoming[k] for k in columns}
+        set_["mod_date"] = func.now()
+        return stmt.on_conflict_do_update(index_elements=list(keys), set_=set_)
+    if dialect in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(table)
+        incoming = stmt.inserted
+        set_ = {k: table.c[k] + incoming[k] for k in columns}
+        set_["mod_date"] = func.now()
+        return stmt.on_duplicate_key_update(**set_)
+    return None
+
+
+def _upsert(dialect: str):
+    """Upsert que suma al saldo existente de tab_stock_balance."""
+    return upsert_add(dialect, balance, ("id_product", "id_warehouse"), ("qty_in", "qty_out", "stock"))
+
+
+def apply_deltas(conn: Connection, deltas: Deltas) -> None:
+    """Suma los deltas a tab_stock_balance usando la conexión (y transacción) recibida."""
+    # Orden fijo de claves: dos transacciones nunca bloquean saldos en orden cruzado
+    params = [
+        {"id_product": p, "id_warehouse": w, "qty_in": qi, "qty_out": qo, "stock": qi - qo}
+        for (p, w), (qi, qo) in sorted(deltas.items())
+        if qi or qo
+    ]
+    if not params:
+        return
+
+    stmt = _upsert(conn.dialect.name)
+    if stmt is not None:
+        conn.execute(stmt, params)
+    else:
+        _update_or_insert(conn, params)
+    check_stock(conn, [(prm["id_product"], prm["id_warehouse"]) for prm in params if prm["stock"] < 0])
+
+
+def _update_or_insert(conn: Connection, params: list) -> None:
+    """Motores sin upsert: UPDATE y, si no había fila, INSERT."""
+    for prm in params:
+        res = conn.execute(
+            update(balance)
+            .where(balance.c.id_product == prm["id_product"], balance.c.id_warehouse == prm["id_warehouse"])
+            .values(
+                qty_in=balance.c.qty_in + prm["qty_in"],
+                qty_out=balance.c.qty_out + prm["qty_out"],
+                stock=balance.c.stock + prm["stock"],
+                mod_date=func.now(),
+            )
+        )
+        if res.rowcount == 0:
+            conn.execute(insert(balance).values(**prm))
+
+
+def check_stock(conn: Connection, keys: List[Tuple[int, int]]) -> None:
+    """
+    Lanza InsufficientStock si alguno de los saldos `keys` (que esta transacción
+    acaba de bajar y por eso tiene bloqueados) quedó negativo.
+    """
+    if not keys or settings.allow_negative_stock:
+        return
+    rows = conn.execute(
+        select(balance.c.id_product, balance.c.id_warehouse, balance.c.stock)
+        .where(tuple_(balance.c.id_product, balance.c.id_warehouse).in_(keys), balance.c.stock < 0)
+    ).all()
+    if rows:
+        raise InsufficientStock([tuple(r) for r in rows])
+
+
+def _old_value(obj, attr):
+    hist = inspect(obj).attrs[attr].history
+    if hist.deleted:
+        return hist.deleted[0]
+    if hist.unchanged:
+        return hist.unchanged[0]
+    return getattr(obj, attr)
+
+
+_KEYS = ("id_product", "id_warehouse", "type_transaction", "quantaty_products")
+
+
+# insert=True: primero que el de lotes, así una sobreventa se rechaza antes de asignar lotes
+@event.listens_for(Session, "after_flush", insert=True)
+def _sync_balances(session: Session, flush_context):
+    """Traslada al saldo los movimientos del libro que se acaban de escribir."""
+    deltas = new_deltas()
+    for obj in session.new:
+        if isinstance(obj, TabProductTransaction):
+            add_movement(deltas, *(getattr(obj, k) for k in _KEYS))
+    for obj in session.dirty:
+        if isinstance(obj, TabProductTransaction) and session.is_modified(obj):
+            add_movement(deltas, *(_old_value(obj, k) for k in _KEYS), sign=-1)
+            add_movement(deltas, *(getattr(obj, k) for k in _KEYS))
+    for obj in session.deleted:
+        if isinstance(obj, TabProductTransaction):
+            add_movement(deltas, *(_old_value(obj, k) for k in _KEYS), sign=-1)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+
+def insert_movements(session: Session, rows: list) -> List[int]:
+    """
+    Inserta varias filas del libro con un solo INSERT multi-fila y suma sus
+    deltas al saldo y a los lotes, todo en la transacción de la sesión (no hace commit).
+    Las filas deben traer todas las mismas claves. Devuelve los ids en el orden de `rows`.
+    """
+    if not rows:
+        return []
+    conn = session.connection()
+    if conn.dialect.insert_executemany_returning_sort_by_parameter_order:
+        # Los ids hacen falta para registrar los lotes que consume cada salida
+        ids = session.execute(
+            insert(ledger).returning(ledger.c.id_product_transaction, sort_by_parameter_order=True), rows
+        ).scalars().all()
+    elif conn.dialect.name in ("mysql", "mariadb"):
+        # Sin RETURNING: un solo INSERT multi-fila. Es un "simple insert" (filas conocidas
+        # de antemano), así que InnoDB le da ids consecutivos aun con
+        # innodb_autoinc_lock_mode=2; LAST_INSERT_ID() es el de la primera fila
+        first = session.execute(insert(ledger).values(rows)).lastrowid
+        step = database.autoinc_step(conn)
+        ids = [first + n * step for n in range(len(rows))]
+    else:
+        ids = [session.execute(insert(ledger).values(**r)).inserted_primary_key[0] for r in rows]
+    apply_deltas(conn, deltas_from_rows(rows))
+    written = [dict(r, id_product_transaction=i) for r, i in zip(rows, ids)]
+    lots.record_movements(conn, written)
+    changefeed.record_rows(session, written)
+    versions.mark(session, "stock")
+    return list(ids)
+
+
+def lock_balances(session: Session, id_warehouse: int, product_ids: Iterable[int]) -> Dict[int, int]:
+    """
+    Lee con bloqueo de fila (SELECT ... FOR UPDATE) el saldo de varios productos
+    en una bodega. Devuelve {id_product: stock}; los que no tienen fila valen 0.
+    """
+    product_ids = list(product_ids)
+    rows = session.execute(
+        select(balance.c.id_product, balance.c.stock)
+        .where(balance.c.id_warehouse == id_warehouse, balance.c.id_product.in_(product_ids))
+        .with_for_update()
+    ).all()
+    found = {r.id_product: r.stock for r in rows}
+    return {pid: found.get(pid, 0) for pid in product_ids}
+
+
+def rebuild_balances(conn: Connection) -> int:
+    """Recalcula tab_stock_balance desde cero a partir de tab_product_transaction."""
+    qty = func.coalesce(ledger.c.quantaty_products, 0)
+    qty_in = func.sum(case((ledger.c.type_transaction == 0, qty), else_=0))
+    qty_out = func.sum(case((ledger.c.type_transaction == 0, 0), else_=qty))
+    sel = select(
+        ledger.c.id_product,
+        ledger.c.id_warehouse,
+        qty_in,
+        qty_out,
+        qty_in - qty_out,
+    ).group_by(ledger.c.id_product, ledger.c.id_warehouse)
+
+    conn.execute(delete(balance))
+    conn.execute(
+        insert(balance).from_select(["id_product", "id_warehouse", "qty_in", "qty_out", "stock"], sel)
+    )
+    return conn.execute(select(func.count()).select_from(balance)).scalar() or 0
@@ -0,0 +1,205 @@
+# backend/app/versions.py
+"""
+Versiones de cambio por tabla para GET condicionales (ETag / If-None-Match).
+
+tab_change_version guarda un contador por conjunto de datos ("products",
+"warehouses", "kits", "stock"). Un after_flush anota qué conjuntos tocó la sesión
+y, ya confirmado el commit y devuelta la conexión, se incrementan en una
+transacción propia y corta: la escritura nunca espera por la fila del contador
+(una sola por conjunto para todos los workers). Los incrementos del mismo
+proceso se agrupan: mientras uno está en curso, los commits que llegan esperan
+al siguiente, que los incluye a todos. El commit devuelve el control después
+del incremento, así que quien escribe y vuelve a leer ya ve la versión nueva. Si el
+incremento falla, un hilo lo reintenta cada VERSION_RETRY_S hasta que entra; los
+fallos y lo que queda pendiente se ven en /metrics.
+
+Las escrituras Core que no pasan por el ORM llaman a mark() (stock.insert_movements)
+o a bump() (scripts, dentro de su propia transacción).
+"""
+import hashlib
+import logging
+import threading
+import time
+from itertools import chain
+from typing import Dict, Iterable, Optional
+
+import anyio
+from fastapi import Request, Response
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlalchemy.util import await_only
+
+from . import database, metrics
+from .models import (
+    TabChangeVersion, TabKit, TabKitComposition, TabProductTransaction, TabProductos, TabWarehouse
+)
+
+NAMES = ("products", "warehouses", "kits", "stock")
+
+# Modelo -> conjunto cuya versión cambia (los saldos cambian con el libro)
+TRACKED = {
+    TabProductos: "products",
+    TabWarehouse: "warehouses",
+    TabKit: "kits",
+    TabKitComposition: "kits",
+    TabProductTransaction: "stock",
+}
+
+VERSION_RETRY_S = 1.0
+
+_INFO_KEY = "changed_versions"
+_COMMITTED_KEY = "committed_versions"
+_table = TabChangeVersion.__table__
+
+log = logging.getLogger(__name__)
+
+
+def mark(session: Session, *names: str) -> None:
+    """Anota conjuntos modificados; se incrementan al hacer commit la sesión."""
+    session.info.setdefault(_INFO_KEY, set()).update(names)
+
+
+def bump(conn: Connection, names: Iterable[str]) -> None:
+    # Orden fijo: dos transacciones nunca esperan los contadores en orden cruzado
+    for name in sorted(set(names)):
+        res = conn.execute(
+            update(_table).where(_table.c.table_name == name).values(version=_table.c.version + 1)
+        )
+        if res.rowcount == 0:
+            conn.execute(insert(_table).values(table_name=name, version=1))
+
+
+def current(db: Session, names: Iterable[str]) -> Dict[str, int]:
+    names = list(names)
+    rows = db.execute(select(_table.c.table_name, _table.c.version).where(_table.c.table_name.in_(names)))
+    found = dict(rows.all())
+    return {name: found.get(name, 0) for name in names}
+
+
+@event.listens_for(Session, "after_flush")
+def _track(session: Session, flush_context):
+    names = {
+        TRACKED[type(obj)]
+        for obj in chain(session.new, session.dirty, session.deleted)
+        if type(obj) in TRACKED
+    }
+    if names:
+        mark(session, *names)
+
+
+class _Publisher:
+    """
+    Incrementos agrupados por proceso (estilo group commit): cada llamada a
+    publish() vuelve cuando una ronda que empezó después de ella terminó.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending: set = set()
+        self._running = False
+        self._next_round = 1
+        self._done_round = 0
+        self._retry = None
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def publish(self, names) -> None:
+        with self._cond:
+            self._pending.update(names)
+            mine = self._next_round  # la próxima ronda en empezar toma lo pendiente
+            while self._done_round < mine:
+                if not self._running:
+                    self._running = True
+                    batch, self._pending = self._pending, set()
+                    current_round = self._next_round
+                    self._next_round += 1
+                    break
+                self._cond.wait()
+            else:
+                return
+        try:
+            with database.engine.begin() as conn:
+                bump(conn, batch)
+            metrics.VERSION_BUMPS.inc("ok")
+        except Exception:
+            log.exception("no se pudieron incrementar las versiones %s", sorted(batch))
+            metrics.VERSION_BUMPS.inc("failed")
+            with self._cond:
+                self._pending.update(batch)  # los reintenta el hilo (o la próxima ronda)
+                if self._retry is None:
+                    self._retry = threading.Thread(target=self._run_retry, name="versions-retry", daemon=True)
+                    self._retry.start()
+        finally:
+            with self._cond:
+                self._running = False
+                self._done_round = current_round
+                self._cond.notify_all()
+
+    def _run_retry(self) -> None:
+        # Sin esto, un incremento fallido espera al próximo commit: mientras tanto se
+        # responden 304 con datos viejos y el chequeo de réplicas no ve el cambio
+        while True:
+            time.sleep(VERSION_RETRY_S)
+            with self._cond:
+                idle = not self._pending or self._running
+            if not idle:
+                self.publish(())
+
+
+_publisher = _Publisher()
+
+
+@event.listens_for(Session, "after_commit")
+def _committed(session: Session):
+    names = session.info.pop(_INFO_KEY, None)
+    if names:
+        session.info[_COMMITTED_KEY] = names
+
+
+# Al cerrar la transacción la conexión ya volvió al pool: el incremento usa otra
+# sin que cada petición retenga dos (con el pool lleno se bloquearían entre sí)
+@event.listens_for(Session, "after_transaction_end")
+def _bump_after_commit(session: Session, transaction):
+    if transaction.parent is not None:
+        return
+    names = session.info.pop(_COMMITTED_KEY, None)
+    if not names:
+        return
+    if session.get_bind().dialect.is_async:
+        # AsyncSession: el evento corre en el hilo del event loop; la espera va a un hilo
+        await_only(anyio.to_thread.run_sync(_publisher.publish, names))
+    else:
+        _publisher.publish(names)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget(session: Session):
+    session.info.pop(_INFO_KEY, None)
+
+
+# ---------- GET condicional ----------
+
+def etag(request: Request, db: Session, names: Iterable[str]) -> str:
+    """ETag fuerte: versiones de los conjuntos + hash de los parámetros de la consulta."""
+    versions = current(db, names)
+    query = hashlib.sha1(request.url.query.encode()).hexdigest()[:12]
+    return '"' + "-".join(f"{n[0]}{v}" for n, v in versions.items()) + "-" + query + '"'
+
+
+def check(request: Request, response: Response, tag: str) -> Optional[Response]:
+    """304 si If-None-Match coincide; si no, deja el ETag en la respuesta y devuelve None."""
+    headers = {"ETag": tag, "Cache-Control": "no-cache"}
+    sent = request.headers.get("if-none-match")
+    if sent:
+        candidates = {t.strip().removeprefix("W/") for t in sent.split(",")}
+        if tag in candidates or "*" in candidates:
+            return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+def not_modified(request: Request, response: Response, db: Session, *names: str) -> Optional[Response]:
+    return check(request, response, etag(request, db, names))
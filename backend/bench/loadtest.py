@@ -0,0 +1,149 @@
+# backend/bench/loadtest.py
+"""
+Prueba de carga: ruta síncrona vs. asíncrona (DB_ASYNC) de la API.
+
+Levanta uvicorn dos veces sobre la misma base (DB_ASYNC=false y DB_ASYNC=true),
+lanza la misma mezcla de lecturas/escrituras con N clientes concurrentes y
+compara throughput y latencias.
+
+    cd backend
+    DATABASE_URL=sqlite:///./bench.db python bench/loadtest.py --concurrency 200 --seconds 20
+
+Con MySQL/PostgreSQL basta apuntar DATABASE_URL a la base de pruebas (requiere
+el driver asíncrono: asyncmy / asyncpg). Sin --compare se prueba una URL ya levantada:
+
+    python bench/loadtest.py --url http://127.0.0.1:8000 --concurrency 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+async def seed(client: httpx.AsyncClient, products: int = 20) -> None:
+    """Datos mínimos para que la mezcla tenga algo que leer (idempotente)."""
+    for i in range(1, products + 1):
+        await client.post("/products/", json={"cname": f"Bench {i}", "code": 900000 + i})
+    await client.post("/warehouses/", json={"cname": "Bench", "code": 900000})
+
+
+def make_mix(product_ids, warehouse_id):
+    def pick():
+        r = random.random()
+        pid = random.choice(product_ids)
+        if r < 0.45:
+            return "GET", f"/transactions/inventory/{warehouse_id}/{pid}", None
+        if r < 0.75:
+            return "GET", "/transactions/", None
+        if r < 0.85:
+            return "GET", "/products/inventory/summary", None
+        return "POST", "/transactions/", {
+            "id_product": pid, "id_warehouse": warehouse_id, "type_transaction": 0,
+            "quantaty_products": 1, "description": "loadtest",
+        }
+    return pick
+
+
+async def run_load(url: str, concurrency: int, seconds: float) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        await seed(client)
+        products = (await client.get("/products/", params={"limit": 200})).json()
+        warehouses = (await client.get("/warehouses/", params={"limit": 1})).json()
+        pick = make_mix([p["id_product"] for p in products], warehouses[0]["id_warehouse"])
+
+        latencies, errors = [], 0
+        deadline = time.perf_counter() + seconds
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                method, path, body = pick()
+                t0 = time.perf_counter()
+                try:
+                    r = await client.request(method, path, json=body)
+                    if r.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - t0) * 1000)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": statistics.fmean(latencies) if latencies else 0.0,
+    }
+
+
+def start_server(port: int, db_async: bool) -> subprocess.Popen:
+    env = dict(os.environ, DB_ASYNC="true" if db_async else "false")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/ping", timeout=1)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("uvicorn no arrancó")
+
+
+def print_result(label: str, res: dict) -> None:
+    print(
+        f"{label:<6} {res['rps']:>9.1f} req/s  p50 {res['p50_ms']:>7.1f} ms  "
+        f"p95 {res['p95_ms']:>7.1f} ms  p99 {res['p99_ms']:>7.1f} ms  "
+        f"({res['requests']} req, {res['errors']} errores)"
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", help="API ya levantada (omite la comparación sync/async)")
+    ap.add_argument("--concurrency", type=int, default=100)
+    ap.add_argument("--seconds", type=float, default=15)
+    ap.add_argument("--port", type=int, default=8765)
+    args = ap.parse_args()
+
+    if args.url:
+        print_result("api", asyncio.run(run_load(args.url, args.concurrency, args.seconds)))
+        return
+
+    for label, db_async in (("sync", False), ("async", True)):
+        proc = start_server(args.port, db_async)
+        try:
+            res = asyncio.run(run_load(f"http://127.0.0.1:{args.port}", args.concurrency, args.seconds))
+        finally:
+            proc.terminate()
+            proc.wait()
+        print_result(label, res)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# backend/bench/query_budget.py
+"""
+Presupuesto de sentencias SQL por endpoint de escritura.
+
+Ejecuta cada endpoint contra una base SQLite temporal y cuenta las sentencias
+que llegan al cursor (sin BEGIN/COMMIT). Si alguno supera su máximo sale con
+código 1, para detectar regresiones (un SELECT de más, un refresh olvidado...).
+
+    cd backend
+    python bench/query_budget.py
+
+Los máximos son para SQLite (RETURNING). En MySQL el ORM agrega un SELECT por
+INSERT/UPDATE para leer las fechas por defecto.
+"""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (método, ruta, cuerpo, estado esperado, máximo de sentencias)
+# Los catálogos ya están en refcache cuando se crean composiciones y movimientos.
+# Cada escritura del libro suma 2 del feed de cambios: SELECT de saldos + INSERT de eventos.
+CASES = (
+    ("POST", "/products/", {"code": 10, "cname": "Tornillo"}, 201, 2),
+    ("POST", "/products/", {"code": 10, "cname": "Duplicado"}, 409, 1),
+    ("PUT", "/products/{product}", {"cname": "Tornillo 1/2"}, 200, 3),
+    ("POST", "/warehouses/", {"code": 10, "cname": "Central"}, 201, 2),
+    ("PUT", "/warehouses/{warehouse}", {"cname": "Central norte"}, 200, 3),
+    ("POST", "/kits/", {"code": 10, "cname": "Kit básico"}, 201, 2),
+    ("PUT", "/kits/{kit}", {"cname": "Kit básico v2"}, 200, 3),
+    ("POST", "/kits/{kit}/composition", {"id_product": "{product}", "quantaty": 2}, 201, 2),
+    ("PUT", "/kits/{kit}/composition/{composition}", {"quantaty": 3}, 200, 3),
+    ("POST", "/transactions/", {
+        "id_product": "{product}", "id_warehouse": "{warehouse}", "type_transaction": 0, "quantaty_products": 50,
+    }, 201, 6),
+    # Baja una entrada: + verificación de existencia no negativa
+    ("PUT", "/transactions/{transaction}", {"quantaty_products": 40}, 200, 9),
+    # Salida FEFO: verificación de existencia + bloqueo de lotes + upsert de lotes + INSERT de asignaciones
+    ("POST", "/transactions/", {
+        "id_product": "{product}", "id_warehouse": "{warehouse}", "type_transaction": 1, "quantaty_products": 5,
+    }, 201, 9),
+    # Sobreventa: se rechaza en el flush, antes de tocar los lotes
+    ("POST", "/transactions/", {
+        "id_product": "{product}", "id_warehouse": "{warehouse}", "type_transaction": 1, "quantaty_products": 1000,
+    }, 409, 3),
+    ("POST", "/transactions/issue-kit", {
+        "id_kit": "{kit}", "id_warehouse": "{warehouse}", "quantaty_kit": 2,
+    }, 201, 11),
+    # Borra la salida FEFO: devuelve sus asignaciones al lote
+    ("DELETE", "/transactions/{transaction}", None, 204, 10),
+    ("POST", "/transactions/", {
+        "id_product": "{product}", "id_warehouse": "{warehouse}", "type_transaction": 0, "quantaty_products": 10,
+        "expiration_date": "2027-01-01T00:00:00",
+    }, 201, 6),
+    # Salida de un lote que no existe: pasa a FEFO con el mismo bloqueo, sin dejar el lote en negativo
+    ("POST", "/transactions/", {
+        "id_product": "{product}", "id_warehouse": "{warehouse}", "type_transaction": 1, "quantaty_products": 6,
+        "expiration_date": "2027-01-02T00:00:00",
+    }, 201, 9),
+)
+
+# Clave de ids que deja cada respuesta de alta, para las rutas siguientes
+ID_KEYS = {
+    "/products/": ("product", "id_product"),
+    "/warehouses/": ("warehouse", "id_warehouse"),
+    "/kits/": ("kit", "id_kit"),
+    "/kits/{kit}/composition": ("composition", "id_kit_composition"),
+    "/transactions/": ("transaction", "id_product_transaction"),
+}
+
+
+def _fill(value, ids):
+    if isinstance(value, str) and value.startswith("{") and value.endswith("}"):
+        return ids[value[1:-1]]
+    if isinstance(value, dict):
+        return {k: _fill(v, ids) for k, v in value.items()}
+    return value
+
+
+def main() -> int:
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/budget.db"
+    os.environ["REFCACHE_REFRESH_S"] = "0"  # la revisión periódica agregaría consultas al azar
+    sys.path.insert(0, BACKEND_DIR)
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event, select
+
+    from app.database import engine
+    from app.main import app
+    from app.models import TabStockLot
+
+    count = {"n": 0}
+
+    # before_: también cuenta la sentencia que falla (p. ej. INSERT con código duplicado)
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(*args):
+        count["n"] += 1
+
+    client = TestClient(app)
+    ids, failed = {}, 0
+    print(f"{'endpoint':<48} {'estado':>6} {'SQL':>4} {'máx':>4}")
+    for method, path, body, status, budget in CASES:
+        url = path.format(**ids)
+        count["n"] = 0
+        r = client.request(method, url, json=_fill(body, ids))
+        used = count["n"]
+        ok = r.status_code == status and used <= budget
+        failed += not ok
+        mark = "ok" if ok else "FALLA"
+        print(f"{method + ' ' + path:<48} {r.status_code:>6} {used:>4} {budget:>4}  {mark}")
+        if r.status_code == status == 201 and path in ID_KEYS:
+            name, key = ID_KEYS[path]
+            ids[name] = r.json()[key]
+
+    # Sin sobreventa ningún lote puede quedar en negativo
+    with engine.connect() as conn:
+        negative = conn.execute(select(TabStockLot.expiration_date, TabStockLot.qty).where(TabStockLot.qty < 0)).all()
+    for expiration_date, qty in negative:
+        print(f"lote {expiration_date} en negativo: {qty}  FALLA")
+    failed += len(negative)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
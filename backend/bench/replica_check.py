@@ -0,0 +1,124 @@
+# backend/bench/replica_check.py
+"""
+Prueba local de réplicas de lectura (app/replicas.py) con dos bases SQLite.
+
+La "replicación" es una copia del primario a la réplica con la API de backup
+de SQLite, hecha a mano en cada paso, así se controla cuándo está atrasada o
+caída. Levanta la API con DATABASE_REPLICA_URLS apuntando a la copia y verifica:
+
+- sin escrituras recientes los GET de listas se leen de la réplica;
+- tras una escritura, quien trae X-Read-After (o la cookie) lee del primario
+  y ve su cambio; los demás siguen en la réplica;
+- una réplica atrasada más de REPLICA_MAX_LAG_S deja de recibir lecturas;
+- al ponerse al día vuelve a recibirlas, también para el token anterior;
+- una réplica rota queda fuera y todo se lee del primario.
+
+    cd backend
+    python bench/replica_check.py
+
+Con dos servidores reales: DATABASE_URL y DATABASE_REPLICA_URLS apuntando al
+primario y a la réplica, y GET /health/replicas o /metrics (db_replica_lag_seconds).
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+MAX_LAG_S = 1.5
+CHECK_S = 0.2
+
+
+def copy_db(src: str, dst: str) -> None:
+    with sqlite3.connect(src) as s, sqlite3.connect(dst) as d:
+        s.backup(d)
+
+
+def main():
+    tmp = tempfile.TemporaryDirectory()
+    primary = os.path.join(tmp.name, "primary.db")
+    replica = os.path.join(tmp.name, "replica.db")
+    broken = os.path.join(tmp.name, "empty.db")
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{primary}",
+        "DATABASE_REPLICA_URLS": f"sqlite:///{replica}",
+        "REPLICA_MAX_LAG_S": str(MAX_LAG_S),
+        "REPLICA_CHECK_S": str(CHECK_S),
+    })
+
+    import httpx
+
+    import app.main  # noqa: F401  aplica las migraciones al primario
+    from bench.loadtest import start_server
+
+    copy_db(primary, replica)
+    sqlite3.connect(broken).close()
+    port = 8768
+    proc = start_server(port, False)
+    base = f"http://127.0.0.1:{port}"
+    failures = 0
+
+    def check(label: str, ok: bool):
+        nonlocal failures
+        failures += not ok
+        print(f"{'✓' if ok else '✗'} {label}")
+
+    def names(r):
+        return {p["cname"] for p in r.json()}
+
+    try:
+        writer = httpx.Client(base_url=base, timeout=10)  # guarda la cookie read_after
+        reader = httpx.Client(base_url=base, timeout=10)  # otro usuario, sin token
+        time.sleep(3 * CHECK_S)
+
+        r = reader.get("/products/")
+        check("sin escrituras: lista desde la réplica", r.headers.get("x-read-source") == "replica0")
+
+        w = writer.post("/products/", json={"code": 901, "cname": "Réplica 1"})
+        token = w.headers.get("x-read-after")
+        check("la escritura devuelve X-Read-After y la cookie", bool(token) and "read_after" in writer.cookies)
+
+        r = writer.get("/products/")
+        check("con cookie: lee del primario y ve su alta",
+              r.headers.get("x-read-source") == "primary" and "Réplica 1" in names(r))
+        r = reader.get("/products/", headers={"X-Read-After": token})
+        check("con X-Read-After: lee del primario", r.headers.get("x-read-source") == "primary")
+        r = reader.get("/products/")
+        check("sin token y dentro del atraso aceptado: réplica (sin el alta todavía)",
+              r.headers.get("x-read-source") == "replica0" and "Réplica 1" not in names(r))
+
+        time.sleep(MAX_LAG_S + 3 * CHECK_S)
+        r = reader.get("/products/")
+        check("réplica atrasada más de REPLICA_MAX_LAG_S: primario",
+              r.headers.get("x-read-source") == "primary" and "Réplica 1" in names(r))
+
+        copy_db(primary, replica)
+        time.sleep(3 * CHECK_S)
+        r = reader.get("/products/", headers={"X-Read-After": token})
+        check("réplica al día: el token anterior ya lee de la réplica",
+              r.headers.get("x-read-source") == "replica0" and "Réplica 1" in names(r))
+
+        copy_db(broken, replica)  # sin tablas: el chequeo falla
+        time.sleep(3 * CHECK_S)
+        r = reader.get("/products/")
+        status = reader.get("/health/replicas").json()
+        check("réplica rota: fuera de rotación, se lee del primario",
+              r.status_code == 200 and r.headers.get("x-read-source") == "primary" and not status[0]["up"])
+
+        metrics_text = reader.get("/metrics").text
+        check("métricas de ruteo y de réplicas en /metrics",
+              "db_read_routing_total" in metrics_text and "db_replica_up" in metrics_text)
+    finally:
+        proc.terminate()
+        proc.wait()
+        tmp.cleanup()
+
+    print("✓ réplicas OK" if not failures else f"✗ {failures} verificaciones fallaron")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
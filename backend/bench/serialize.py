@@ -0,0 +1,123 @@
+# backend/bench/serialize.py
+"""
+Micro-benchmark de serialización: ruta estándar de FastAPI (response_model +
+jsonable_encoder + json) vs. ruta orjson de app/responses.py (FAST_JSON).
+
+Cada modo corre en su propio proceso (un worker, sin red: cliente ASGI en memoria)
+contra la misma base SQLite sembrada, y mide peticiones/segundo de los endpoints
+que arman sus propias filas.
+
+    cd backend
+    python bench/serialize.py --seconds 5 --rows 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = (
+    "/transactions/?limit=100",
+    "/kits/1/composition",
+    "/products/inventory/summary",
+)
+
+
+def seed(rows: int) -> None:
+    from app.database import SessionLocal
+    from app.models import TabKit, TabKitComposition, TabProductos, TabWarehouse
+    from app.stock import insert_movements
+
+    db = SessionLocal()
+    try:
+        products = [TabProductos(code=i, cname=f"Producto {i}") for i in range(1, 101)]
+        warehouses = [TabWarehouse(code=i, cname=f"Bodega {i}") for i in range(1, 6)]
+        kit = TabKit(code=1, cname="Kit bench")
+        db.add_all(products + warehouses + [kit])
+        db.flush()
+        db.add_all(
+            TabKitComposition(id_kit=kit.id_kit, id_product=p.id_product, quantaty=1) for p in products[:50]
+        )
+        insert_movements(db, [
+            {
+                "id_product": products[i % 100].id_product,
+                "id_warehouse": warehouses[i % 5].id_warehouse,
+                "type_transaction": i % 2,
+                "id_planification_expense_request": None,
+                "id_kit": None,
+                "quantaty_kit": None,
+                "quantaty_products": 1 + i % 7,
+                "description": f"movimiento de prueba {i}",
+                "add_user": 1,
+            }
+            for i in range(rows)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+async def measure(seconds: float) -> dict:
+    import httpx
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path in ENDPOINTS:
+            r = await client.get(path)
+            r.raise_for_status()
+            n, deadline = 0, time.perf_counter() + seconds
+            t0 = time.perf_counter()
+            while time.perf_counter() < deadline:
+                await client.get(path)
+                n += 1
+            results[path] = {"rps": n / (time.perf_counter() - t0), "bytes": len(r.content)}
+    return results
+
+
+def child(seconds: float) -> None:
+    os.environ.setdefault("REFCACHE_REFRESH_S", "0")
+    sys.path.insert(0, BACKEND_DIR)
+    print(json.dumps(asyncio.run(measure(seconds))))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--seconds", type=float, default=5, help="Segundos por endpoint y modo")
+    ap.add_argument("--rows", type=int, default=2000, help="Movimientos sembrados")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args.seconds)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/bench.db")
+        subprocess.run(
+            [sys.executable, "-c", f"import sys; sys.path.insert(0, {BACKEND_DIR!r}); "
+             f"import app.main; from bench.serialize import seed; seed({args.rows})"],
+            cwd=BACKEND_DIR, env=env, check=True,
+        )
+        runs = {}
+        for label, fast in (("antes", "false"), ("orjson", "true")):
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", "--seconds", str(args.seconds)],
+                cwd=BACKEND_DIR, env=dict(env, FAST_JSON=fast), check=True, capture_output=True, text=True,
+            ).stdout
+            runs[label] = json.loads(out.strip().splitlines()[-1])
+
+    print(f"{'endpoint':<32} {'antes req/s':>12} {'orjson req/s':>13} {'mejora':>8}")
+    for path in ENDPOINTS:
+        before, after = runs["antes"][path]["rps"], runs["orjson"][path]["rps"]
+        print(f"{path:<32} {before:>12.1f} {after:>13.1f} {after / before:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
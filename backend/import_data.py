@@ -0,0 +1,58 @@
+# backend/import_data.py
+# Carga masiva de catálogos y saldos iniciales desde CSV o Excel (ver app/catalog_import.py).
+#   python import_data.py --products productos.csv --kits kits.csv --compositions comp.csv
+#   python import_data.py --workbook sitio.xlsx          (hojas products, warehouses, kits, compositions, balances)
+# Se puede volver a correr: lo que ya existe se omite (y una carga cortada continúa).
+import argparse
+import sys
+
+from app.catalog_import import KINDS, Importer, read_file
+from app.database import SessionLocal
+
+ap = argparse.ArgumentParser(description="Importa catálogos y saldos iniciales")
+for kind in KINDS:
+    ap.add_argument(f"--{kind}", metavar="ARCHIVO", help=f"CSV/XLSX de {kind}")
+ap.add_argument("--workbook", metavar="XLSX", help="Libro Excel con una hoja por tipo (nombre de hoja = tipo)")
+ap.add_argument("--batch-size", type=int, default=1000)
+args = ap.parse_args()
+
+sources = []
+if args.workbook:
+    from openpyxl import load_workbook
+
+    wb = load_workbook(args.workbook, read_only=True)
+    sheets = set(wb.sheetnames)
+    wb.close()
+    sources += [(kind, args.workbook, kind) for kind in KINDS if kind in sheets]
+sources += [(kind, getattr(args, kind), None) for kind in KINDS if getattr(args, kind)]
+sources.sort(key=lambda s: KINDS.index(s[0]))
+if not sources:
+    ap.print_usage()
+    sys.exit(2)
+
+
+def progress(kind, rows):
+    print(f"\r  {kind}: {rows} filas", end="", flush=True)
+
+
+db = SessionLocal()
+failed = 0
+try:
+    importer = Importer(db, batch_size=args.batch_size)
+    for kind, path, sheet in sources:
+        print(f"Importando {kind} desde {path}{f' [{sheet}]' if sheet else ''}...")
+        report = importer.run(kind, read_file(path, sheet), progress)
+        print()
+        print(
+            f"✓ {kind}: {report['inserted']} insertadas, {report['skipped']} ya existían, "
+            f"{report['failed']} con errores (de {report['received']})"
+        )
+        for err in report["errors"][:20]:
+            print(f"  fila {err['row']}: {err['detail']}")
+        if len(report["errors"]) > 20:
+            print(f"  ... y {report['failed'] - 20} más")
+        failed += report["failed"]
+finally:
+    db.close()
+
+sys.exit(1 if failed else 0)
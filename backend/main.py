@@ -69,19 +69,11 @@ class IssueKitIn(BaseModel):
 
 @app.post("/transactions/issue-kit")
 def issue_kit(in_data: IssueKitIn):
-    if in_data.kit_quantity <= 0:
-        raise HTTPException(status_code=400, detail="kit_quantity must be > 0")
-    sql = text("""CALL sp_issue_kit(:user_id,:kit_id,:warehouse_id,:kit_quantity,:plan_req,:note)""")
-    with engine.begin() as conn:
-        conn.execute(sql, {
-            "user_id": in_data.user_id,
-            "kit_id": in_data.kit_id,
-            "warehouse_id": in_data.warehouse_id,
-            "kit_quantity": in_data.kit_quantity,
-            "plan_req": in_data.planification_expense_request_id,
-            "note": in_data.note
-        })
-    return {"status": "ok"}
+    # sp_issue_kit ya no existe en la base; la salida de kits vive en app.main
+    raise HTTPException(
+        status_code=410,
+        detail="Use POST /transactions/issue-kit de la API principal (app.main)",
+    )
 
 @app.get("/stock")
 def stock():
@@ -0,0 +1,29 @@
+# backend/migrate.py
+# Migraciones del esquema:
+#   python migrate.py              aplica las pendientes
+#   python migrate.py status       muestra aplicadas / pendientes
+#   python migrate.py check-plans  EXPLAIN de las consultas calientes (código 1 si alguna no usa su índice)
+import sys
+
+from app.database import engine
+from app.migrate import check_plans, status, upgrade
+
+cmd = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+
+if cmd == "upgrade":
+    ran = upgrade(engine)
+    for name in ran:
+        print(f"✓ {name}")
+    print("Esquema al día" if not ran else f"{len(ran)} migración(es) aplicada(s)")
+elif cmd == "status":
+    for version, name, done in status(engine):
+        print(f"{'✓' if done else '·'} {version}_{name}")
+elif cmd == "check-plans":
+    failed = False
+    for name, ok, used in check_plans(engine):
+        print(f"{'✓' if ok else '✗'} {name}: {', '.join(sorted(used)) or 'sin índice'}")
+        failed = failed or not ok
+    sys.exit(1 if failed else 0)
+else:
+    print("Uso: python migrate.py [upgrade|status|check-plans]")
+    sys.exit(2)
@@ -0,0 +1,21 @@
+# backend/rebuild_stock.py
+# Reconstruye tab_stock_balance y los lotes por vencimiento a partir de todo el libro de movimientos.
+# Úsalo una vez tras desplegar el saldo incremental, o si se editó el libro por fuera de la API.
+from app.database import Base, engine
+from app.lots import rebuild_lots
+from app.models import TabLotAllocation, TabStockBalance, TabStockLot
+from app.stock import rebuild_balances
+from app.versions import bump
+
+Base.metadata.create_all(
+    bind=engine, tables=[TabStockBalance.__table__, TabStockLot.__table__, TabLotAllocation.__table__]
+)
+
+with engine.begin() as conn:
+    print("Recalculando saldos desde tab_product_transaction...")
+    total = rebuild_balances(conn)
+    bump(conn, ["stock"])  # invalida los ETag de existencias
+    print(f"✓ {total} saldos producto/bodega reconstruidos")
+    print("Recalculando lotes por vencimiento (FEFO)...")
+    total = rebuild_lots(conn)
+    print(f"✓ {total} lotes reconstruidos")
@@ -4,11 +4,15 @@ from app.database import engine
 # Orden importante: primero las tablas hijas (con foreign keys)
 queries = [
     "SET FOREIGN_KEY_CHECKS = 0",  # Desactivar verificación temporal
+    "TRUNCATE TABLE tab_lot_allocation",
+    "TRUNCATE TABLE tab_stock_lot",
+    "TRUNCATE TABLE tab_stock_balance",
     "TRUNCATE TABLE tab_product_transaction",
     "TRUNCATE TABLE tab_kit_composition",
     "TRUNCATE TABLE tab_kit",
     "TRUNCATE TABLE tab_warehouse",
-    "TRUNCATE TABLE tab_products",
+    "TRUNCATE TABLE tab_productos",
+    "UPDATE tab_change_version SET version = version + 1",  # invalidar ETags
     "SET FOREIGN_KEY_CHECKS = 1",  # Reactivar verificación
 ]
 
@@ -0,0 +1,22 @@
+# backend/snapshot_stock.py
+# Guarda la foto de existencias al cierre de periodo (para consultas de stock a una fecha).
+# Uso: python snapshot_stock.py [AAAA-MM-DD]   (por defecto: inicio del mes actual = cierre del mes anterior)
+import sys
+from datetime import datetime
+
+from app.database import SessionLocal
+from app.snapshots import take_snapshot
+
+if len(sys.argv) > 1:
+    at = datetime.fromisoformat(sys.argv[1])
+else:
+    at = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+db = SessionLocal()
+try:
+    print(f"Guardando foto de existencias al {at:%Y-%m-%d %H:%M}...")
+    rows = take_snapshot(db, at)
+    db.commit()
+    print(f"✓ {rows} saldos producto/bodega guardados")
+finally:
+    db.close()
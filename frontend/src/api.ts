@@ -5,4 +5,28 @@ const api = axios.create({
   timeout: 30000,
 });
 
-export default api;
\ No newline at end of file
+// Leer lo propio con réplicas de lectura: tras una escritura el servidor manda
+// X-Read-After y las lecturas que lo reenvían no van a una réplica atrasada
+let readAfter: string | undefined;
+api.interceptors.response.use((res) => {
+  const token = res.headers["x-read-after"];
+  if (token) readAfter = token;
+  return res;
+});
+api.interceptors.request.use((config) => {
+  if (readAfter) config.headers.set("X-Read-After", readAfter);
+  return config;
+});
+
+// Idempotency-Key para reintentos de escrituras. crypto.randomUUID solo existe en
+// contextos seguros (HTTPS o localhost); en HTTP plano se arma un UUID v4 igual
+export function newIdempotencyKey(): string {
+  if (typeof crypto.randomUUID === "function") return crypto.randomUUID();
+  const b = crypto.getRandomValues(new Uint8Array(16));
+  b[6] = (b[6] & 0x0f) | 0x40;
+  b[8] = (b[8] & 0x3f) | 0x80;
+  const hex = Array.from(b, (x) => x.toString(16).padStart(2, "0")).join("");
+  return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+}
+
+export default api;
@@ -0,0 +1,29 @@
+import api from "./api";
+
+export type ChangeKind =
+  | "transaction.created"
+  | "transaction.updated"
+  | "transaction.deleted"
+  | "balance"
+  | "bulk"
+  | "reset";
+
+const KINDS: ChangeKind[] = [
+  "transaction.created",
+  "transaction.updated",
+  "transaction.deleted",
+  "balance",
+  "bulk",
+  "reset",
+];
+
+// Feed de cambios del servidor (GET /changes, Server-Sent Events). EventSource
+// reconecta solo y manda Last-Event-ID, así que no se pierden eventos entre cortes.
+// "bulk" y "reset" piden recargar la vista completa. Devuelve la función para cerrar.
+export function subscribeChanges(handler: (kind: ChangeKind, data: any) => void): () => void {
+  const source = new EventSource(`${api.defaults.baseURL}/changes`);
+  for (const kind of KINDS) {
+    source.addEventListener(kind, (e) => handler(kind, JSON.parse((e as MessageEvent).data)));
+  }
+  return () => source.close();
+}
@@ -1,4 +1,6 @@
-CREATE TABLE IF NOT EXISTS tab_products (
+-- Esquema inicial de referencia. Los cambios posteriores viven en backend/app/migrations
+-- (python backend/migrate.py).
+CREATE TABLE IF NOT EXISTS tab_productos (
   id_product INT AUTO_INCREMENT PRIMARY KEY,
   id_product_type INT NULL,
   id_unit_measurement INT NULL,
@@ -50,9 +52,10 @@ CREATE TABLE IF NOT EXISTS tab_kit_composition (
   mod_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   KEY idx_kc_kit (id_kit),
   KEY idx_kc_product (id_product),
+  KEY ix_kc_kit_prod_qty (id_kit, id_product, quantaty),
   CONSTRAINT fk_kc_kit FOREIGN KEY (id_kit) REFERENCES tab_kit(id_kit)
     ON UPDATE CASCADE ON DELETE RESTRICT,
-  CONSTRAINT fk_kc_product FOREIGN KEY (id_product) REFERENCES tab_products(id_product)
+  CONSTRAINT fk_kc_product FOREIGN KEY (id_product) REFERENCES tab_productos(id_product)
     ON UPDATE CASCADE ON DELETE RESTRICT
 ) ENGINE=InnoDB;
 
@@ -60,7 +63,7 @@ CREATE TABLE IF NOT EXISTS tab_product_transaction (
   id_product_transaction INT AUTO_INCREMENT PRIMARY KEY,
   id_product INT NOT NULL,
   id_warehouse INT NOT NULL,
-  type_transaction TINYINT NOT NULL, -- 1=IN, 2=OUT
+  type_transaction TINYINT NOT NULL, -- 0=IN, 1=OUT
   id_planification_expense_request INT NULL,
   id_kit INT NULL,
   quantaty_kit INT NULL,
@@ -74,19 +77,34 @@ CREATE TABLE IF NOT EXISTS tab_product_transaction (
   KEY idx_tr_product (id_product),
   KEY idx_tr_warehouse (id_warehouse),
   KEY idx_tr_type (type_transaction),
-  CONSTRAINT fk_tr_product FOREIGN KEY (id_product) REFERENCES tab_products(id_product)
+  KEY ix_tr_wh_prod_type_qty (id_warehouse, id_product, type_transaction, quantaty_products),
+  KEY ix_tr_prod_wh_type_qty (id_product, id_warehouse, type_transaction, quantaty_products),
+  KEY ix_tr_add_date_id (add_date, id_product_transaction),
+  KEY ix_tr_mod_date_id (mod_date, id_product_transaction),
+  FULLTEXT KEY ft_tr_description (description),
+  CONSTRAINT fk_tr_product FOREIGN KEY (id_product) REFERENCES tab_productos(id_product)
     ON UPDATE CASCADE ON DELETE RESTRICT,
   CONSTRAINT fk_tr_warehouse FOREIGN KEY (id_warehouse) REFERENCES tab_warehouse(id_warehouse)
     ON UPDATE CASCADE ON DELETE RESTRICT
 ) ENGINE=InnoDB;
 
+-- Saldo acumulado por producto y almacén (lo mantiene la API en cada movimiento)
+CREATE TABLE IF NOT EXISTS tab_stock_balance (
+  id_product INT NOT NULL,
+  id_warehouse INT NOT NULL,
+  qty_in INT NOT NULL DEFAULT 0,
+  qty_out INT NOT NULL DEFAULT 0,
+  stock INT NOT NULL DEFAULT 0,
+  mod_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (id_product, id_warehouse),
+  KEY idx_sb_warehouse (id_warehouse),
+  CONSTRAINT fk_sb_product FOREIGN KEY (id_product) REFERENCES tab_productos(id_product)
+    ON UPDATE CASCADE ON DELETE RESTRICT,
+  CONSTRAINT fk_sb_warehouse FOREIGN KEY (id_warehouse) REFERENCES tab_warehouse(id_warehouse)
+    ON UPDATE CASCADE ON DELETE RESTRICT
+) ENGINE=InnoDB;
+
 -- Vista de stock por producto y almacén (para tus consultas on_hand)
 CREATE OR REPLACE VIEW vw_inventory AS
-SELECT
-  t.id_product,
-  t.id_warehouse,
-  SUM(CASE WHEN t.type_transaction=1 THEN COALESCE(t.quantaty_products,0)
-           WHEN t.type_transaction=2 THEN -COALESCE(t.quantaty_products,0)
-           ELSE 0 END) AS on_hand
-FROM tab_product_transaction t
-GROUP BY t.id_product, t.id_warehouse;
+SELECT id_product, id_warehouse, stock AS on_hand
+FROM tab_stock_balance;